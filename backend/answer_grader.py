@@ -0,0 +1,377 @@
+"""
+Local grading of free-text answers (short and qa questions).
+
+Exact string equality misgrades many correct short answers ("the
+mitochondria", "mitocondria", "demand and supply"). Substring matching
+of a qa answer against its key misgrades almost every qa answer.
+Asking the LLM to grade every answer is too slow and too expensive.
+This engine grades a whole submission locally in one vectorised batch:
+
+  - every text becomes two sets of features: content words (stop words
+    dropped, light suffix stripping) and character 3-5-grams of those
+    words, which absorb typos and inflections;
+  - the features of all answers and references in the batch are laid
+    out in one dense binary matrix per feature kind. Shared features of
+    every (answer, reference) pair come out of one element-wise product;
+  - short: score = word_weight * F1(words) + (1 - word_weight) * F1(chars)
+    against the answer key. Stop words carry no features, so "the
+    mitochondria" scores 1.0, while a list of guesses loses on precision;
+  - qa: each expected point scores word_weight * recall(words) +
+    (1 - word_weight) * recall(chars). A point counts as covered at
+    GRADER_POINT_THRESHOLD, and the answer is correct once
+    GRADER_COVERAGE of its points are covered;
+  - a number in the reference must appear in the answer ("1945" is not
+    "1946"); ordinals count as numbers ("2nd" = "second", not "third");
+  - negators ("not", "no", "never", "n't", ...) are stop words, but a
+    short answer scores 0 when exactly one of it and its key is negated
+    ("not photosynthesis" is not "photosynthesis");
+  - every content word of a short answer's key must appear in the answer,
+    as the same stem or with a typo (one edit, or two in a long word
+    whose first three letters agree). Character n-grams alone rate
+    antonyms such as "increase" / "decrease" or "exothermic" /
+    "endothermic" as close matches; this gate scores them 0.
+
+The defaults (character n-grams only, word weight 0) are a starting
+point. Refit them on your own labels with:
+
+    python answer_grader.py calibrate labels.jsonl
+    python answer_grader.py eval labels.jsonl
+
+`python answer_grader.py check` grades a built-in list of known cases
+(typos, antonyms, negation, numbers) and exits 1 on a wrong verdict.
+
+Labels are JSON lines: {"type": "short", "answer": ..., "user_answer": ...,
+"correct": bool} or {"type": "qa", "expected_points": [...], ...}.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import time
+from functools import lru_cache
+
+import numpy as np
+
+GRADER_WORD_WEIGHT = float(os.getenv("GRADER_WORD_WEIGHT", "0.0"))
+GRADER_SHORT_THRESHOLD = float(os.getenv("GRADER_SHORT_THRESHOLD", "0.55"))
+GRADER_POINT_THRESHOLD = float(os.getenv("GRADER_POINT_THRESHOLD", "0.45"))
+GRADER_COVERAGE = float(os.getenv("GRADER_COVERAGE", "0.5"))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_NEGATION = re.compile(
+    r"\b(?:not|no|nor|never|none|neither|cannot|without)\b|n['’]t\b"
+    r"|\b(?:is|are|was|were|do|does|did|ca|wo|could|should|would|has|have|had)nt\b"  # apostrophe dropped
+)
+_STOP_WORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being both but by can
+could did do does doing down during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just me more most my no nor not of off on once only or other our out over
+own same she should so some such than that the their them then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you your
+""".split())
+_ORDINALS = {
+    w: str(i) for i, names in enumerate((
+        (), ("first", "1st"), ("second", "2nd"), ("third", "3rd"), ("fourth", "4th"), ("fifth", "5th"),
+        ("sixth", "6th"), ("seventh", "7th"), ("eighth", "8th"), ("ninth", "9th"), ("tenth", "10th"),
+    )) for w in names
+}
+_SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "ied", "ed", "es", "s", "ly")
+_CHAR_NGRAMS = (3, 4, 5)
+
+
+# ---------------------------------------------------------------------------
+# Features
+# ---------------------------------------------------------------------------
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            return word[: -len(suffix)]
+    return word
+
+
+@lru_cache(maxsize=8192)
+def _features(text: str) -> tuple[frozenset, frozenset, frozenset, bool]:
+    """(content words, char n-grams, numbers, negated) of a text."""
+    text = text.lower()
+    tokens = [_ORDINALS.get(t, t) for t in _TOKEN.findall(text)]
+    content = [t for t in tokens if t not in _STOP_WORDS] or tokens
+    words = frozenset(_stem(t) for t in content)
+    chars = set()
+    for t in content:
+        padded = f" {t} "
+        for n in _CHAR_NGRAMS:
+            chars.update(padded[i:i + n] for i in range(len(padded) - n + 1))
+    numbers = frozenset(t for t in tokens if t.isdigit())
+    return words, frozenset(chars), numbers, bool(_NEGATION.search(text))
+
+
+def _edits(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance of a and b, capped at limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        row = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if prev2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        prev2, prev = prev, row
+    return prev[-1]
+
+
+def _same_word(answer_word: str, key_word: str) -> bool:
+    """Same stem, or a typo of it: one edit, or two in a long word with the same start."""
+    if answer_word == key_word:
+        return True
+    if len(key_word) < 5 or key_word.isdigit():
+        return False
+    limit = 2 if len(key_word) >= 8 and answer_word[:3] == key_word[:3] else 1
+    return _edits(answer_word, key_word, limit) <= limit
+
+
+def _covers_key_words(answer_words: frozenset, key_words: frozenset) -> bool:
+    return all(any(_same_word(a, k) for a in answer_words) for k in key_words)
+
+
+def _overlap(answers: list[frozenset], refs: list[frozenset], pairs_a: np.ndarray, pairs_r: np.ndarray):
+    """(shared, answer size, reference size) per pair, from one binary matrix."""
+    vocab: dict[str, int] = {}
+    rows, cols = [], []
+    for r, feats in enumerate(answers + refs):
+        for f in feats:
+            cols.append(vocab.setdefault(f, len(vocab)))
+            rows.append(r)
+    m = np.zeros((len(answers) + len(refs), max(len(vocab), 1)), dtype=np.float32)
+    m[rows, cols] = 1.0
+    a = m[pairs_a]
+    r = m[len(answers) + pairs_r]
+    return (a * r).sum(axis=1), a.sum(axis=1), r.sum(axis=1)
+
+
+def _f1(shared: np.ndarray, a_size: np.ndarray, r_size: np.ndarray) -> np.ndarray:
+    recall = shared / np.maximum(r_size, 1)
+    precision = shared / np.maximum(a_size, 1)
+    return np.where(shared > 0, 2 * precision * recall / np.maximum(precision + recall, 1e-9), 0.0)
+
+
+def _recall(shared: np.ndarray, a_size: np.ndarray, r_size: np.ndarray) -> np.ndarray:
+    return shared / np.maximum(r_size, 1)
+
+
+def pair_scores(items: list[tuple[str, str, list[str]]], word_weight: float = GRADER_WORD_WEIGHT) -> list[list[float]]:
+    """
+    Similarity of each answer to each of its references, computed for the
+    whole batch at once. `items` are (qtype, user_answer, references);
+    short questions have one reference (the key), qa questions one per
+    expected point.
+    """
+    answer_feats, ref_feats, pairs_a, pairs_r, is_short = [], [], [], [], []
+    for i, (qtype, user, refs) in enumerate(items):
+        answer_feats.append(_features(user))
+        for ref in refs:
+            pairs_a.append(i)
+            pairs_r.append(len(ref_feats))
+            ref_feats.append(_features(ref))
+            is_short.append(qtype != "qa")
+    if not pairs_a:
+        return [[] for _ in items]
+
+    pa, pr = np.asarray(pairs_a), np.asarray(pairs_r)
+    short = np.asarray(is_short)
+    chars = _overlap([f[1] for f in answer_feats], [f[1] for f in ref_feats], pa, pr)
+    scores = np.where(short, _f1(*chars), _recall(*chars))
+    if word_weight > 0:
+        words = _overlap([f[0] for f in answer_feats], [f[0] for f in ref_feats], pa, pr)
+        scores = (1 - word_weight) * scores + word_weight * np.where(short, _f1(*words), _recall(*words))
+
+    out: list[list[float]] = [[] for _ in items]
+    for k, (i, j) in enumerate(zip(pairs_a, pairs_r)):
+        # A number in the reference has to be in the answer too
+        if ref_feats[j][2] - answer_feats[i][2]:
+            scores[k] = 0.0
+        # A short answer that negates its key (or vice versa) is wrong,
+        # and so is one that misses a word of the key ("increase" for "decrease")
+        if short[k] and (
+            ref_feats[j][3] != answer_feats[i][3]
+            or not _covers_key_words(answer_feats[i][0], ref_feats[j][0])
+        ):
+            scores[k] = 0.0
+        out[i].append(float(scores[k]))
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Grading
+# ---------------------------------------------------------------------------
+
+def grade_batch(
+    items: list[tuple[str, str, list[str]]],
+    word_weight: float = GRADER_WORD_WEIGHT,
+    short_threshold: float = GRADER_SHORT_THRESHOLD,
+    point_threshold: float = GRADER_POINT_THRESHOLD,
+    coverage: float = GRADER_COVERAGE,
+) -> list[dict]:
+    """
+    Grade (qtype, user_answer, references) items in one batch. Returns
+    {"correct", "score"} per item, plus "coverage" (one bool per expected
+    point) for qa.
+    """
+    results = []
+    for (qtype, user, refs), scores in zip(items, pair_scores(items, word_weight)):
+        if qtype == "qa":
+            covered = [s >= point_threshold for s in scores]
+            fraction = sum(covered) / len(covered) if covered else 0.0
+            results.append({
+                "correct": bool(covered) and fraction >= coverage,
+                "score": round(fraction, 3),
+                "coverage": covered,
+            })
+        else:
+            exact = bool(refs) and user.strip().lower() == refs[0].strip().lower() != ""
+            score = 1.0 if exact else (scores[0] if scores else 0.0)
+            results.append({"correct": exact or score >= short_threshold, "score": round(score, 3)})
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Calibration CLI
+# ---------------------------------------------------------------------------
+
+def _load_labels(path: str) -> list[tuple[tuple[str, str, list[str]], bool]]:
+    labeled = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            qtype = row.get("type", "short")
+            refs = [str(p) for p in row.get("expected_points", [])] if qtype == "qa" else [str(row.get("answer", ""))]
+            labeled.append(((qtype, str(row.get("user_answer", "")), refs), bool(row["correct"])))
+    return labeled
+
+
+def _legacy(item: tuple[str, str, list[str]]) -> bool:
+    """The exact / substring grading this engine replaces."""
+    qtype, user, refs = item
+    user = user.strip().lower()
+    expected = " ".join(refs).strip().lower() if qtype != "qa" else ""
+    if qtype == "qa":
+        return bool(user and expected and (user in expected or expected in user))
+    return user == expected
+
+
+def _accuracy(pred: list[bool], gold: list[bool]) -> float:
+    return sum(p == g for p, g in zip(pred, gold)) / len(gold) if gold else 0.0
+
+
+def _evaluate(labeled, **params) -> dict:
+    items = [item for item, _ in labeled]
+    gold = [label for _, label in labeled]
+    start = time.perf_counter()
+    results = grade_batch(items, **params)
+    per_answer_ms = (time.perf_counter() - start) * 1000 / max(len(items), 1)
+    report = {"answers": len(items), "per_answer_ms": round(per_answer_ms, 3)}
+    for qtype in ("short", "qa"):
+        idx = [i for i, (item, _) in enumerate(labeled) if (item[0] == "qa") == (qtype == "qa")]
+        if not idx:
+            continue
+        g = [gold[i] for i in idx]
+        pred = [results[i]["correct"] for i in idx]
+        fp = sum(p and not y for p, y in zip(pred, g))
+        fn = sum(y and not p for p, y in zip(pred, g))
+        report[qtype] = {
+            "n": len(idx),
+            "accuracy": round(_accuracy(pred, g), 3),
+            "legacy_accuracy": round(_accuracy([_legacy(items[i]) for i in idx], g), 3),
+            "false_positives": fp,
+            "false_negatives": fn,
+        }
+    return report
+
+
+def calibrate(labeled, coverage: float = GRADER_COVERAGE) -> dict:
+    """Grid-search word weight and thresholds for the best accuracy per question type."""
+    items = [item for item, _ in labeled]
+    gold = [label for _, label in labeled]
+    grid = [round(x * 0.05, 2) for x in range(4, 19)]
+    best = None
+    for weight in (0.0, 0.25, 0.5, 0.75, 1.0):
+        scores = pair_scores(items, weight)
+        short_best = max(grid, key=lambda t: _accuracy(
+            [bool(s) and (s[0] >= t or _legacy(it)) for it, s in zip(items, scores) if it[0] != "qa"],
+            [g for it, g in zip(items, gold) if it[0] != "qa"]))
+        point_best = max(grid, key=lambda t: _accuracy(
+            [bool(s) and sum(x >= t for x in s) / len(s) >= coverage for it, s in zip(items, scores) if it[0] == "qa"],
+            [g for it, g in zip(items, gold) if it[0] == "qa"]))
+        params = {"word_weight": weight, "short_threshold": short_best,
+                  "point_threshold": point_best, "coverage": coverage}
+        pred = [r["correct"] for r in grade_batch(items, **params)]
+        acc = _accuracy(pred, gold)
+        if best is None or acc > best[0]:
+            best = (acc, params)
+    return best[1]
+
+
+# (qtype, user_answer, references, correct) the default settings must get right
+KNOWN_CASES = (
+    ("short", "mitochondria", ["mitochondria"], True),
+    ("short", "the mitochondria", ["mitochondria"], True),
+    ("short", "mitocondria", ["mitochondria"], True),
+    ("short", "photosythesis", ["photosynthesis"], True),
+    ("short", "supply and demand", ["demand and supply"], True),
+    ("short", "It isn't soluble", ["not soluble"], True),
+    ("short", "increase", ["decrease"], False),
+    ("short", "decreases", ["increases"], False),
+    ("short", "exothermic", ["endothermic"], False),
+    ("short", "not photosynthesis", ["photosynthesis"], False),
+    ("short", "isnt soluble", ["soluble"], False),
+    ("short", "1946", ["1945"], False),
+    ("short", "the third", ["second"], False),
+    ("short", "the 2nd", ["second"], True),
+    ("qa", "Plants turn light energy into chemical energy using chlorophyll",
+     ["light energy", "chlorophyll"], True),
+    ("qa", "It is a type of rock", ["light energy", "chlorophyll"], False),
+)
+
+
+def check() -> list[str]:
+    """Wrong verdicts of the current settings on KNOWN_CASES."""
+    results = grade_batch([case[:3] for case in KNOWN_CASES])
+    return [
+        f"{qtype} {user!r} vs {refs}: expected correct={expected}, got {r['correct']} (score {r['score']})"
+        for (qtype, user, refs, expected), r in zip(KNOWN_CASES, results)
+        if r["correct"] != expected
+    ]
+
+
+def main():
+    if len(sys.argv) == 2 and sys.argv[1] == "check":
+        failures = check()
+        for failure in failures:
+            print(f"[Grader] FAIL {failure}")
+        print(f"[Grader] {len(KNOWN_CASES) - len(failures)}/{len(KNOWN_CASES)} known cases graded correctly")
+        sys.exit(1 if failures else 0)
+    if len(sys.argv) != 3 or sys.argv[1] not in ("calibrate", "eval"):
+        print("usage: python answer_grader.py check | calibrate|eval labels.jsonl")
+        sys.exit(2)
+    labeled = _load_labels(sys.argv[2])
+    if sys.argv[1] == "eval":
+        print(json.dumps(_evaluate(labeled), indent=2))
+        return
+    params = calibrate(labeled)
+    print(json.dumps(_evaluate(labeled, **params), indent=2))
+    print(f"GRADER_WORD_WEIGHT={params['word_weight']}")
+    print(f"GRADER_SHORT_THRESHOLD={params['short_threshold']}")
+    print(f"GRADER_POINT_THRESHOLD={params['point_threshold']}")
+    print(f"GRADER_COVERAGE={params['coverage']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Server-side answer keys for generated diagnostics and exercises.
+
+When questions are generated, each one gets a `question_id` and its answer
+is normalised once into a compact key, stored with the question set:
+
+    {"set_id", "session_id", "kind", "graded",
+     "keys": [{"t": type, "k": key, "a": answer, "p"?: points, "e"?: points as written, "q": question}],
+     "created_at", "expires_at"}
+
+The questions go back to the client without their answers. A submission
+sends only [{question_id, user_answer}]. grade() looks the keys up,
+consumes the referenced sets (a set is graded once; a submission that
+cannot be stored releases them again) and scores every question in one
+pass. mcq and true/false are compared exactly. All short
+and qa answers go to answer_grader in a single batch; for qa, `p` holds
+the expected points. The correct answers are revealed in the results.
+Unanswered questions count as wrong, and a client-supplied correct answer
+is never read. Sets expire after ANSWER_KEY_TTL_HOURS (Mongo TTL index).
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from database import get_database
+from metrics import DB_OP_SECONDS
+from tracing import span
+
+ANSWER_KEYS_COLLECTION = "answer_keys"
+ANSWER_KEY_TTL_HOURS = float(os.getenv("ANSWER_KEY_TTL_HOURS", "24"))
+
+_QUESTION_ID = re.compile(r"^([0-9a-f]{16}):(\d{1,4})$")
+_TRUTHY = ("true", "1", "yes")
+_FALSY = ("false", "0", "no")
+# Fields of a generated question that give its answer away
+_ANSWER_FIELDS = ("answer", "correct_answer", "expected_points", "explanation")
+
+
+class AnswerKeyError(ValueError):
+    """A submission references questions that are unknown, expired or foreign."""
+
+
+def get_answer_keys_collection():
+    return get_database()[ANSWER_KEYS_COLLECTION]
+
+
+# ---------------------------------------------------------------------------
+# Normalisation
+# ---------------------------------------------------------------------------
+
+def normalize_answer(qtype: str, raw) -> str:
+    """Canonical form of an answer; keys and user answers go through the same function."""
+    text = str(raw if raw is not None else "").strip().lower()
+    if qtype == "true_false":
+        if text in _TRUTHY:
+            return "true"
+        if text in _FALSY:
+            return "false"
+        return ""
+    return text
+
+
+def is_correct(user: str, key: str) -> bool:
+    """Exact comparison of normalised mcq / true-false answers."""
+    return bool(user) and user == key
+
+
+# ---------------------------------------------------------------------------
+# Storage
+# ---------------------------------------------------------------------------
+
+async def store_question_set(
+    session_id: str,
+    kind: str,
+    questions: list[dict],
+    default_type: str,
+) -> list[dict]:
+    """
+    Persist the answer keys of freshly generated questions and return the
+    questions with a `question_id` added to each and their answers removed.
+    """
+    set_id = uuid.uuid4().hex[:16]
+    fallback = default_type if default_type != "mixed" else "short"
+    keys, tagged = [], []
+    for i, q in enumerate(questions):
+        qtype = q.get("type") or fallback
+        answer = q.get("answer")
+        key = {
+            "t": qtype,
+            "k": normalize_answer(qtype, answer),
+            "a": str(answer) if answer is not None else "",
+            "q": str(q.get("question", "")),
+        }
+        if qtype == "qa":
+            points = [str(p) for p in q.get("expected_points") or [] if str(p).strip()]
+            key["p"] = [normalize_answer(qtype, p) for p in points]
+            key["e"] = points
+        keys.append(key)
+        visible = {k: v for k, v in q.items() if k not in _ANSWER_FIELDS}
+        tagged.append({**visible, "question_id": f"{set_id}:{i}"})
+
+    now = datetime.now(timezone.utc)
+    doc = {
+        "set_id": set_id,
+        "session_id": session_id,
+        "kind": kind,
+        "graded": False,
+        "keys": keys,
+        "created_at": now,
+        "expires_at": now + timedelta(hours=ANSWER_KEY_TTL_HOURS),
+    }
+    with DB_OP_SECONDS.time(op="store_answer_keys", result="ok"), span("db.store_answer_keys", questions=len(keys)):
+        await get_answer_keys_collection().insert_one(doc)
+    return tagged
+
+
+# ---------------------------------------------------------------------------
+# Grading
+# ---------------------------------------------------------------------------
+
+async def _claim_sets(session_id: str, kind: str, set_ids: list[str]):
+    """
+    Mark the sets graded, atomically, so each is graded at most once.
+    If one was consumed concurrently, the others are released again.
+    """
+    collection = get_answer_keys_collection()
+    claimed = []
+    with DB_OP_SECONDS.time(op="claim_answer_keys", result="ok"), span("db.claim_answer_keys", sets=len(set_ids)):
+        for set_id in set_ids:
+            doc = await collection.find_one_and_update(
+                {"set_id": set_id, "session_id": session_id, "kind": kind, "graded": {"$ne": True}},
+                {"$set": {"graded": True, "graded_at": datetime.now(timezone.utc)}},
+                projection={"_id": 0, "set_id": 1},
+            )
+            if doc is None:
+                await _release_sets(session_id, kind, claimed)
+                raise AnswerKeyError(f"Question set already graded: {set_id}")
+            claimed.append(set_id)
+
+
+async def _release_sets(session_id: str, kind: str, set_ids: list[str]):
+    if set_ids:
+        await get_answer_keys_collection().update_many(
+            {"set_id": {"$in": set_ids}, "session_id": session_id, "kind": kind},
+            {"$set": {"graded": False}, "$unset": {"graded_at": ""}},
+        )
+
+
+async def release(session_id: str, kind: str, graded: list[dict]):
+    """
+    Make the sets of a graded submission gradable again. For when the
+    submission could not be stored, so the client can resubmit it.
+    """
+    await _release_sets(session_id, kind, sorted({r["question_id"].split(":")[0] for r in graded}))
+
+
+def _reveal(key: dict) -> dict:
+    """The correct answer of a question, as generated."""
+    if key["t"] == "qa":
+        return {"expected_points": key.get("e") or key.get("p") or []}
+    return {"correct_answer": key.get("a") or key["k"]}
+
+
+async def grade(session_id: str, kind: str, answers: list) -> list[dict]:
+    """
+    Grade a submission of [{question_id, user_answer}] against stored keys
+    and consume the referenced sets, so they cannot be graded again. If
+    the submission is then not stored, release() the sets.
+
+    Returns one {"question_id", "question", "type", "correct", "score"}
+    per question of every referenced set, plus "correct_answer" (or, for
+    qa, "expected_points" and "coverage", one bool per expected point).
+    Answered questions come first in submission order, so they line up
+    with the client's per-question times; unanswered ones follow in
+    question order and are wrong. Raises AnswerKeyError for malformed,
+    duplicate, expired, foreign or already graded question ids.
+    """
+    given: dict[tuple[str, int], str] = {}
+    for a in answers:
+        m = _QUESTION_ID.match(a.question_id)
+        if not m:
+            raise AnswerKeyError(f"Malformed question_id: {a.question_id}")
+        ref = (m.group(1), int(m.group(2)))
+        if ref in given:
+            raise AnswerKeyError(f"Duplicate answer for {a.question_id}")
+        given[ref] = a.user_answer
+
+    set_ids = sorted({set_id for set_id, _ in given})
+    with DB_OP_SECONDS.time(op="load_answer_keys", result="ok"), span("db.load_answer_keys", sets=len(set_ids)):
+        docs = await get_answer_keys_collection().find(
+            {"set_id": {"$in": set_ids}, "session_id": session_id, "kind": kind},
+            {"_id": 0, "set_id": 1, "keys": 1, "graded": 1},
+        ).to_list(length=None)
+    by_id = {d["set_id"]: d for d in docs}
+    for set_id in set_ids:
+        if set_id not in by_id:
+            raise AnswerKeyError(f"Unknown or expired question set: {set_id}")
+        if by_id[set_id].get("graded"):
+            raise AnswerKeyError(f"Question set already graded: {set_id}")
+    for set_id, i in given:
+        if i >= len(by_id[set_id]["keys"]):
+            raise AnswerKeyError(f"Unknown question_id: {set_id}:{i}")
+
+    await _claim_sets(session_id, kind, set_ids)
+
+    # Submission order first, then the questions left unanswered
+    order = list(given) + [
+        (set_id, i)
+        for set_id in set_ids
+        for i in range(len(by_id[set_id]["keys"]))
+        if (set_id, i) not in given
+    ]
+    graded, free_text = [], []
+    for set_id, i in order:
+        key = by_id[set_id]["keys"][i]
+        qtype = key["t"]
+        user = normalize_answer(qtype, given.get((set_id, i), ""))
+        result = {"question_id": f"{set_id}:{i}", "question": key["q"], "type": qtype, **_reveal(key)}
+        if qtype in ("mcq", "true_false"):
+            correct = is_correct(user, key["k"])
+            result.update(correct=correct, score=1.0 if correct else 0.0)
+        else:
+            # qa: the expected points; sets stored without them fall back to the key
+            refs = (key.get("p") or [key["k"]]) if qtype == "qa" else [key["k"]]
+            free_text.append((len(graded), (qtype, user, [r for r in refs if r])))
+        graded.append(result)
+
+    # One batch for every free-text answer of the submission
+    if free_text:
+        from answer_grader import grade_batch  # numpy; preloaded by warm-up
+
+        for (idx, _), outcome in zip(free_text, grade_batch([item for _, item in free_text])):
+            graded[idx].update(outcome)
+    return graded
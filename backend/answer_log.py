@@ -0,0 +1,416 @@
+"""
+Append-only answer event log.
+
+Every diagnostic / exercise submission is stored as one compact event
+document next to the session's `performance` record it was folded into.
+The performance record keeps only bounded windows (last 50 response
+times, last 20 results, ...), but the log keeps everything, so
+performance can be rebuilt by replaying events through record_answers()
+— e.g. after a formula change.
+
+Event sequence numbers come from perf["event_seq"], which is only
+persisted through a version-checked session write (routes._record_submission),
+so two submissions can never be given the same number. That same write
+stores the event on the session as `pending_event`; it is then appended
+to the log (an idempotent upsert on (session_id, seq), retried) and
+cleared. If the append still fails, the submission stands and the event
+stays pending: the next submission, a rebuild or a reprocess appends it
+first, so the log never has a gap.
+
+Snapshots of `performance` are written every SNAPSHOT_EVERY events so a
+replay starts from the latest snapshot instead of the first event. With a
+session's first event, its performance as it was before the log existed is
+stored as the baseline snapshot (seq 0, `baseline: true`); replays "from
+scratch" start there, so older history is not wiped. A session without a
+baseline is only rebuilt when its events account for all of its
+total_attempts.
+
+Run a full reprocess (rebuild every session from its events) with:
+    python answer_log.py reprocess
+"""
+
+from __future__ import annotations
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()  # must run before database reads MONGO_URI
+
+import os
+import copy
+import asyncio
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import get_database, get_session, invalidate_session, update_session, SessionConflict
+from performance_tracker import empty_performance, record_answers
+from cohort_analytics import cohort_snapshot, record_rollups, rebuild_subject_rollup, rebuild_user_rollup
+
+EVENTS_COLLECTION = "answer_events"
+SNAPSHOTS_COLLECTION = "performance_snapshots"
+SNAPSHOT_EVERY = int(os.getenv("ANSWER_SNAPSHOT_EVERY", "20"))
+REPROCESS_BATCH = int(os.getenv("ANSWER_REPROCESS_BATCH", "500"))
+APPEND_ATTEMPTS = int(os.getenv("ANSWER_APPEND_ATTEMPTS", "3"))
+
+
+class AnswerLogError(RuntimeError):
+    """An event (or snapshot) could not be written to the log."""
+
+
+def get_events_collection():
+    return get_database()[EVENTS_COLLECTION]
+
+
+def get_snapshots_collection():
+    return get_database()[SNAPSHOTS_COLLECTION]
+
+
+# ---------------------------------------------------------------------------
+# Events
+# ---------------------------------------------------------------------------
+
+def make_answer_event(
+    answers: list[dict],
+    question_type: str,
+    topic: str,
+    time_seconds: float = 0.0,
+    per_question_times: list[float] | None = None,
+) -> dict:
+    """
+    Build a compact event from scored answers (each with a `correct` flag).
+    Question text is only kept for wrong answers — it is what the weakness
+    profile reads.
+    """
+    compact = []
+    for a in answers:
+        item = {"c": bool(a.get("correct", False)), "t": a.get("type", "unknown")}
+        if not item["c"] and a.get("question"):
+            item["q"] = str(a["question"])
+        compact.append(item)
+    event = {
+        "topic": topic,
+        "qtype": question_type,
+        "answers": compact,
+        "time": float(time_seconds),
+    }
+    if per_question_times:
+        event["times"] = [float(t) for t in per_question_times]
+    return event
+
+
+def apply_answer_event(perf: dict, event: dict) -> dict:
+    """Fold one event into a performance record (live path and replay)."""
+    answers = [
+        {"correct": a["c"], "type": a.get("t", "unknown"), "question": a.get("q", "")}
+        for a in event["answers"]
+    ]
+    perf = record_answers(
+        perf, answers, event["qtype"], event["topic"],
+        time_seconds=event.get("time", 0.0),
+        per_question_times=event.get("times"),
+    )
+    perf["event_seq"] = perf.get("event_seq", 0) + 1
+    return perf
+
+
+def pending_event(perf: dict, event: dict, previous: dict | None = None) -> dict:
+    """
+    The `pending_event` to store with the session write that applied
+    `event` to `perf`. `previous` is the performance record before the
+    event; with the session's first event it becomes the baseline.
+    """
+    pending = {"seq": perf.get("event_seq", 0), "event": event, "ts": datetime.now(timezone.utc)}
+    if pending["seq"] == 1 and previous is not None:
+        pending["previous"] = previous
+    return pending
+
+
+async def _upsert(collection, query: dict, doc: dict):
+    """Insert `doc` unless a document matching `query` exists (idempotent)."""
+    try:
+        await collection.update_one(query, {"$setOnInsert": doc}, upsert=True)
+    except DuplicateKeyError:
+        pass  # a concurrent upsert of the same document won
+
+
+async def append_answer_event(session_id: str, pending: dict, perf: dict | None = None):
+    """
+    Append a pending event (see pending_event()) to the log, with its
+    baseline snapshot for the first event and a snapshot every
+    SNAPSHOT_EVERY events when `perf` is the record right after it.
+    Every write is idempotent, so a retry or a second drain is harmless.
+    Retries APPEND_ATTEMPTS times, then raises AnswerLogError.
+    """
+    seq = pending["seq"]
+    for attempt in range(max(APPEND_ATTEMPTS, 1)):
+        try:
+            if pending.get("previous") is not None:
+                await write_snapshot(session_id, 0, pending["previous"], baseline=True)
+            await _upsert(
+                get_events_collection(),
+                {"session_id": session_id, "seq": seq},
+                {"session_id": session_id, "seq": seq, "ts": pending["ts"], **pending["event"]},
+            )
+            if (
+                SNAPSHOT_EVERY > 0 and seq % SNAPSHOT_EVERY == 0
+                and perf is not None and perf.get("event_seq") == seq
+            ):
+                await write_snapshot(session_id, seq, perf)
+            return
+        except Exception as exc:
+            print(f"[AnswerLog] Could not append event {seq} for {session_id} (attempt {attempt + 1}): {exc}")
+            await asyncio.sleep(0.05 * 2 ** attempt)
+    raise AnswerLogError(f"Could not append answer event {seq} for {session_id}")
+
+
+async def flush_pending_event(session: dict):
+    """
+    Append the session's pending event, if any, and clear it. The clear
+    does not bump the session version: the event is already part of the
+    session's performance. Raises AnswerLogError (the event stays pending).
+    """
+    pending = session.get("pending_event")
+    if not pending:
+        return
+    await append_answer_event(session["id"], pending, session.get("performance"))
+    await get_database()["sessions"].update_one(
+        {"session_id": session["id"], "pending_event.seq": pending["seq"]},
+        {"$unset": {"pending_event": ""}},
+    )
+    invalidate_session(session["id"])
+    session.pop("pending_event", None)
+
+
+async def write_snapshot(session_id: str, seq: int, perf: dict, baseline: bool = False):
+    """Store a snapshot; rewriting the same (session_id, seq) replaces it."""
+    query = {"session_id": session_id, "baseline": True} if baseline else {
+        "session_id": session_id, "seq": seq, "baseline": {"$ne": True},
+    }
+    doc = {
+        "session_id": session_id,
+        "seq": seq,
+        "performance": perf,
+        "created_at": datetime.now(timezone.utc),
+    }
+    if baseline:
+        doc["baseline"] = True
+        await _upsert(get_snapshots_collection(), query, doc)  # the first baseline is the one kept
+    else:
+        await get_snapshots_collection().replace_one(query, doc, upsert=True)
+
+
+async def _baseline(session_id: str) -> dict | None:
+    snap = await get_snapshots_collection().find_one({"session_id": session_id, "baseline": True})
+    return snap["performance"] if snap else None
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+async def replay_performance(
+    session_id: str,
+    use_snapshots: bool = True,
+    upto_seq: int | None = None,
+) -> dict:
+    """
+    Rebuild a session's performance record from its events.
+    With use_snapshots=False the replay starts from the baseline snapshot
+    (or an empty record), which is what you want after changing a formula
+    in performance_tracker.
+    """
+    perf = await _baseline(session_id) or empty_performance()
+    start = 0
+    if use_snapshots:
+        query: dict = {"session_id": session_id}
+        if upto_seq is not None:
+            query["seq"] = {"$lte": upto_seq}
+        snap = await get_snapshots_collection().find_one(query, sort=[("seq", DESCENDING)])
+        if snap:
+            perf = snap["performance"]
+            start = snap["seq"]
+
+    seq_filter: dict = {"$gt": start}
+    if upto_seq is not None:
+        seq_filter["$lte"] = upto_seq
+    cursor = get_events_collection().find(
+        {"session_id": session_id, "seq": seq_filter},
+        {"_id": 0, "session_id": 0, "ts": 0},
+    ).sort("seq", ASCENDING)
+    async for event in cursor:
+        perf = apply_answer_event(perf, event)
+    return perf
+
+
+def _answer_count(event: dict) -> int:
+    return len(event.get("answers", []))
+
+
+async def rebuild_session_performance(session_id: str, attempts: int = 3) -> dict | None:
+    """
+    Replay a session from scratch and store the result on the session and
+    its rollups. A pending event is appended first. Returns None when the
+    session's history is not fully logged (no baseline and fewer logged
+    answers than total_attempts), when its pending event cannot be
+    appended, or when it kept changing during the replay.
+    """
+    for _ in range(attempts):
+        session = await get_session(session_id, fresh=True)
+        if session is None:
+            return None
+        try:
+            await flush_pending_event(session)
+        except AnswerLogError:
+            return None
+        baseline = await _baseline(session_id)
+        perf = baseline or empty_performance()
+        answered = 0
+        cursor = get_events_collection().find(
+            {"session_id": session_id}, {"_id": 0, "session_id": 0, "ts": 0},
+        ).sort("seq", ASCENDING)
+        async for event in cursor:
+            perf = apply_answer_event(perf, event)
+            answered += _answer_count(event)
+        if baseline is None and answered != session["total_attempts"]:
+            print(f"[AnswerLog] {session_id}: history predates the log, not rebuilt")
+            return None
+        if perf.get("event_seq", 0) != session["performance"].get("event_seq", 0):
+            continue  # an event is being appended; read again
+        prev = cohort_snapshot(session["performance"])
+        try:
+            updated = await update_session(session_id, expected_version=session["version"], performance=perf)
+        except SessionConflict:
+            continue
+        await get_snapshots_collection().delete_many({"session_id": session_id, "baseline": {"$ne": True}})
+        await write_snapshot(session_id, perf.get("event_seq", 0), perf)
+        await record_rollups(updated, prev)
+        return perf
+    return None
+
+
+async def reprocess_all(batch_size: int = REPROCESS_BATCH) -> int:
+    """
+    Rebuild performance for every session that has events, streaming the
+    whole log once in (session_id, seq) order and writing results in bulk,
+    then rebuild the cohort rollups of the affected subjects and users.
+
+    Pending events are appended first. Each session starts from its
+    baseline snapshot. Sessions without one
+    are skipped unless their events account for all of total_attempts.
+    A session is only overwritten if its event_seq still matches the
+    replay, so submissions made meanwhile are kept. Returns the number of
+    sessions rebuilt.
+    """
+    sessions = get_database()["sessions"]
+    pending: list[tuple[str, dict, int, bool]] = []  # (session_id, perf, answered, has_baseline)
+    rebuilt = skipped = 0
+    subjects: set[str] = set()
+    users: set[str] = set()
+    current_id: str | None = None
+    perf: dict = {}
+    answered = 0
+    has_baseline = False
+
+    async def flush():
+        nonlocal rebuilt, skipped
+        if not pending:
+            return
+        ids = [sid for sid, *_ in pending]
+        heads = {
+            d["session_id"]: d
+            for d in await sessions.find(
+                {"session_id": {"$in": ids}},
+                {"_id": 0, "session_id": 1, "subject": 1, "user_id": 1, "total_attempts": 1},
+            ).to_list(length=None)
+        }
+        updates, snaps, done = [], [], []
+        for sid, result, count, baselined in pending:
+            head = heads.get(sid)
+            if head is None or (not baselined and count != head.get("total_attempts", 0)):
+                skipped += 1
+                continue
+            seq = result.get("event_seq", 0)
+            updates.append(UpdateOne(
+                {"session_id": sid, "performance.event_seq": seq},
+                {"$set": {"performance": result}, "$inc": {"version": 1}},
+            ))
+            snaps.append({
+                "session_id": sid,
+                "seq": seq,
+                "performance": copy.deepcopy(result),
+                "created_at": datetime.now(timezone.utc),
+            })
+            done.append(sid)
+            subjects.add(head["subject"])
+            if head.get("user_id"):
+                users.add(head["user_id"])
+        if updates:
+            written = await sessions.bulk_write(updates, ordered=False)
+            rebuilt += written.matched_count
+            skipped += len(updates) - written.matched_count
+            await get_snapshots_collection().delete_many(
+                {"session_id": {"$in": done}, "baseline": {"$ne": True}},
+            )
+            await get_snapshots_collection().insert_many(snaps, ordered=False)
+            for sid in done:
+                invalidate_session(sid)
+        pending.clear()
+
+    async for doc in sessions.find({"pending_event": {"$exists": True}}, {"_id": 0, "session_id": 1}):
+        session = await get_session(doc["session_id"], fresh=True)
+        try:
+            if session is not None:
+                await flush_pending_event(session)
+        except AnswerLogError:
+            pass  # replayed short of its event_seq, so the bulk write skips it
+
+    async def start(session_id: str) -> tuple[dict, bool]:
+        baseline = await _baseline(session_id)
+        return (baseline, True) if baseline is not None else (empty_performance(), False)
+
+    cursor = get_events_collection().find(
+        {}, {"_id": 0, "ts": 0}, batch_size=batch_size,
+    ).sort([("session_id", ASCENDING), ("seq", ASCENDING)])
+    async for event in cursor:
+        sid = event.pop("session_id")
+        if sid != current_id:
+            if current_id is not None:
+                pending.append((current_id, perf, answered, has_baseline))
+                if len(pending) >= batch_size:
+                    await flush()
+            current_id = sid
+            perf, has_baseline = await start(sid)
+            answered = 0
+        perf = apply_answer_event(perf, event)
+        answered += _answer_count(event)
+
+    if current_id is not None:
+        pending.append((current_id, perf, answered, has_baseline))
+    await flush()
+
+    for subject in sorted(subjects):
+        await rebuild_subject_rollup(subject, throttle=False)
+    for user_id in sorted(users):
+        await rebuild_user_rollup(user_id)
+    print(f"[AnswerLog] Reprocessed {rebuilt} sessions ({skipped} skipped), "
+          f"rebuilt {len(subjects)} subject and {len(users)} user rollups")
+    return rebuilt
+
+
+if __name__ == "__main__":
+    import sys
+    import asyncio
+
+    async def _main():
+        from database import connect_db, close_db
+        await connect_db()
+        try:
+            if len(sys.argv) > 1 and sys.argv[1] == "reprocess":
+                await reprocess_all()
+            else:
+                print("usage: python answer_log.py reprocess")
+        finally:
+            await close_db()
+
+    asyncio.run(_main())
@@ -0,0 +1,148 @@
+"""
+Range-aware response over an ordered list of files.
+
+Serves several files — or byte ranges of files, plus small in-memory
+blocks such as a generated header — as if they were one (e.g. a podcast
+episode made of segment files) and answers single-range `Range: bytes=...` requests by
+mapping the byte window onto the underlying files. Uses the ASGI
+`http.response.zerocopysend` extension (sendfile) when the server offers
+it, otherwise streams with positional reads in a worker thread.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str | None, total: int) -> tuple[int, int] | None | bool:
+    """
+    Parse a Range header against a resource of `total` bytes.
+    Returns (start, end) inclusive for a satisfiable single range, None to
+    serve the whole resource (no / unsupported header), or False when the
+    range is not satisfiable.
+    """
+    if not header:
+        return None
+    m = _RANGE.match(header.strip())
+    if not m:
+        return None  # multi-range or malformed: ignore and send everything
+    first, last = m.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or total == 0:
+            return False
+        return max(total - length, 0), total - 1
+    start = int(first)
+    end = int(last) if last else total - 1
+    if start >= total or end < start:
+        return False
+    return start, min(end, total - 1)
+
+
+Part = Path | bytes | tuple[Path, int, int]
+
+
+def _normalise(part: Part) -> tuple[Path | bytes, int, int]:
+    """(source, offset, length) for a whole file, a file range or a bytes block."""
+    if isinstance(part, bytes):
+        return part, 0, len(part)
+    if isinstance(part, tuple):
+        return part
+    return part, 0, os.stat(part).st_size
+
+
+class ConcatFileResponse(Response):
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        parts: list[Part],
+        range_header: str | None = None,
+        media_type: str = "audio/mpeg",
+        headers: dict | None = None,
+        background: BackgroundTask | None = None,
+    ):
+        self.parts = [_normalise(p) for p in parts]
+        self.total = sum(length for _, _, length in self.parts)
+        self.media_type = media_type
+        self.background = background
+        self.init_headers(headers)
+        self.headers["accept-ranges"] = "bytes"
+
+        window = parse_range(range_header, self.total)
+        if window is False:
+            self.status_code = 416
+            self.start, self.end = 0, -1
+            self.headers["content-range"] = f"bytes */{self.total}"
+        elif window is None:
+            self.status_code = 200
+            self.start, self.end = 0, self.total - 1
+        else:
+            self.status_code = 206
+            self.start, self.end = window
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{self.total}"
+        self.headers["content-length"] = str(self.end - self.start + 1)
+
+    def _slices(self):
+        """(source, offset, count) pieces covering [start, end] in order."""
+        pos = 0
+        for source, base, size in self.parts:
+            lo = max(self.start, pos)
+            hi = min(self.end, pos + size - 1)
+            if lo <= hi:
+                yield source, base + lo - pos, hi - lo + 1
+            pos += size
+            if pos > self.end:
+                break
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope.get("method") != "HEAD" and self.status_code != 416:
+            zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+            for source, offset, count in self._slices():
+                if isinstance(source, bytes):
+                    await send({
+                        "type": "http.response.body",
+                        "body": source[offset:offset + count],
+                        "more_body": True,
+                    })
+                    continue
+                with open(source, "rb") as f:
+                    if zerocopy:
+                        await send({
+                            "type": "http.response.zerocopysend",
+                            "file": f,
+                            "offset": offset,
+                            "count": count,
+                            "more_body": True,
+                        })
+                        continue
+                    fd = f.fileno()
+                    while count > 0:
+                        chunk = await anyio.to_thread.run_sync(
+                            os.pread, fd, min(self.chunk_size, count), offset,
+                        )
+                        if not chunk:
+                            break
+                        offset += len(chunk)
+                        count -= len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
@@ -1,25 +1,31 @@
 import os
+import secrets
 import bcrypt
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Union
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from database import get_database
+from metrics import AUTH_HASH_SECONDS, DB_OP_SECONDS
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Shared secret for operational endpoints; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+    with AUTH_HASH_SECONDS.time(op="verify"):
+        return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
 
 def get_password_hash(password: str) -> str:
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+    with AUTH_HASH_SECONDS.time(op="hash"):
+        salt = bcrypt.gensalt()
+        return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -47,7 +53,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
         
     db = get_database()
-    user = await db.users.find_one({"username": username})
+    with DB_OP_SECONDS.time(op="find_user", result="ok"):
+        user = await db.users.find_one({"username": username})
     if user is None:
         raise credentials_exception
     return user
+
+async def require_admin(x_admin_token: str = Header(default="")):
+    """Guard for admin endpoints: the X-Admin-Token header must match ADMIN_TOKEN."""
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
@@ -0,0 +1,173 @@
+"""
+Record / replay of LLM and TTS provider traffic.
+
+With PROVIDER_CASSETTE_MODE=record, every provider call made by
+gemini_client (generate_text / generate_json attempts) and by the TTS
+backend (one synthesize per podcast segment) is appended to the cassette
+in PROVIDER_CASSETTE:
+
+    <cassette>/interactions.jsonl   one line per call: kind, key, timing,
+                                    response text or error
+    <cassette>/audio/<sha256>.mp3   synthesised audio, stored once per content
+
+With PROVIDER_CASSETTE_MODE=replay, no provider is contacted. Calls are
+answered from the cassette after the recorded latency times
+CASSETTE_LATENCY_SCALE (0 = instant). Calls are keyed on what was asked:
+op + prompt for the LLM, backend + voice + text for TTS. Repeated calls
+with the same key replay the recorded sequence in order, so an invalid
+JSON answer followed by a valid one replays the same parse-failure /
+retry path. Once the sequence is used up, its last entry repeats.
+Recorded errors are raised again with their original message, so
+rate-limit retry delays are parsed the same way.
+
+A call that is not on the cassette raises CassetteMiss, or with
+CASSETTE_ON_MISS=live goes to the real provider.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+from typing import Awaitable, Callable
+
+CASSETTE_MODE = os.getenv("PROVIDER_CASSETTE_MODE", "off").strip().lower()  # off | record | replay
+CASSETTE_PATH = os.getenv("PROVIDER_CASSETTE", "")
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", "1.0"))
+CASSETTE_ON_MISS = os.getenv("CASSETTE_ON_MISS", "error").strip().lower()  # error | live
+
+
+class CassetteMiss(Exception):
+    """Replay mode: the call was never recorded."""
+
+
+class ReplayedError(Exception):
+    """A provider error recorded on the cassette, raised again on replay."""
+
+
+def _key(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0, on_miss: str = "error"):
+        if mode not in ("off", "record", "replay"):
+            print(f"[Cassette] Unknown PROVIDER_CASSETTE_MODE '{mode}' — disabled")
+            mode = "off"
+        if mode != "off" and not path:
+            print("[Cassette] PROVIDER_CASSETTE is not set — disabled")
+            mode = "off"
+        self.mode = mode
+        self.path = Path(path) if path else None
+        self.latency_scale = max(latency_scale, 0.0)
+        self.on_miss = on_miss
+        self._tapes: dict[str, list[dict]] | None = None
+        self._cursor: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.recorded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    # -- storage -----------------------------------------------------------
+
+    def _load(self) -> dict[str, list[dict]]:
+        if self._tapes is None:
+            tapes: dict[str, list[dict]] = {}
+            index = self.path / "interactions.jsonl"
+            if index.exists():
+                for line in index.read_text(encoding="utf-8").splitlines():
+                    if line.strip():
+                        entry = json.loads(line)
+                        tapes.setdefault(entry["key"], []).append(entry)
+            self._tapes = tapes
+            print(f"[Cassette] Replaying {sum(map(len, tapes.values()))} interactions from {self.path}")
+        return self._tapes
+
+    def _append(self, entry: dict, audio: bytes | None = None):
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            if audio is not None:
+                digest = hashlib.sha256(audio).hexdigest()
+                blob = self.path / "audio" / f"{digest}.mp3"
+                if not blob.exists():
+                    blob.parent.mkdir(exist_ok=True)
+                    blob.write_bytes(audio)
+                entry["audio"] = blob.name
+            with open(self.path / "interactions.jsonl", "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self.recorded += 1
+
+    def _next(self, key: str) -> dict | None:
+        tape = self._load().get(key)
+        if not tape:
+            return None
+        i = self._cursor.get(key, 0)
+        self._cursor[key] = i + 1
+        return tape[min(i, len(tape) - 1)]
+
+    # -- record / replay ---------------------------------------------------
+
+    async def _through(self, kind: str, key: str, meta: dict, call: Callable[[], Awaitable], is_audio: bool):
+        if self.mode == "replay":
+            entry = self._next(key)
+            if entry is None:
+                self.misses += 1
+                if self.on_miss != "live":
+                    raise CassetteMiss(f"No recorded {kind} interaction for key {key}")
+                return await call()
+            self.hits += 1
+            await asyncio.sleep(entry.get("seconds", 0.0) * self.latency_scale)
+            if entry.get("error"):
+                raise ReplayedError(entry["error"])
+            if is_audio:
+                name = entry.get("audio")
+                if not name:
+                    return None
+                return await asyncio.to_thread((self.path / "audio" / name).read_bytes)
+            return entry.get("response", "")
+
+        start = time.perf_counter()
+        try:
+            result = await call()
+        except Exception as exc:
+            entry = {"kind": kind, "key": key, **meta, "seconds": round(time.perf_counter() - start, 4),
+                     "error": str(exc)}
+            await asyncio.to_thread(self._append, entry)
+            raise
+        entry = {"kind": kind, "key": key, **meta, "seconds": round(time.perf_counter() - start, 4)}
+        if is_audio:
+            await asyncio.to_thread(self._append, entry, result)
+        else:
+            entry["response"] = result
+            await asyncio.to_thread(self._append, entry)
+        return result
+
+    async def llm(self, op: str, prompt: str, provider: str, call: Callable[[], Awaitable[str]]) -> str:
+        """One LLM call: `op` is "text" or "json"; `call` performs it live."""
+        if self.mode == "off":
+            return await call()
+        meta = {"op": op, "provider": provider, "prompt": prompt[:120]}
+        return await self._through("llm", _key("llm", op, prompt), meta, call, is_audio=False)
+
+    async def tts(self, backend: str, voice: str, text: str, call: Callable[[], Awaitable[bytes | None]]) -> bytes | None:
+        """One TTS synthesis; `call` performs it live."""
+        if self.mode == "off":
+            return await call()
+        meta = {"backend": backend, "voice": voice, "text": text[:120]}
+        return await self._through("tts", _key("tts", backend, voice, text), meta, call, is_audio=True)
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+
+cassette = Cassette(CASSETTE_PATH, CASSETTE_MODE, CASSETTE_LATENCY_SCALE, CASSETTE_ON_MISS)
@@ -0,0 +1,422 @@
+"""
+Cohort analytics.
+Aggregates topic / question-type accuracy, mastery and cognitive strain
+across many sessions so instructors get class-wide numbers in one request.
+
+Three paths:
+  - Subject cohorts are served from a rollup document per subject that is
+    updated incrementally after every recorded submission (single read).
+  - Each user gets the same kind of rollup over their own sessions, plus a
+    per-session summary, which backs the dashboard (single read).
+  - Arbitrary user groups are computed on demand with one MongoDB
+    aggregation pipeline ($facet + $bucket) over the sessions collection.
+
+Mastery and CSI distributions are kept as 10-bin histograms (0-100), and
+percentiles are interpolated from the bins.
+
+Rebuilds scan the sessions collection, so a worker runs one at a time and
+refuses to rebuild the same subject again within COHORT_REBUILD_INTERVAL_SECONDS.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from database import get_database
+from performance_tracker import detect_weaknesses, get_study_recommendations
+
+ROLLUP_COLLECTION = "cohort_rollups"
+HISTOGRAM_BINS = 10
+COHORT_QUERY_TIMEOUT_MS = int(os.getenv("COHORT_QUERY_TIMEOUT_MS", "5000"))
+PERCENTILES = (25, 50, 75, 90)
+COHORT_REBUILD_INTERVAL_SECONDS = float(os.getenv("COHORT_REBUILD_INTERVAL_SECONDS", "300"))
+
+_rebuild_lock = asyncio.Lock()
+_last_rebuild: dict[str, float] = {}  # subject -> monotonic time of the last rebuild
+
+
+class RebuildThrottled(Exception):
+    """A rebuild of this subject ran too recently; `retry_after` is in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rebuild throttled, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def get_rollup_collection():
+    return get_database()[ROLLUP_COLLECTION]
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _field_key(name: str) -> str:
+    """Escape a topic / type name for use inside a MongoDB field path."""
+    return name.replace(".", "．").lstrip("$") or "_"
+
+
+def _unescape_key(key: str) -> str:
+    return key.replace("．", ".")
+
+
+def _bin(value: float) -> int:
+    """Histogram bin index for a 0-100 value."""
+    idx = int(max(0.0, min(float(value), 100.0)) // (100 / HISTOGRAM_BINS))
+    return min(idx, HISTOGRAM_BINS - 1)
+
+
+def _percentiles(hist: list[int]) -> dict:
+    """Interpolate percentiles from a 0-100 histogram."""
+    total = sum(hist)
+    width = 100 / HISTOGRAM_BINS
+    out: dict[str, float] = {}
+    for p in PERCENTILES:
+        if total == 0:
+            out[f"p{p}"] = 0.0
+            continue
+        target = total * p / 100
+        seen = 0
+        for idx, n in enumerate(hist):
+            if n and seen + n >= target:
+                frac = (target - seen) / n
+                out[f"p{p}"] = round((idx + frac) * width, 1)
+                break
+            seen += n
+    return out
+
+
+def _distribution(hist: list[int], total: float, count: int) -> dict:
+    return {
+        "mean": round(total / count, 1) if count else 0.0,
+        **_percentiles(hist),
+        "histogram": hist,
+    }
+
+
+def _accuracy_map(counts: dict) -> dict:
+    result = {}
+    for name, v in counts.items():
+        total = v.get("total", 0)
+        correct = v.get("correct", 0)
+        result[_unescape_key(name)] = {
+            "correct": correct,
+            "total": total,
+            "accuracy": round(correct / total * 100, 1) if total else 0.0,
+        }
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Incremental rollups
+# ---------------------------------------------------------------------------
+
+def cohort_snapshot(perf: dict) -> dict:
+    """
+    Capture the cohort-relevant parts of a performance record.
+    Take this before record_answers() mutates perf, and pass it to
+    record_rollups() afterwards.
+    """
+    return {
+        "active": perf.get("total_responses", 0) > 0,
+        "mastery": perf.get("mastery_score", 0.0),
+        "csi": perf.get("cognitive_strain_index", 0.0),
+        "topic_accuracy": {k: dict(v) for k, v in perf.get("topic_accuracy", {}).items()},
+        "type_accuracy": {k: dict(v) for k, v in perf.get("type_accuracy", {}).items()},
+    }
+
+
+def _rollup_delta(prev: dict, perf: dict) -> dict:
+    """Build the $inc document that moves a rollup from `prev` to `perf`."""
+    cur = cohort_snapshot(perf)
+    inc: dict[str, float] = {}
+
+    def add(path: str, amount: float):
+        if amount:
+            inc[path] = inc.get(path, 0) + amount
+
+    for field in ("topic_accuracy", "type_accuracy"):
+        for name, v in cur[field].items():
+            old = prev[field].get(name, {})
+            key = _field_key(name)
+            add(f"{field}.{key}.correct", v.get("correct", 0) - old.get("correct", 0))
+            add(f"{field}.{key}.total", v.get("total", 0) - old.get("total", 0))
+
+    for metric in ("mastery", "csi"):
+        if prev["active"]:
+            add(f"{metric}_hist.{_bin(prev[metric])}", -1)
+            add(f"{metric}_sum", -prev[metric])
+        add(f"{metric}_hist.{_bin(cur[metric])}", 1)
+        add(f"{metric}_sum", cur[metric])
+
+    if not prev["active"]:
+        add("sessions", 1)
+    return inc
+
+
+def _session_summary(session: dict) -> dict:
+    perf = session.get("performance") or {}
+    return {
+        "subject": session["subject"],
+        "level": session.get("level", "unknown"),
+        "total_correct": session.get("total_correct", 0),
+        "total_attempts": session.get("total_attempts", 0),
+        "mastery": perf.get("mastery_score", 0.0),
+        "cognitive_strain_index": perf.get("cognitive_strain_index", 0.0),
+        "adaptive_mode": perf.get("adaptive_mode"),
+        "updated_at": datetime.now(timezone.utc),
+    }
+
+
+async def record_rollups(session: dict, prev: dict):
+    """
+    Apply one session's change to its subject rollup and its owner's user
+    rollup in a single bulk write. `session` is the post-update session as
+    returned by update_session(). Never raises.
+    """
+    try:
+        inc = _rollup_delta(prev, session["performance"])
+        now = datetime.now(timezone.utc)
+        ops = [UpdateOne(
+            {"scope": "subject", "key": session["subject"]},
+            {"$inc": inc, "$set": {"updated_at": now}},
+            upsert=True,
+        )]
+        if session.get("user_id"):
+            ops.append(UpdateOne(
+                {"scope": "user", "key": session["user_id"]},
+                {
+                    "$inc": inc,
+                    "$set": {
+                        "updated_at": now,
+                        f"session_summaries.{session['id']}": _session_summary(session),
+                    },
+                },
+                upsert=True,
+            ))
+        await get_rollup_collection().bulk_write(ops, ordered=False)
+    except Exception as exc:
+        print(f"[Cohort] Rollup update failed for {session.get('id')}: {exc}")
+
+
+def _rollup_to_result(doc: dict) -> dict:
+    sessions = doc.get("sessions", 0)
+    mastery_hist = [doc.get("mastery_hist", {}).get(str(i), 0) for i in range(HISTOGRAM_BINS)]
+    csi_hist = [doc.get("csi_hist", {}).get(str(i), 0) for i in range(HISTOGRAM_BINS)]
+    return {
+        "scope": doc.get("scope", "subject"),
+        "key": doc.get("key", ""),
+        "sessions": sessions,
+        "topic_accuracy": _accuracy_map(doc.get("topic_accuracy", {})),
+        "type_accuracy": _accuracy_map(doc.get("type_accuracy", {})),
+        "mastery": _distribution(mastery_hist, doc.get("mastery_sum", 0.0), sessions),
+        "cognitive_strain_index": _distribution(csi_hist, doc.get("csi_sum", 0.0), sessions),
+    }
+
+
+async def get_subject_cohort(subject: str) -> dict:
+    """Return cohort stats for a subject from its rollup document."""
+    doc = await get_rollup_collection().find_one({"scope": "subject", "key": subject})
+    if doc is None:
+        doc = {"scope": "subject", "key": subject}
+    return _rollup_to_result(doc)
+
+
+# ---------------------------------------------------------------------------
+# On-demand aggregation
+# ---------------------------------------------------------------------------
+
+def _cohort_pipeline(match: dict) -> list[dict]:
+    width = 100 / HISTOGRAM_BINS
+    boundaries = [i * width for i in range(HISTOGRAM_BINS)] + [100.0001]
+
+    def bucket(field: str) -> list[dict]:
+        return [{"$bucket": {
+            "groupBy": {"$ifNull": [field, 0]},
+            "boundaries": boundaries,
+            "default": "other",
+            "output": {"n": {"$sum": 1}},
+        }}]
+
+    def accuracy(field: str) -> list[dict]:
+        return [
+            {"$project": {"kv": {"$objectToArray": {"$ifNull": [field, {}]}}}},
+            {"$unwind": "$kv"},
+            {"$group": {
+                "_id": "$kv.k",
+                "correct": {"$sum": "$kv.v.correct"},
+                "total": {"$sum": "$kv.v.total"},
+            }},
+        ]
+
+    return [
+        {"$match": match},
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "sessions": {"$sum": 1},
+                "mastery_sum": {"$sum": "$performance.mastery_score"},
+                "csi_sum": {"$sum": "$performance.cognitive_strain_index"},
+            }}],
+            "mastery": bucket("$performance.mastery_score"),
+            "csi": bucket("$performance.cognitive_strain_index"),
+            "topics": accuracy("$performance.topic_accuracy"),
+            "types": accuracy("$performance.type_accuracy"),
+        }},
+    ]
+
+
+def _buckets_to_hist(buckets: list[dict]) -> dict:
+    width = 100 / HISTOGRAM_BINS
+    hist: dict[str, int] = {}
+    for b in buckets:
+        if b["_id"] == "other":
+            continue
+        hist[str(min(int(round(b["_id"] / width)), HISTOGRAM_BINS - 1))] = b["n"]
+    return hist
+
+
+async def aggregate_cohort(user_ids: list[str] | None = None, subject: str | None = None) -> dict:
+    """Compute cohort stats for a user group (optionally within a subject)."""
+    match: dict = {"performance.total_responses": {"$gt": 0}}
+    if user_ids is not None:
+        match["user_id"] = {"$in": user_ids}
+    if subject:
+        match["subject"] = subject
+
+    cursor = get_database()["sessions"].aggregate(
+        _cohort_pipeline(match), maxTimeMS=COHORT_QUERY_TIMEOUT_MS,
+    )
+    rows = await cursor.to_list(length=1)
+    facets = rows[0] if rows else {}
+    totals = (facets.get("totals") or [{}])[0]
+
+    doc = {
+        "scope": "users" if user_ids is not None else "subject",
+        "key": subject or "",
+        "sessions": totals.get("sessions", 0),
+        "mastery_sum": totals.get("mastery_sum", 0.0),
+        "csi_sum": totals.get("csi_sum", 0.0),
+        "mastery_hist": _buckets_to_hist(facets.get("mastery", [])),
+        "csi_hist": _buckets_to_hist(facets.get("csi", [])),
+        "topic_accuracy": {r["_id"]: r for r in facets.get("topics", [])},
+        "type_accuracy": {r["_id"]: r for r in facets.get("types", [])},
+    }
+    return doc
+
+
+async def get_user_group_cohort(user_ids: list[str], subject: str | None = None) -> dict:
+    return _rollup_to_result(await aggregate_cohort(user_ids, subject))
+
+
+async def rebuild_subject_rollup(subject: str, throttle: bool = True) -> dict:
+    """
+    Recompute a subject rollup from scratch (backfill / repair).
+    With throttle, raises RebuildThrottled inside the rebuild interval.
+    """
+    async with _rebuild_lock:
+        if throttle:
+            wait = _last_rebuild.get(subject, -COHORT_REBUILD_INTERVAL_SECONDS) \
+                + COHORT_REBUILD_INTERVAL_SECONDS - time.monotonic()
+            if wait > 0:
+                raise RebuildThrottled(wait)
+        _last_rebuild[subject] = time.monotonic()
+        return await _rebuild_subject_rollup(subject)
+
+
+async def _rebuild_subject_rollup(subject: str) -> dict:
+    doc = await aggregate_cohort(subject=subject)
+    doc["scope"] = "subject"
+    doc["key"] = subject
+    doc["topic_accuracy"] = {
+        _field_key(k): {"correct": v["correct"], "total": v["total"]}
+        for k, v in doc["topic_accuracy"].items()
+    }
+    doc["type_accuracy"] = {
+        _field_key(k): {"correct": v["correct"], "total": v["total"]}
+        for k, v in doc["type_accuracy"].items()
+    }
+    doc["updated_at"] = datetime.now(timezone.utc)
+    await get_rollup_collection().replace_one(
+        {"scope": "subject", "key": subject}, doc, upsert=True,
+    )
+    return _rollup_to_result(doc)
+
+
+# ---------------------------------------------------------------------------
+# Per-user dashboard
+# ---------------------------------------------------------------------------
+
+def _dashboard_from_rollup(user_id: str, doc: dict) -> dict:
+    result = _rollup_to_result(doc)
+    sessions = [
+        {"session_id": sid, **{k: v for k, v in s.items() if k != "updated_at"},
+         "updated_at": s["updated_at"].isoformat() if s.get("updated_at") else None}
+        for sid, s in doc.get("session_summaries", {}).items()
+    ]
+    sessions.sort(key=lambda s: s["updated_at"] or "", reverse=True)
+
+    total_correct = sum(s["total_correct"] for s in sessions)
+    total_attempts = sum(s["total_attempts"] for s in sessions)
+
+    # detect_weaknesses / get_study_recommendations only need counts, mastery
+    # and streak, so run them over the aggregated counts in memory.
+    combined = {
+        "topic_accuracy": {k: {"correct": v["correct"], "total": v["total"]}
+                           for k, v in result["topic_accuracy"].items()},
+        "type_accuracy": {k: {"correct": v["correct"], "total": v["total"]}
+                          for k, v in result["type_accuracy"].items()},
+        "mastery_score": result["mastery"]["mean"],
+    }
+    subjects = list(dict.fromkeys(s["subject"] for s in sessions))
+
+    return {
+        "user_id": user_id,
+        "sessions": sessions,
+        "total_correct": total_correct,
+        "total_attempts": total_attempts,
+        "accuracy": round(total_correct / total_attempts * 100, 1) if total_attempts else 0.0,
+        "topic_accuracy": result["topic_accuracy"],
+        "type_accuracy": result["type_accuracy"],
+        "mastery": result["mastery"],
+        "cognitive_strain_index": result["cognitive_strain_index"],
+        "weaknesses": detect_weaknesses(combined),
+        "recommendations": get_study_recommendations(
+            combined, ", ".join(subjects) or "your subjects"
+        ),
+    }
+
+
+async def get_user_dashboard(user_id: str) -> dict:
+    """Return the materialised dashboard rollup for a user."""
+    doc = await get_rollup_collection().find_one({"scope": "user", "key": user_id})
+    return _dashboard_from_rollup(user_id, doc or {"scope": "user", "key": user_id})
+
+
+async def rebuild_user_rollup(user_id: str) -> dict:
+    """Recompute a user's rollup from their sessions (backfill / repair)."""
+    doc = await aggregate_cohort(user_ids=[user_id])
+    doc["scope"] = "user"
+    doc["key"] = user_id
+    for field in ("topic_accuracy", "type_accuracy"):
+        doc[field] = {
+            _field_key(k): {"correct": v["correct"], "total": v["total"]}
+            for k, v in doc[field].items()
+        }
+    doc["session_summaries"] = {}
+    cursor = get_database()["sessions"].find(
+        {"user_id": user_id, "performance.total_responses": {"$gt": 0}},
+    )
+    async for s in cursor:
+        session = {"id": s["session_id"], **s}
+        doc["session_summaries"][s["session_id"]] = _session_summary(session)
+    doc["updated_at"] = datetime.now(timezone.utc)
+    await get_rollup_collection().replace_one(
+        {"scope": "user", "key": user_id}, doc, upsert=True,
+    )
+    return _dashboard_from_rollup(user_id, doc)
@@ -1,11 +1,29 @@
 import os
+import copy
+import time
+import asyncio
+from collections import OrderedDict
 import certifi
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
 from datetime import datetime, timezone
 from performance_tracker import empty_performance
+from metrics import DB_OP_SECONDS
+from tracing import span
 
 MONGO_URI = os.getenv("MONGO_URI", "")
 DB_NAME = os.getenv("MONGO_DB", "neurolearn")
+# Connections the driver keeps open even when idle (0 = open on demand)
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+
+# Read-through session cache. Entries are served from memory for
+# SESSION_CACHE_TTL seconds; after that the document's `version` is checked
+# with a tiny projection query and the entry is reused if nothing changed.
+# Reads that feed a write use get_session(fresh=True) and pass the version
+# they read to update_session(expected_version=...), so a stale entry can
+# never overwrite another worker's update.
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
 
 if not MONGO_URI:
     print("[DB] WARNING: MONGO_URI not set. Add it to backend/.env or set it as an environment variable.")
@@ -14,27 +32,54 @@ if not MONGO_URI:
 client: AsyncIOMotorClient = None
 db = None
 
+# session_id -> (expires_at, session dict)
+_session_cache: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+
 
 async def connect_db():
     global client, db
     client = AsyncIOMotorClient(
         MONGO_URI,
         serverSelectionTimeoutMS=5000,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
         tlsCAFile=certifi.where(),
     )
     db = client[DB_NAME]
     try:
         await db.sessions.create_index("session_id", unique=True)
+        await db.sessions.create_index("user_id")
+        await db.sessions.create_index("subject")
+        await db.cohort_rollups.create_index([("scope", 1), ("key", 1)], unique=True)
+        await db.answer_events.create_index([("session_id", 1), ("seq", 1)], unique=True)
+        await db.performance_snapshots.create_index([("session_id", 1), ("seq", -1)])
+        await db.answer_keys.create_index("set_id", unique=True)
+        await db.answer_keys.create_index("expires_at", expireAfterSeconds=0)
+        await db.jobs.create_index("job_id", unique=True)
+        await db.jobs.create_index([("status", 1), ("kind", 1), ("priority", -1), ("created_at", 1)])
+        await db.jobs.create_index("expires_at", expireAfterSeconds=0)
         print(f"[DB] Connected to MongoDB ({DB_NAME})")
     except Exception as exc:
         print(f"[DB] Warning: Could not verify MongoDB connection: {exc}")
         print("[DB] The app will retry on first request.")
 
 
+async def ping_db(timeout: float = 2.0) -> dict:
+    """Round-trip a ping to MongoDB. Returns {ok, ms} or {ok: False, error}."""
+    if db is None:
+        return {"ok": False, "error": "not connected"}
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout)
+    except Exception as exc:
+        return {"ok": False, "error": str(exc)[:200] or type(exc).__name__}
+    return {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
 async def close_db():
     global client
     if client:
         client.close()
+    _session_cache.clear()
 
 
 def get_collection():
@@ -46,6 +91,40 @@ def get_users_collection():
 def get_database():
     return db
 
+def _session_from_doc(doc: dict) -> dict:
+    return {
+        "id": doc["session_id"],
+        "user_id": doc.get("user_id"),
+        "subject": doc["subject"],
+        "level": doc["level"],
+        "total_correct": doc["total_correct"],
+        "total_attempts": doc["total_attempts"],
+        "level_history": doc.get("level_history", []),
+        "performance": doc.get("performance", empty_performance()),
+        "version": doc.get("version", 0),
+        "pending_event": doc.get("pending_event"),
+    }
+
+
+def _cache_put(session: dict):
+    if SESSION_CACHE_SIZE <= 0:
+        return
+    sid = session["id"]
+    _session_cache[sid] = (time.monotonic() + SESSION_CACHE_TTL, session)
+    _session_cache.move_to_end(sid)
+    while len(_session_cache) > SESSION_CACHE_SIZE:
+        _session_cache.popitem(last=False)
+
+
+class SessionConflict(Exception):
+    """The session's version changed between the read and the write."""
+
+
+def invalidate_session(session_id: str):
+    """Drop a session from the in-process cache."""
+    _session_cache.pop(session_id, None)
+
+
 async def create_session(session_id: str, subject: str, user_id: str = None) -> dict:
     doc = {
         "session_id": session_id,
@@ -56,40 +135,100 @@ async def create_session(session_id: str, subject: str, user_id: str = None) ->
         "total_attempts": 0,
         "level_history": [],
         "performance": empty_performance(),
+        "version": 1,
         "created_at": datetime.now(timezone.utc),
     }
-    await get_collection().insert_one(doc)
-    return {
-        "id": session_id,
-        "subject": subject,
-        "level": "unknown",
-        "total_correct": 0,
-        "total_attempts": 0,
-        "level_history": [],
-        "performance": doc["performance"],
-    }
-
-
-async def get_session(session_id: str) -> dict | None:
+    with DB_OP_SECONDS.time(op="create_session", result="ok"), span("db.create_session"):
+        await get_collection().insert_one(doc)
+    session = _session_from_doc(doc)
+    _cache_put(session)
+    return copy.deepcopy(session)
+
+
+async def get_session(session_id: str, fresh: bool = False) -> dict | None:
+    """
+    Read-through cached session lookup.
+    Callers get a private copy, so mutating the returned performance dict
+    (record_answers works in place) never leaks into the cache.
+    fresh=True skips the cache (read-modify-write paths).
+    """
+    start = time.perf_counter()
+    with span("db.get_session") as s:
+        if fresh:
+            session, result = await _fetch_session(session_id)
+        else:
+            session, result = await _load_session(session_id)
+        s.set(result=result)
+    DB_OP_SECONDS.observe(time.perf_counter() - start, op="get_session", result=result)
+    return copy.deepcopy(session) if session is not None else None
+
+
+async def _load_session(session_id: str) -> tuple[dict | None, str]:
+    """Cached session (not copied) and how it was obtained, for metrics."""
+    cached = _session_cache.get(session_id)
+    if cached is not None:
+        expires_at, session = cached
+        if time.monotonic() < expires_at:
+            _session_cache.move_to_end(session_id)
+            return session, "hit"
+        # Expired — revalidate against the stored version before refetching
+        head = await get_collection().find_one(
+            {"session_id": session_id}, {"version": 1, "_id": 0}
+        )
+        if head is None:
+            invalidate_session(session_id)
+            return None, "not_found"
+        if head.get("version", 0) == session["version"]:
+            _cache_put(session)
+            return session, "revalidated"
+
+    session, result = await _fetch_session(session_id)
+    return session, "miss" if result == "fresh" else result
+
+
+async def _fetch_session(session_id: str) -> tuple[dict | None, str]:
     doc = await get_collection().find_one({"session_id": session_id})
     if doc is None:
-        return None
-    return {
-        "id": doc["session_id"],
-        "subject": doc["subject"],
-        "level": doc["level"],
-        "total_correct": doc["total_correct"],
-        "total_attempts": doc["total_attempts"],
-        "level_history": doc.get("level_history", []),
-        "performance": doc.get("performance", empty_performance()),
-    }
-
-
-async def update_session(session_id: str, **fields):
-    """Update arbitrary fields on the session document."""
+        invalidate_session(session_id)
+        return None, "not_found"
+    session = _session_from_doc(doc)
+    _cache_put(session)
+    return session, "fresh"
+
+
+async def update_session(session_id: str, expected_version: int | None = None, **fields) -> dict | None:
+    """
+    Update arbitrary fields on the session document and return the result.
+    With expected_version, the write only applies if the stored version
+    still matches; otherwise SessionConflict is raised and the caller
+    should re-read and retry.
+    """
     if not fields:
-        return
-    await get_collection().update_one(
-        {"session_id": session_id},
-        {"$set": fields},
-    )
+        return None
+    query: dict = {"session_id": session_id}
+    if expected_version is not None:
+        # Sessions created before versioning have no field and read as 0
+        query["version"] = {"$in": [0, None]} if expected_version == 0 else expected_version
+    # Bump the version so other workers notice on revalidation, and refresh
+    # our own cache from the post-update document in the same round-trip.
+    start = time.perf_counter()
+    with span("db.update_session", fields=",".join(fields)):
+        doc = await get_collection().find_one_and_update(
+            query,
+            {"$set": fields, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+    if doc is None:
+        result = "conflict" if expected_version is not None else "not_found"
+    else:
+        result = "ok"
+    DB_OP_SECONDS.observe(time.perf_counter() - start, op="update_session", result=result)
+    if doc is None:
+        invalidate_session(session_id)
+        if expected_version is not None:
+            # Either a concurrent write or a deleted session; the re-read tells
+            raise SessionConflict(session_id)
+        return None
+    session = _session_from_doc(doc)
+    _cache_put(session)
+    return copy.deepcopy(session)
@@ -0,0 +1,129 @@
+"""
+Whole-episode podcast cache.
+
+Finished episodes (script + audio manifest) are stored as JSON next to
+their audio, grouped by a normalised topic key, so popular topics are
+served without an LLM call or any TTS.
+
+Freshness: episodes older than `max_age_seconds` are ignored and pruned.
+Variety: up to `variants` different episodes are kept per topic; until
+that many exist, requests generate a new one, after which a random
+cached variant is served.
+"""
+
+from __future__ import annotations
+
+import re
+import json
+import time
+import random
+import threading
+from pathlib import Path
+from typing import Callable
+
+
+def normalize_topic(topic: str) -> str:
+    """'  Binary-Search  Trees! ' -> 'binary search trees'."""
+    words = re.findall(r"[a-z0-9+#]+", topic.lower())
+    return " ".join(words)
+
+
+def _topic_dir_name(key: str) -> str:
+    return key.replace(" ", "_")[:120] or "_"
+
+
+class EpisodeCache:
+    """Episode manifests stored as `<root>/<topic_key>/<podcast_id>.json`."""
+
+    def __init__(
+        self,
+        root: Path,
+        audio_available: Callable[[str], bool],
+        max_age_seconds: float,
+        variants: int = 1,
+    ):
+        self.root = root
+        self.audio_available = audio_available
+        self.max_age_seconds = max_age_seconds
+        self.variants = max(variants, 1)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age_seconds > 0
+
+    def _dir(self, topic: str) -> Path:
+        return self.root / _topic_dir_name(normalize_topic(topic))
+
+    def _audio_present(self, episode: dict) -> bool:
+        if not episode.get("full_audio_url"):
+            return True
+        return self.audio_available(episode["podcast_id"])
+
+    def _load(self, topic: str) -> list[dict]:
+        return self._load_dir(self._dir(topic))
+
+    def _load_dir(self, folder: Path) -> list[dict]:
+        """Fresh episodes in a topic folder; expired or broken ones are deleted."""
+        if not folder.is_dir():
+            return []
+        now = time.time()
+        episodes = []
+        for path in folder.glob("*.json"):
+            try:
+                episode = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                path.unlink(missing_ok=True)
+                continue
+            if now - episode.get("cached_at", 0) > self.max_age_seconds or not self._audio_present(episode):
+                path.unlink(missing_ok=True)
+                continue
+            episodes.append(episode)
+        return episodes
+
+    def get(self, topic: str, require_audio: bool) -> dict | None:
+        """
+        Return a cached episode, or None when a new one should be generated
+        (nothing cached, or fewer than `variants` variants so far).
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            episodes = [
+                e for e in self._load(topic)
+                if e.get("has_audio") or not require_audio
+            ]
+        if len(episodes) < self.variants:
+            return None
+        episode = random.choice(episodes)
+        episode.pop("cached_at", None)
+        return episode
+
+    def put(self, topic: str, episode: dict):
+        if not self.enabled:
+            return
+        folder = self._dir(topic)
+        with self._lock:
+            folder.mkdir(parents=True, exist_ok=True)
+            data = {**episode, "cached_at": time.time()}
+            tmp = folder / f".{episode['podcast_id']}.tmp"
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            tmp.replace(folder / f"{episode['podcast_id']}.json")
+
+    def count(self, topic: str) -> int:
+        with self._lock:
+            return len(self._load(topic))
+
+    def prune(self) -> int:
+        """Drop expired / orphaned episodes for every topic. Returns how many remain."""
+        if not self.root.is_dir():
+            return 0
+        remaining = 0
+        with self._lock:
+            for folder in self.root.iterdir():
+                if not folder.is_dir():
+                    continue
+                remaining += len(self._load_dir(folder))
+                if not any(folder.iterdir()):
+                    folder.rmdir()
+        return remaining
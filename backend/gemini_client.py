@@ -1,19 +1,25 @@
 import os
 import json
 import re
+import time
 import asyncio
 import httpx
 
+from cassette import cassette
+from metrics import LLM_REQUEST_SECONDS, LLM_TOKENS, LLM_RETRIES, LLM_PARSE_FAILURES
+from tracing import span
+
 # ---------------------------------------------------------------------------
 # Provider toggle: IS_GEMINI=true  → Google Gemini API
 #                  IS_GEMINI=false → Local Ollama (Mistral)
 # ---------------------------------------------------------------------------
 
 _client = None
+_ollama_client: httpx.AsyncClient | None = None
 _use_gemini: bool | None = None
 
 GEMINI_MODEL = "gemini-2.5-flash"
-OLLAMA_BASE = "http://localhost:11434"
+OLLAMA_BASE = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
 
 def _is_gemini() -> bool:
@@ -25,6 +31,27 @@ def _is_gemini() -> bool:
     return _use_gemini
 
 
+def _provider() -> str:
+    return "gemini" if _is_gemini() else "ollama"
+
+
+def _record_usage(provider: str, prompt_tokens: int | None, completion_tokens: int | None):
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, kind="prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, provider=provider, kind="completion")
+
+
+def _record_gemini_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        _record_usage(
+            "gemini",
+            getattr(usage, "prompt_token_count", None),
+            getattr(usage, "candidates_token_count", None),
+        )
+
+
 def _get_gemini_client():
     """Lazy-init the Gemini client."""
     global _client
@@ -53,6 +80,14 @@ def _parse_retry_delay(exc: Exception) -> float | None:
 # Ollama helpers
 # ---------------------------------------------------------------------------
 
+def _get_ollama_client() -> httpx.AsyncClient:
+    """Shared keep-alive client for the Ollama API (closed by close_clients)."""
+    global _ollama_client
+    if _ollama_client is None:
+        _ollama_client = httpx.AsyncClient(base_url=OLLAMA_BASE, timeout=120)
+    return _ollama_client
+
+
 async def _ollama_generate(prompt: str, json_mode: bool = False) -> str:
     """Call local Ollama API and return the response text."""
     model = os.getenv("OLLAMA_MODEL", "mistral")
@@ -60,30 +95,76 @@ async def _ollama_generate(prompt: str, json_mode: bool = False) -> str:
     if json_mode:
         payload["format"] = "json"
 
-    async with httpx.AsyncClient(timeout=120) as client:
-        resp = await client.post(f"{OLLAMA_BASE}/api/generate", json=payload)
-        resp.raise_for_status()
-        return resp.json().get("response", "")
+    resp = await _get_ollama_client().post("/api/generate", json=payload)
+    resp.raise_for_status()
+    data = resp.json()
+    _record_usage("ollama", data.get("prompt_eval_count"), data.get("eval_count"))
+    return data.get("response", "")
 
 
 # ---------------------------------------------------------------------------
-# Public API — generate_text / generate_json
+# Warm-up / health
 # ---------------------------------------------------------------------------
 
-async def generate_text(prompt: str) -> str:
-    """Send a prompt and return the response text."""
+async def check_provider(timeout: float = 10.0) -> dict:
+    """
+    Create the provider client and make one cheap request on it (model
+    metadata for Gemini, the model list for Ollama), so a connection is
+    open before the first real prompt. Nothing is generated.
+    """
+    provider = _provider()
+    if cassette.mode == "replay":
+        return {"provider": provider, "ok": True, "detail": "cassette replay"}
+    start = time.perf_counter()
     try:
         if _is_gemini():
-            from google.genai import types  # noqa: F811
-            client = _get_gemini_client()
-            response = await client.aio.models.generate_content(
-                model=GEMINI_MODEL, contents=prompt,
-            )
-            return response.text
+            # Importing google.genai is slow; keep it off the event loop
+            client = await asyncio.to_thread(_get_gemini_client)
+            await asyncio.wait_for(client.aio.models.get(model=GEMINI_MODEL), timeout)
         else:
-            return await _ollama_generate(prompt)
+            resp = await asyncio.wait_for(_get_ollama_client().get("/api/tags"), timeout)
+            resp.raise_for_status()
     except Exception as exc:
-        return f"[Error] AI request failed: {exc}"
+        return {"provider": provider, "ok": False, "error": str(exc)[:200] or type(exc).__name__}
+    return {"provider": provider, "ok": True, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+async def close_clients():
+    """Close pooled provider connections (app shutdown)."""
+    global _ollama_client
+    if _ollama_client is not None:
+        await _ollama_client.aclose()
+        _ollama_client = None
+
+
+# ---------------------------------------------------------------------------
+# Public API — generate_text / generate_json
+# ---------------------------------------------------------------------------
+
+async def generate_text(prompt: str) -> str:
+    """Send a prompt and return the response text."""
+    provider = _provider()
+    with span("llm.generate_text", provider=provider, prompt_chars=len(prompt)) as s:
+        start = time.perf_counter()
+
+        async def call() -> str:
+            if _is_gemini():
+                client = _get_gemini_client()
+                response = await client.aio.models.generate_content(
+                    model=GEMINI_MODEL, contents=prompt,
+                )
+                _record_gemini_usage(response)
+                return response.text
+            return await _ollama_generate(prompt)
+
+        try:
+            text = await cassette.llm("text", prompt, provider, call)
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, provider=provider, op="text", outcome="ok")
+            return text
+        except Exception as exc:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, provider=provider, op="text", outcome="error")
+            s.set(error=str(exc)[:200])
+            return f"[Error] AI request failed: {exc}"
 
 
 def _parse_json_text(raw: str) -> list[dict] | None:
@@ -121,48 +202,66 @@ def _parse_json_text(raw: str) -> list[dict] | None:
 
 async def generate_json(prompt: str, retries: int = 3) -> list[dict]:
     """Generate JSON with automatic retry on parse failure or rate-limit."""
+    with span("llm.generate_json", provider=_provider(), prompt_chars=len(prompt)):
+        return await _generate_json(prompt, retries)
+
+
+async def _generate_json(prompt: str, retries: int) -> list[dict]:
     last_raw = ""
+    provider = _provider()
+
+    async def call() -> str:
+        if _is_gemini():
+            from google.genai import types
+            client = _get_gemini_client()
+            response = await client.aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                ),
+            )
+            _record_gemini_usage(response)
+            return response.text
+        json_prompt = (
+            prompt
+            + "\n\nIMPORTANT: Respond ONLY with a valid JSON array. "
+            "No markdown, no explanation, just the JSON array."
+        )
+        return await _ollama_generate(json_prompt, json_mode=True)
 
     for attempt in range(1 + retries):
+        start = time.perf_counter()
         try:
-            if _is_gemini():
-                from google.genai import types
-                client = _get_gemini_client()
-                response = await client.aio.models.generate_content(
-                    model=GEMINI_MODEL,
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
-                        response_mime_type="application/json",
-                    ),
-                )
-                last_raw = response.text
-            else:
-                json_prompt = (
-                    prompt
-                    + "\n\nIMPORTANT: Respond ONLY with a valid JSON array. "
-                    "No markdown, no explanation, just the JSON array."
-                )
-                last_raw = await _ollama_generate(json_prompt, json_mode=True)
+            with span("llm.attempt", attempt=attempt + 1):
+                last_raw = await cassette.llm("json", prompt, provider, call)
         except Exception as exc:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, provider=provider, op="json", outcome="error")
             print(f"[AI] Error (attempt {attempt + 1}): {exc}")
             if attempt < retries:
                 delay = _parse_retry_delay(exc)
+                LLM_RETRIES.inc(provider=provider, reason="rate_limit" if delay else "error")
                 if delay:
                     wait = min(delay + 2, 60)
                     print(f"[AI] Rate-limited, waiting {wait:.0f}s before retry...")
-                    await asyncio.sleep(wait)
                 else:
-                    await asyncio.sleep(2 ** (attempt + 1))
+                    wait = 2 ** (attempt + 1)
+                with span("llm.backoff", seconds=wait, reason="rate_limit" if delay else "error"):
+                    await asyncio.sleep(wait)
                 continue
             return [{"question": "AI request failed. Please try again.", "answer": "N/A"}]
 
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, provider=provider, op="json", outcome="ok")
         parsed = _parse_json_text(last_raw)
         if parsed is not None:
             return parsed
 
+        LLM_PARSE_FAILURES.inc(provider=provider)
         if attempt < retries:
+            LLM_RETRIES.inc(provider=provider, reason="parse")
             print(f"[AI] Malformed JSON, retrying ({attempt + 1}/{retries})...")
-            await asyncio.sleep(1)
+            with span("llm.backoff", seconds=1, reason="parse"):
+                await asyncio.sleep(1)
 
     print(f"[AI] Could not parse response after {retries + 1} attempts: {last_raw[:200]}")
     return [{"question": "Could not parse AI response. Please try again.", "answer": "N/A"}]
@@ -0,0 +1,184 @@
+"""
+Import-time profile of a worker's cold start.
+
+    python import_profile.py                       # report for "import main"
+    python import_profile.py --budget-ms 900       # exit 1 over budget
+    python import_profile.py --json imports.json --top 30
+
+Each run imports the app in a fresh interpreter with `python -X importtime`,
+the same imports uvicorn and main.lifespan perform before a worker can
+serve (by default: main, podcast_engine). The report lists:
+  - the total import time (median of --repeat runs);
+  - the slowest modules by cumulative time (the module plus everything it
+    pulled in) and by self time;
+  - heavy dependencies (scikit-learn, scipy, numpy, PyPDF2, python-pptx,
+    google.genai) that were imported eagerly, with the import chain that
+    loaded each one. These are meant to load on first use, so any of them
+    counts as a failure alongside a blown --budget-ms.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+DEFAULT_MODULES = ("main", "podcast_engine")
+HEAVY_MODULES = ("sklearn", "scipy", "numpy", "PyPDF2", "pptx", "google.genai")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def _parse(stderr: str) -> list[dict]:
+    """-X importtime lines -> [{name, self_us, cumulative_us, depth, chain}] in import order."""
+    entries: list[dict] = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            entries.append({
+                "name": m.group(4),
+                "self_us": int(m.group(1)),
+                "cumulative_us": int(m.group(2)),
+                "depth": (len(m.group(3)) - 1) // 2,
+            })
+    # Children are printed before their parent; walk backwards to find each
+    # entry's importer (the next entry at a shallower depth).
+    parents: list[dict] = []
+    for entry in reversed(entries):
+        while parents and parents[-1]["depth"] >= entry["depth"]:
+            parents.pop()
+        entry["chain"] = [p["name"] for p in parents] + [entry["name"]]
+        parents.append(entry)
+    return entries
+
+
+def profile_once(modules: list[str]) -> list[dict]:
+    """Import `modules` in a fresh interpreter and return the parsed timings."""
+    code = "; ".join(f"import {m}" for m in modules)
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=Path(__file__).parent, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:"))
+        raise RuntimeError(f"'{code}' failed:\n{tail[-2000:]}")
+    return _parse(proc.stderr)
+
+
+def _total_us(entries: list[dict]) -> int:
+    return sum(e["cumulative_us"] for e in entries if e["depth"] == 0)
+
+
+def _eager_heavy(entries: list[dict]) -> list[dict]:
+    found = []
+    for heavy in HEAVY_MODULES:
+        for e in entries:
+            if e["name"] == heavy:
+                found.append({
+                    "module": heavy,
+                    "cumulative_ms": round(e["cumulative_us"] / 1000, 1),
+                    "chain": e["chain"],
+                })
+                break
+    return found
+
+
+def build_report(modules: list[str], repeat: int, top: int) -> dict:
+    runs = [profile_once(modules) for _ in range(max(repeat, 1))]
+    totals = [_total_us(r) for r in runs]
+    # Report the run closest to the median so the breakdown adds up to the total
+    median = statistics.median(totals)
+    entries = min(runs, key=lambda r: abs(_total_us(r) - median))
+
+    def row(e: dict) -> dict:
+        return {
+            "module": e["name"],
+            "self_ms": round(e["self_us"] / 1000, 1),
+            "cumulative_ms": round(e["cumulative_us"] / 1000, 1),
+        }
+
+    return {
+        "modules": modules,
+        "python": sys.version.split()[0],
+        "runs_ms": [round(t / 1000, 1) for t in totals],
+        "total_ms": round(median / 1000, 1),
+        "module_count": len(entries),
+        "by_cumulative": [row(e) for e in sorted(entries, key=lambda e: -e["cumulative_us"])[:top]],
+        "by_self": [row(e) for e in sorted(entries, key=lambda e: -e["self_us"])[:top]],
+        "eager_heavy": _eager_heavy(entries),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def print_report(report: dict, budget_ms: float):
+    print(f"Import profile: import {', '.join(report['modules'])}  (Python {report['python']})")
+    runs = ", ".join(f"{t:.0f}" for t in report["runs_ms"])
+    print(f"Total: {report['total_ms']:.0f}ms median over runs [{runs}] ms, {report['module_count']} modules")
+    if budget_ms > 0:
+        verdict = "OK" if report["total_ms"] <= budget_ms else "OVER BUDGET"
+        print(f"Budget: {budget_ms:.0f}ms — {verdict}")
+
+    for title, key in (("Slowest by cumulative time", "by_cumulative"), ("Slowest by self time", "by_self")):
+        print(f"\n{title}:")
+        print(f"  {'cumulative ms':>13}  {'self ms':>8}  module")
+        for r in report[key]:
+            print(f"  {r['cumulative_ms']:>13.1f}  {r['self_ms']:>8.1f}  {r['module']}")
+
+    print("\nHeavy dependencies loaded at import:")
+    if not report["eager_heavy"]:
+        print("  none")
+    for h in report["eager_heavy"]:
+        print(f"  {h['module']} ({h['cumulative_ms']:.0f}ms) via {' -> '.join(h['chain'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the backend's cold start")
+    parser.add_argument("--module", action="append", default=[],
+                        help=f"module to import (repeatable, default: {', '.join(DEFAULT_MODULES)})")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh-interpreter runs; the median is reported")
+    parser.add_argument("--top", type=int, default=20, help="rows per table")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "0")),
+                        help="exit 1 when the median total exceeds this (0 = no budget)")
+    parser.add_argument("--allow-heavy", action="store_true", help="don't fail on eagerly imported heavy modules")
+    parser.add_argument("--json", default="", help="write the report to this file")
+    args = parser.parse_args()
+
+    try:
+        report = build_report(args.module or list(DEFAULT_MODULES), args.repeat, args.top)
+    except RuntimeError as e:
+        print(f"[ImportProfile] {e}", file=sys.stderr)
+        sys.exit(2)
+
+    report["budget_ms"] = args.budget_ms
+    print_report(report, args.budget_ms)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"\n[ImportProfile] Report written to {args.json}")
+
+    failed = False
+    if args.budget_ms > 0 and report["total_ms"] > args.budget_ms:
+        print(f"[ImportProfile] Import time {report['total_ms']:.0f}ms exceeds budget {args.budget_ms:.0f}ms")
+        failed = True
+    if report["eager_heavy"] and not args.allow_heavy:
+        names = ", ".join(h["module"] for h in report["eager_heavy"])
+        print(f"[ImportProfile] Heavy modules imported at startup: {names}")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+In-process background job queue backed by MongoDB.
+
+Long-running work (podcast generation, material ingestion, pre-warming)
+is enqueued as a job document in the `jobs` collection and executed by
+asyncio workers running inside the API process, so the HTTP request only
+waits for the insert. Clients poll the job for its result.
+
+  - Priorities: higher `priority` runs first, then oldest first.
+  - Concurrency: at most JOB_WORKERS jobs run at once, and at most the
+    handler's `concurrency` per kind (JOB_CONCURRENCY="podcast=2,..."
+    overrides it), independently of how many HTTP requests are in flight.
+  - Retries: a handler exception re-queues the job with exponential
+    backoff until `max_attempts`; raise JobError for failures that a
+    retry cannot fix.
+  - Cancellation: queued jobs are cancelled in place; running ones have
+    their task cancelled (also across processes, via the heartbeat).
+  - Leases: running jobs heartbeat every JOB_LEASE_SECONDS / 3; a job
+    whose worker died is picked up again once its lease expires.
+  - Retention: finished jobs get `expires_at` and are removed by a TTL
+    index after JOB_RESULT_TTL_HOURS.
+  - Ownership: jobs enqueued for a user record `owner`; get() / cancel()
+    with an owner only see that user's jobs.
+  - Local kinds (`local=True`) keep state in process memory, so they run
+    only in the process that enqueued them (`pinned_to`). If that process
+    dies, another worker fails the job once its lease has run out.
+
+Handlers are registered with the @job_handler decorator.
+"""
+
+from __future__ import annotations
+
+import os
+import uuid
+import socket
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from pymongo import ReturnDocument
+
+from database import get_database
+
+JOBS_COLLECTION = "jobs"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5"))
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL_HOURS", "24")) * 3600
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobError(Exception):
+    """Permanent job failure: the job fails without further retries."""
+
+
+@dataclass
+class _Handler:
+    fn: Callable[[dict], Awaitable[dict | None]]
+    concurrency: int
+    max_attempts: int
+    priority: int
+    local: bool = False
+
+
+def _concurrency_overrides() -> dict[str, int]:
+    """Parse JOB_CONCURRENCY='podcast=2,material_upload=4'."""
+    overrides = {}
+    for item in os.getenv("JOB_CONCURRENCY", "").split(","):
+        kind, _, value = item.partition("=")
+        if kind.strip() and value.strip().isdigit():
+            overrides[kind.strip()] = int(value)
+    return overrides
+
+
+def get_jobs_collection():
+    return get_database()[JOBS_COLLECTION]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def job_view(doc: dict) -> dict:
+    """Public fields of a job document."""
+    return {
+        "job_id": doc["job_id"],
+        "kind": doc["kind"],
+        "status": doc["status"],
+        "priority": doc.get("priority", 0),
+        "attempts": doc.get("attempts", 0),
+        "max_attempts": doc.get("max_attempts", 1),
+        "created_at": doc.get("created_at"),
+        "started_at": doc.get("started_at"),
+        "finished_at": doc.get("finished_at"),
+        "result": doc.get("result"),
+        "error": doc.get("error"),
+    }
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(workers, 1)
+        self._handlers: dict[str, _Handler] = {}
+        self._running: dict[str, tuple[str, asyncio.Task]] = {}  # job_id -> (kind, task)
+        self._wake: asyncio.Event | None = None
+        self._loops: list[asyncio.Task] = []
+
+    # -- registration ------------------------------------------------------
+
+    def register(
+        self, kind: str, fn, concurrency: int = 1, retries: int = 0, priority: int = 0, local: bool = False,
+    ):
+        concurrency = _concurrency_overrides().get(kind, concurrency)
+        self._handlers[kind] = _Handler(fn, max(concurrency, 1), retries + 1, priority, local)
+
+    # -- client API --------------------------------------------------------
+
+    async def enqueue(
+        self,
+        kind: str,
+        params: dict,
+        priority: int | None = None,
+        owner: str | None = None,
+    ) -> dict:
+        handler = self._handlers.get(kind)
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = _now()
+        doc = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "params": params,
+            "owner": owner,
+            "status": "queued",
+            "priority": handler.priority if priority is None else priority,
+            "attempts": 0,
+            "max_attempts": handler.max_attempts,
+            "created_at": now,
+            "run_after": now,
+        }
+        if handler.local:
+            doc["pinned_to"] = WORKER_ID
+        await get_jobs_collection().insert_one(doc)
+        self._notify()
+        return job_view(doc)
+
+    async def get(self, job_id: str, owner: str | None = None) -> dict | None:
+        """A job's public view; with `owner`, None unless that user enqueued it."""
+        query = {"job_id": job_id}
+        if owner is not None:
+            query["owner"] = owner
+        doc = await get_jobs_collection().find_one(query, {"params": 0})
+        return job_view(doc) if doc else None
+
+    async def cancel(self, job_id: str, owner: str | None = None) -> dict | None:
+        """Cancel a job. Finished jobs are returned unchanged; `owner` as in get()."""
+        jobs = get_jobs_collection()
+        now = _now()
+        if owner is not None and await self.get(job_id, owner) is None:
+            return None
+        doc = await jobs.find_one_and_update(
+            {"job_id": job_id, "status": "queued"},
+            {
+                "$set": {
+                    "status": "cancelled",
+                    "finished_at": now,
+                    "expires_at": now + timedelta(seconds=JOB_RESULT_TTL),
+                },
+                "$unset": {"params": ""},
+            },
+            projection={"params": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            doc = await jobs.find_one_and_update(
+                {"job_id": job_id, "status": "running"},
+                {"$set": {"cancel_requested": True}},
+                projection={"params": 0},
+                return_document=ReturnDocument.AFTER,
+            )
+            if job_id in self._running:
+                self._running[job_id][1].cancel()
+        if doc is None:
+            return await self.get(job_id)
+        return job_view(doc)
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def start(self):
+        if self._loops:
+            return
+        self._wake = asyncio.Event()
+        self._loops = [
+            asyncio.create_task(self._dispatch_loop()),
+            asyncio.create_task(self._heartbeat_loop()),
+        ]
+        print(f"[Jobs] {self.workers} workers started ({WORKER_ID})")
+
+    async def stop(self):
+        """Stop dispatching and hand running jobs back to the queue."""
+        for task in self._loops:
+            task.cancel()
+        self._loops = []
+        running = list(self._running.items())
+        for _, (_, task) in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*(t for _, (_, t) in running), return_exceptions=True)
+            try:
+                await get_jobs_collection().update_many(
+                    {"job_id": {"$in": [jid for jid, _ in running]}, "status": "running", "worker": WORKER_ID},
+                    {"$set": {"status": "queued", "run_after": _now()}, "$inc": {"attempts": -1}},
+                )
+            except Exception as exc:
+                print(f"[Jobs] Could not requeue running jobs: {exc}")
+
+    def stats(self) -> dict:
+        per_kind: dict[str, int] = {}
+        for kind, _ in self._running.values():
+            per_kind[kind] = per_kind.get(kind, 0) + 1
+        return {"workers": self.workers, "running": len(self._running), "per_kind": per_kind}
+
+    # -- workers -----------------------------------------------------------
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def _free_kinds(self) -> list[str]:
+        counts = self.stats()["per_kind"]
+        return [k for k, h in self._handlers.items() if counts.get(k, 0) < h.concurrency]
+
+    async def _claim(self) -> dict | None:
+        kinds = self._free_kinds()
+        if not kinds:
+            return None
+        now = _now()
+        stale = now - timedelta(seconds=JOB_LEASE_SECONDS)
+        return await get_jobs_collection().find_one_and_update(
+            {
+                "kind": {"$in": kinds},
+                "$or": [
+                    {"status": "queued", "run_after": {"$lte": now}, "pinned_to": {"$in": [None, WORKER_ID]}},
+                    {"status": "running", "heartbeat_at": {"$lt": stale}},
+                    # Pinned to a process that never picked it up (e.g. it died)
+                    {"status": "queued", "run_after": {"$lt": stale}, "pinned_to": {"$nin": [None, WORKER_ID]}},
+                ],
+            },
+            {
+                "$set": {"status": "running", "worker": WORKER_ID, "started_at": now, "heartbeat_at": now},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", -1), ("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                while len(self._running) < self.workers:
+                    doc = await self._claim()
+                    if doc is None:
+                        break
+                    task = asyncio.create_task(self._run(doc))
+                    self._running[doc["job_id"]] = (doc["kind"], task)
+            except Exception as exc:
+                print(f"[Jobs] Dispatch error: {exc}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _heartbeat_loop(self):
+        """Extend leases of running jobs and pick up cross-process cancels."""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            if not self._running:
+                continue
+            try:
+                jobs = get_jobs_collection()
+                ids = list(self._running)
+                await jobs.update_many(
+                    {"job_id": {"$in": ids}, "worker": WORKER_ID, "status": "running"},
+                    {"$set": {"heartbeat_at": _now()}},
+                )
+                async for doc in jobs.find(
+                    {"job_id": {"$in": ids}, "cancel_requested": True}, {"job_id": 1},
+                ):
+                    entry = self._running.get(doc["job_id"])
+                    if entry:
+                        entry[1].cancel()
+            except Exception as exc:
+                print(f"[Jobs] Heartbeat error: {exc}")
+
+    async def _finish(self, job_id: str, status: str, **fields):
+        now = _now()
+        await get_jobs_collection().update_one(
+            {"job_id": job_id, "worker": WORKER_ID},
+            {
+                "$set": {
+                    "status": status,
+                    "finished_at": now,
+                    "expires_at": now + timedelta(seconds=JOB_RESULT_TTL),
+                    **fields,
+                },
+                "$unset": {"params": "", "heartbeat_at": ""},
+            },
+        )
+
+    async def _run(self, doc: dict):
+        job_id, kind = doc["job_id"], doc["kind"]
+        attempt = doc["attempts"]
+        try:
+            if doc.get("cancel_requested"):
+                await self._finish(job_id, "cancelled")
+                return
+            if attempt > doc.get("max_attempts", 1):
+                await self._finish(job_id, "failed", error="Worker lost (lease expired)")
+                return
+            if doc.get("pinned_to") not in (None, WORKER_ID):
+                await self._finish(job_id, "failed", error="Worker lost (job must run in the process that enqueued it)")
+                return
+            print(f"[Jobs] {kind} {job_id} started (attempt {attempt})")
+            try:
+                result = await self._handlers[kind].fn(doc.get("params") or {})
+            except asyncio.CancelledError:
+                if self._loops:  # user cancel, not shutdown
+                    await self._finish(job_id, "cancelled")
+                    print(f"[Jobs] {kind} {job_id} cancelled")
+                raise
+            except JobError as exc:
+                await self._finish(job_id, "failed", error=str(exc))
+                print(f"[Jobs] {kind} {job_id} failed: {exc}")
+                return
+            except Exception as exc:
+                if attempt < doc.get("max_attempts", 1):
+                    delay = JOB_RETRY_BACKOFF * 2 ** (attempt - 1)
+                    await get_jobs_collection().update_one(
+                        {"job_id": job_id, "worker": WORKER_ID},
+                        {"$set": {
+                            "status": "queued",
+                            "error": f"{type(exc).__name__}: {exc}",
+                            "run_after": _now() + timedelta(seconds=delay),
+                        }},
+                    )
+                    print(f"[Jobs] {kind} {job_id} attempt {attempt} failed ({exc}); retrying in {delay:.0f}s")
+                else:
+                    await self._finish(job_id, "failed", error=f"{type(exc).__name__}: {exc}")
+                    print(f"[Jobs] {kind} {job_id} failed: {exc}")
+                return
+            await self._finish(job_id, "succeeded", result=result, error=None)
+            print(f"[Jobs] {kind} {job_id} succeeded")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            print(f"[Jobs] Could not record outcome of {job_id}: {exc}")
+        finally:
+            self._running.pop(job_id, None)
+            self._notify()
+
+
+job_queue = JobQueue()
+
+
+def job_handler(kind: str, concurrency: int = 1, retries: int = 0, priority: int = 0, local: bool = False):
+    """
+    Register an async `fn(params) -> result dict` as the handler for `kind`.
+    local=True runs each job in the process that enqueued it.
+    """
+    def decorator(fn):
+        job_queue.register(kind, fn, concurrency=concurrency, retries=retries, priority=priority, local=local)
+        return fn
+    return decorator
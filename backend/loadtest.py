@@ -0,0 +1,544 @@
+"""
+End-to-end load test of the API with every external dependency stubbed.
+
+    python loadtest.py --learners 200 --concurrency 20
+    python loadtest.py --learners 50 --llm-latency-ms 800 --llm-error-rate 0.05 --json out.json
+
+The harness starts:
+  - a stub LLM speaking Ollama's /api/generate (and /api/tags, which the
+    app's warm-up probes). It answers with valid
+    question / flashcard / podcast-script JSON or lesson text, with
+    configurable latency, error rate and invalid-JSON rate. Answers are
+    deterministic for a given --seed;
+  - a stub ElevenLabs /text-to-speech endpoint that returns silent MP3
+    frames sized to the text;
+  - the app itself (main:app under uvicorn) in a child process, pointed at
+    both stubs. Mongo is replaced by an in-process mongomock-motor instance
+    unless --mongo-uri is given.
+
+It then runs simulated learners through register -> login -> start-session
+-> diagnostic -> lesson -> exercise -> submit -> progress (optionally
+flashcards and a podcast) at the given concurrency. At the end it reports
+p50 / p95 / p99 latency and error counts per route, plus overall
+throughput.
+
+The in-process Mongo stand-in needs `pip install mongomock-motor`.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent
+
+
+# ---------------------------------------------------------------------------
+# Stub LLM (Ollama API)
+# ---------------------------------------------------------------------------
+
+_TYPE_RE = re.compile(r'"type" \(always "(\w+)"\)')
+_COUNT_RE = re.compile(r"Generate (?:exactly )?(\d+)")
+_SUBJECT_RE = re.compile(
+    r'(?:script about: "|questions for |flashcards for studying |for the topic: |lesson for )(.+?)(?:"| at | that |,|\n)'
+)
+
+
+def _answer_key(q: dict) -> dict:
+    """
+    The stub's answer to a question, derived from its visible fields only.
+    The app strips answers before returning questions, so simulated
+    learners recompute the key the same way.
+    """
+    rng = random.Random(q["question"])
+    qtype = q.get("type", "short")
+    if qtype == "mcq":
+        return {"answer": rng.choice(q["options"])}
+    if qtype == "true_false":
+        return {"answer": rng.random() < 0.5}
+    if qtype == "qa":
+        return {"expected_points": [f"key point {k} of {q.get('topic', '')}" for k in range(1, rng.randint(2, 4) + 1)]}
+    return {"answer": f"answer {rng.randint(1, 99)}"}
+
+
+def _question(qtype: str, subject: str, n: int, rng: random.Random) -> dict:
+    topic = f"{subject} topic {rng.randint(1, 6)}"
+    q = {"type": qtype, "question": f"[{topic}] Question {n + 1} about {subject}?", "topic": topic}
+    if qtype == "mcq":
+        q["options"] = [f"Option {c} for question {n + 1}" for c in "ABCD"]
+    q.update(_answer_key(q))
+    return q
+
+
+def stub_llm_content(prompt: str, json_mode: bool, rng: random.Random) -> str:
+    """Plausible model output for one of the app's prompts."""
+    count = int(m.group(1)) if (m := _COUNT_RE.search(prompt)) else 5
+    subject = m.group(1).strip() if (m := _SUBJECT_RE.search(prompt)) else "General"
+
+    if '"speaker"' in prompt:
+        lines = [
+            {"speaker": "host" if i % 2 == 0 else "guest",
+             "text": f"Segment {i + 1} on {subject}. " + "Let's unpack this idea a little further. " * rng.randint(1, 4),
+             "emotion": rng.choice(("neutral", "happy", "thoughtful", "excited"))}
+            for i in range(10)
+        ]
+        return json.dumps(lines)
+    if '"front"' in prompt:
+        cards = [{"front": f"What is concept {i + 1} of {subject}?", "back": f"Concept {i + 1} explained in one line."}
+                 for i in range(count)]
+        return json.dumps(cards)
+    if json_mode or "JSON array" in prompt:
+        types = _TYPE_RE.findall(prompt)
+        if types:
+            qtypes = [types[0]] * count
+        else:  # mixed
+            qtypes = [("mcq", "true_false", "short", "qa")[i % 4] for i in range(count)]
+        return json.dumps([_question(t, subject, i, rng) for i, t in enumerate(qtypes)])
+
+    paragraphs = [f"## {subject}: part {i + 1}\n\n" + "This explains a core idea with an example. " * 12 for i in range(4)]
+    return "\n\n".join(paragraphs)
+
+
+@dataclass
+class StubLLMStats:
+    calls: int = 0
+    errors: int = 0
+    invalid: int = 0
+
+
+def stub_llm_app(args, stats: StubLLMStats):
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    seen: Counter = Counter()
+
+    async def generate(request):
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        # Seeded per (prompt, repeat) so interleaving does not change answers
+        seen[prompt] += 1
+        rng = random.Random(f"{args.seed}:{seen[prompt]}:{prompt}")
+        stats.calls += 1
+        await asyncio.sleep(max(rng.gauss(args.llm_latency_ms, args.llm_jitter_ms), 0) / 1000)
+        if rng.random() < args.llm_error_rate:
+            stats.errors += 1
+            return JSONResponse({"error": "stub: model overloaded"}, status_code=503)
+        text = stub_llm_content(prompt, body.get("format") == "json", rng)
+        if rng.random() < args.llm_invalid_rate:
+            stats.invalid += 1
+            text = text[: len(text) // 2]
+        return JSONResponse({
+            "model": body.get("model", "stub"),
+            "response": text,
+            "done": True,
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": len(text) // 4,
+        })
+
+    async def tags(request):
+        return JSONResponse({"models": [{"name": "stub"}]})
+
+    return Starlette(routes=[
+        Route("/api/generate", generate, methods=["POST"]),
+        Route("/api/tags", tags),
+    ])
+
+
+# ---------------------------------------------------------------------------
+# Stub TTS (ElevenLabs API)
+# ---------------------------------------------------------------------------
+
+# MPEG-1 Layer III, 32 kbit/s, 44.1 kHz, mono: 104-byte frames of 26 ms.
+# All-zero side info means no audio data, i.e. silence.
+_SILENT_FRAME = b"\xff\xfb\x10\xc0" + bytes(100)
+_FRAME_SECONDS = 1152 / 44100
+
+
+def silent_mp3(text: str) -> bytes:
+    """Silent MP3 about as long as `text` would take to read aloud."""
+    seconds = max(len(text) / 15, 0.5)
+    return _SILENT_FRAME * int(seconds / _FRAME_SECONDS)
+
+
+def stub_tts_app(args):
+    from starlette.applications import Starlette
+    from starlette.responses import Response
+    from starlette.routing import Route
+
+    async def tts(request):
+        body = await request.json()
+        await asyncio.sleep(args.tts_latency_ms / 1000)
+        return Response(silent_mp3(body.get("text", "")), media_type="audio/mpeg")
+
+    return Starlette(routes=[Route("/text-to-speech/{voice}", tts, methods=["POST"])])
+
+
+# ---------------------------------------------------------------------------
+# App under test (child process)
+# ---------------------------------------------------------------------------
+
+def _install_mongo_standin():
+    """Point database.connect_db at one shared in-memory mongomock client."""
+    try:
+        import mongomock_motor
+    except ImportError:
+        sys.exit("[LoadTest] The in-process Mongo stand-in needs mongomock-motor "
+                 "(pip install mongomock-motor), or pass --mongo-uri")
+    import database
+
+    shared = mongomock_motor.AsyncMongoMockClient()
+    database.AsyncIOMotorClient = lambda *args, **kwargs: shared
+
+    # mongomock cannot apply pymongo >= 4.9 UpdateOne objects in bulk_write;
+    # applying them one by one is equivalent for the unordered writes the app does
+    async def bulk_write(self, requests, ordered=True, **kwargs):
+        for op in requests:
+            await self.update_one(op._filter, op._doc, upsert=op._upsert)
+
+    mongomock_motor.AsyncMongoMockCollection.bulk_write = bulk_write
+
+
+def serve_app(port: int, mongo_standin: bool):
+    import uvicorn
+
+    if mongo_standin:
+        _install_mongo_standin()
+    import main
+
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _free_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+async def _start_stub(app) -> tuple[object, str]:
+    import uvicorn
+
+    sock = _free_socket()
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="off"))
+    asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+async def _start_app(args, llm_url: str, tts_url: str, log) -> tuple[asyncio.subprocess.Process, str]:
+    sock = _free_socket()
+    port = sock.getsockname()[1]
+    sock.close()
+    env = {
+        **os.environ,
+        "IS_GEMINI": "false",
+        "OLLAMA_BASE_URL": llm_url,
+        "OLLAMA_MODEL": "stub",
+        "TTS_BACKEND": "elevenlabs",
+        "ELEVENLABS_BASE_URL": tts_url,
+        "ELEVENLABS_API_KEY": "loadtest",
+        "MONGO_URI": args.mongo_uri or "mongodb://loadtest-standin",
+        "MONGO_DB": args.mongo_db,
+        "TRACE_SLOW_MS": os.getenv("TRACE_SLOW_MS", "0"),
+    }
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--serve-app", "--port", str(port)]
+    if not args.mongo_uri:
+        cmd.append("--mongo-standin")
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, cwd=str(BACKEND_DIR), env=env, stdout=log, stderr=asyncio.subprocess.STDOUT,
+    )
+    base = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=base, timeout=2) as client:
+        deadline = time.monotonic() + args.startup_timeout
+        while time.monotonic() < deadline:
+            if proc.returncode is not None:
+                break
+            try:
+                # Start once the worker is warm, as a load balancer would
+                if (await client.get("/readyz")).status_code == 200:
+                    return proc, base
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    if proc.returncode is None:
+        proc.kill()
+    raise RuntimeError(f"App did not start; see {log.name}")
+
+
+# ---------------------------------------------------------------------------
+# Simulated learners
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Recorder:
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    statuses: dict[str, Counter] = field(default_factory=dict)
+    flows_ok: int = 0
+    flows_failed: int = 0
+    failures: Counter = field(default_factory=Counter)
+
+    def record(self, route: str, status: int, seconds: float):
+        self.latencies.setdefault(route, []).append(seconds)
+        self.statuses.setdefault(route, Counter())[status] += 1
+
+
+class FlowError(Exception):
+    pass
+
+
+async def _call(client: httpx.AsyncClient, rec: Recorder, method: str, route: str, path: str | None = None, **kwargs):
+    start = time.perf_counter()
+    try:
+        resp = await client.request(method, path or route, **kwargs)
+        status = resp.status_code
+    except httpx.HTTPError as exc:
+        rec.record(f"{method} {route}", 0, time.perf_counter() - start)
+        raise FlowError(f"{method} {route}: {type(exc).__name__}") from exc
+    rec.record(f"{method} {route}", status, time.perf_counter() - start)
+    if status >= 400:
+        raise FlowError(f"{method} {route}: HTTP {status}")
+    return resp.json()
+
+
+def _answers(questions: list[dict], rng: random.Random, accuracy: float) -> list[dict]:
+    """Submit-ready answers, each correct with probability `accuracy`."""
+    answers = []
+    for q in questions:
+        qtype = q.get("type", "short")
+        key = _answer_key(q)
+        if qtype == "qa":
+            expected = " ".join(key["expected_points"])
+        else:
+            expected = str(key["answer"]).lower()
+        if rng.random() < accuracy:
+            user = expected
+        elif qtype == "true_false":
+            user = "false" if expected == "true" else "true"
+        else:
+            user = "not sure"
+        answers.append({"question_id": q["question_id"], "user_answer": user})
+    return answers
+
+
+async def learner_flow(client: httpx.AsyncClient, rec: Recorder, args, run_id: str, n: int):
+    from models import SUBJECTS
+
+    rng = random.Random(f"{args.seed}:learner:{n}")
+    think = args.think_ms / 1000
+
+    async def step(method, route, path=None, **kwargs):
+        data = await _call(client, rec, method, route, path, **kwargs)
+        if think:
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * think)
+        return data
+
+    email = f"learner-{run_id}-{n}@loadtest.local"
+    password = "loadtest-password"
+    await step("POST", "/api/auth/register", json={"username": f"learner-{run_id}-{n}", "email": email, "password": password})
+    token = (await step("POST", "/api/auth/login", data={"username": email, "password": password}))["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+
+    subject = rng.choice(SUBJECTS)
+    session_id = (await step("POST", "/api/start-session", json={"subject": subject}, headers=auth))["session_id"]
+
+    diag = await step("POST", "/api/diagnostic-questions", json={"session_id": session_id, "question_type": "mcq"})
+    await step("POST", "/api/diagnostic", json={
+        "session_id": session_id, "answers": _answers(diag["questions"], rng, args.accuracy),
+    })
+
+    for _ in range(args.rounds):
+        await step("POST", "/api/generate-lesson", json={"session_id": session_id})
+        qtype = rng.choice(("mcq", "true_false", "short", "qa", "mixed"))
+        exercise = await step("POST", "/api/generate-exercise", json={"session_id": session_id, "question_type": qtype})
+        questions = exercise["questions"]
+        await step("POST", "/api/submit-exercise", json={
+            "session_id": session_id,
+            "answers": _answers(questions, rng, args.accuracy),
+            "per_question_times": [round(rng.uniform(5, 60), 1) for _ in questions],
+        })
+        await step("POST", "/api/progress", json={"session_id": session_id})
+
+    if args.flashcards:
+        await step("POST", "/api/generate-flashcards", json={"session_id": session_id})
+    if args.podcast:
+        await step("POST", "/api/generate-podcast", json={"topic": subject})
+
+
+async def drive(base: str, args, rec: Recorder) -> float:
+    run_id = f"{int(time.time())}{random.Random().randint(0, 999):03d}"
+    todo: asyncio.Queue[int] = asyncio.Queue()
+    for n in range(args.learners):
+        todo.put_nowait(n)
+
+    async def worker(client):
+        while True:
+            try:
+                n = todo.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await learner_flow(client, rec, args, run_id, n)
+                rec.flows_ok += 1
+            except (FlowError, KeyError, ValueError) as exc:
+                rec.flows_failed += 1
+                rec.failures[str(exc).split(":")[0] if isinstance(exc, FlowError) else type(exc).__name__] += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=args.request_timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        return time.perf_counter() - start
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(max(int(round(q * len(sorted_values) + 0.5)) - 1, 0), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+
+def build_report(args, rec: Recorder, elapsed: float, llm: StubLLMStats) -> dict:
+    routes = {}
+    total = 0
+    for route, values in rec.latencies.items():
+        ordered = sorted(values)
+        statuses = rec.statuses[route]
+        errors = sum(n for s, n in statuses.items() if s == 0 or s >= 400)
+        total += len(values)
+        routes[route] = {
+            "count": len(values),
+            "errors": errors,
+            "rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 1),
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+            "statuses": {str(s): n for s, n in sorted(statuses.items())},
+        }
+    config = {k: v for k, v in vars(args).items() if k not in ("serve_app", "port", "mongo_standin", "json")}
+    return {
+        "config": config,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "flows": {
+            "completed": rec.flows_ok,
+            "failed": rec.flows_failed,
+            "per_second": round(rec.flows_ok / elapsed, 3) if elapsed else 0.0,
+            "failures": dict(rec.failures),
+        },
+        "routes": routes,
+        "stub_llm": asdict(llm),
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{'route':<36} {'n':>6} {'err':>5} {'rps':>7} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8}")
+    for route, r in report["routes"].items():
+        print(
+            f"{route:<36} {r['count']:>6} {r['errors']:>5} {r['rps']:>7.2f} "
+            f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}"
+        )
+    flows = report["flows"]
+    print(
+        f"\n{report['requests']} requests in {report['duration_s']}s = {report['rps']} req/s; "
+        f"{flows['completed']} learner flows completed ({flows['per_second']}/s), {flows['failed']} failed"
+    )
+    if flows["failures"]:
+        print("  failed at: " + ", ".join(f"{k} x{v}" for k, v in flows["failures"].items()))
+    llm = report["stub_llm"]
+    print(f"  stub LLM: {llm['calls']} calls, {llm['errors']} injected errors, {llm['invalid']} invalid JSON")
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+async def run(args) -> dict:
+    llm_stats = StubLLMStats()
+    llm_server, llm_url = await _start_stub(stub_llm_app(args, llm_stats))
+    tts_server, tts_url = await _start_stub(stub_tts_app(args))
+
+    log = open(args.app_log, "w") if args.app_log else tempfile.NamedTemporaryFile(
+        "w", prefix="neurolearn-loadtest-", suffix=".log", delete=False,
+    )
+    print(f"[LoadTest] Stub LLM {llm_url}, stub TTS {tts_url}; app log {log.name}")
+    proc = None
+    try:
+        proc, base = await _start_app(args, llm_url, tts_url, log)
+        print(f"[LoadTest] App at {base}; {args.learners} learners, concurrency {args.concurrency}")
+        rec = Recorder()
+        elapsed = await drive(base, args, rec)
+        return build_report(args, rec, elapsed, llm_stats)
+    finally:
+        if proc is not None and proc.returncode is None:
+            proc.terminate()
+            try:
+                await asyncio.wait_for(proc.wait(), 10)
+            except asyncio.TimeoutError:
+                proc.kill()
+        log.close()
+        llm_server.should_exit = True
+        tts_server.should_exit = True
+        await asyncio.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NeuroLearn end-to-end load test (stubbed LLM / TTS / Mongo)")
+    parser.add_argument("--learners", type=int, default=50, help="simulated learners (one flow each)")
+    parser.add_argument("--concurrency", type=int, default=10, help="learners running at once")
+    parser.add_argument("--rounds", type=int, default=2, help="lesson/exercise/submit/progress rounds per learner")
+    parser.add_argument("--accuracy", type=float, default=0.7, help="chance a simulated answer is correct")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a learner's requests")
+    parser.add_argument("--flashcards", action="store_true", help="also generate flashcards in each flow")
+    parser.add_argument("--podcast", action="store_true", help="also generate a podcast in each flow (writes podcast_audio/)")
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="fraction of LLM calls answered with HTTP 503")
+    parser.add_argument("--llm-invalid-rate", type=float, default=0.0, help="fraction of LLM answers truncated to invalid JSON")
+    parser.add_argument("--tts-latency-ms", type=float, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mongo-uri", default="", help="real MongoDB instead of the in-process stand-in")
+    parser.add_argument("--mongo-db", default="neurolearn_loadtest")
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--app-log", default="", help="file for the app's output (default: a temp file)")
+    parser.add_argument("--json", default="", help="also write the report as JSON to this file")
+    parser.add_argument("--serve-app", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--mongo-standin", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_app:
+        serve_app(args.port, args.mongo_standin)
+        return
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+        print(f"[LoadTest] Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
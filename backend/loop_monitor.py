@@ -0,0 +1,184 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A heartbeat task sleeps LOOP_LAG_INTERVAL_MS at a time and records how late
+it wakes up: that delay is the event-loop lag every other request is
+seeing. Lag is exported as a histogram plus rolling p50 / p95 / p99 gauges.
+
+A watchdog thread checks the heartbeat. When the loop has not ticked for
+LOOP_BLOCK_THRESHOLD_MS, something is running synchronously on it (bcrypt,
+PDF parsing, TF-IDF fitting, file I/O, ...). The watchdog then captures the
+loop thread's current stack and attributes it to the HTTP route (or
+background job) on that stack. Blocks are counted per route and kept,
+with their full stacks, in memory for GET /api/admin/loop-blocks. The log
+gets one line per block; the stack is printed only the first time a call
+site blocks within LOOP_BLOCK_LOG_INTERVAL_SECONDS.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import deque
+
+from metrics import Counter, Gauge, Histogram
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").strip().lower() in ("true", "1", "yes")
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100")) / 1000
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "200")) / 1000
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", "600"))  # samples (~1 min at 100 ms)
+LOOP_BLOCK_LOG_INTERVAL = float(os.getenv("LOOP_BLOCK_LOG_INTERVAL_SECONDS", "300"))
+LOOP_BLOCK_HISTORY = 50
+
+_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_QUANTILES = (0.5, 0.95, 0.99)
+
+LOOP_LAG_SECONDS = Histogram("event_loop_lag_seconds", "Event-loop scheduling lag", buckets=_LAG_BUCKETS)
+LOOP_LAG_QUANTILE = Gauge(
+    "event_loop_lag_quantile_seconds", "Rolling event-loop lag percentiles", ("quantile",),
+)
+LOOP_BLOCKS = Counter("event_loop_blocks_total", "Event-loop stalls over the block threshold", ("route",))
+LOOP_BLOCK_SECONDS = Histogram(
+    "event_loop_block_duration_seconds", "Duration of event-loop stalls", ("route",), buckets=_LAG_BUCKETS,
+)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+
+def _owner(frame) -> str:
+    """Route or job the blocked stack belongs to, from frames on that stack."""
+    from metrics import MetricsMiddleware
+    from job_queue import JobQueue
+
+    asgi_code = MetricsMiddleware.__call__.__code__
+    job_code = JobQueue._run.__code__
+    while frame is not None:
+        if frame.f_code is asgi_code:
+            scope = frame.f_locals.get("scope") or {}
+            route = scope.get("route")
+            return f"{scope.get('method', '')} {getattr(route, 'path', scope.get('path', '?'))}"
+        if frame.f_code is job_code:
+            return f"job:{frame.f_locals.get('kind', '?')}"
+        frame = frame.f_back
+    return "background"
+
+
+class LoopMonitor:
+    def __init__(self):
+        self._samples: deque[float] = deque(maxlen=max(LOOP_LAG_WINDOW, 1))
+        self._last_tick = 0.0
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._current_block: dict | None = None
+        self.blocks: deque[dict] = deque(maxlen=LOOP_BLOCK_HISTORY)
+        self._logged_sites: dict[tuple[str, str, int], float] = {}  # call site -> last stack print
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        print(f"[LoopMonitor] Watching event loop (block threshold {LOOP_BLOCK_THRESHOLD * 1000:.0f}ms)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # -- loop side ---------------------------------------------------------
+
+    async def _heartbeat(self):
+        last_publish = time.monotonic()
+        while True:
+            expected = time.monotonic() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            now = time.monotonic()
+            self._last_tick = now
+            lag = max(now - expected, 0.0)
+            LOOP_LAG_SECONDS.observe(lag)
+            self._samples.append(lag)
+
+            block = self._current_block
+            if block is not None:
+                # The stall that the watchdog reported has ended
+                self._current_block = None
+                block["duration_ms"] = round(lag * 1000, 1)
+                LOOP_BLOCK_SECONDS.observe(block["duration_ms"] / 1000, route=block["route"])
+                print(f"[LoopMonitor] Loop unblocked after {block['duration_ms']:.0f}ms ({block['route']})")
+
+            if now - last_publish >= 1.0:
+                last_publish = now
+                ordered = sorted(self._samples)
+                for q in _QUANTILES:
+                    LOOP_LAG_QUANTILE.set(_percentile(ordered, q), quantile=q)
+
+    # -- watchdog thread ---------------------------------------------------
+
+    def _watch(self):
+        poll = max(LOOP_BLOCK_THRESHOLD / 4, 0.01)
+        while not self._stop.wait(poll):
+            stalled = time.monotonic() - self._last_tick - LOOP_LAG_INTERVAL
+            if stalled < LOOP_BLOCK_THRESHOLD or self._current_block is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            route = _owner(frame)
+            stack = "".join(traceback.format_stack(frame, limit=25))
+            block = {
+                "route": route,
+                "detected_at": time.time(),
+                "stalled_ms": round(stalled * 1000, 1),
+                "duration_ms": None,
+                "stack": stack,
+            }
+            self._current_block = block
+            self.blocks.append(block)
+            LOOP_BLOCKS.inc(route=route)
+            self._log_block(route, frame, stalled, stack)
+
+    def _log_block(self, route: str, frame, stalled: float, stack: str):
+        """One line per block; the stack once per call site per LOOP_BLOCK_LOG_INTERVAL."""
+        site = (route, frame.f_code.co_filename, frame.f_lineno)
+        now = time.monotonic()
+        last = self._logged_sites.get(site)
+        if last is not None and now - last < LOOP_BLOCK_LOG_INTERVAL:
+            print(f"[LoopMonitor] Event loop blocked >{stalled * 1000:.0f}ms in {route} "
+                  f"({os.path.basename(site[1])}:{site[2]}, stack already logged)")
+            return
+        if len(self._logged_sites) >= 1024:
+            self._logged_sites.clear()
+        self._logged_sites[site] = now
+        print(f"[LoopMonitor] Event loop blocked >{stalled * 1000:.0f}ms in {route}:\n{stack}")
+
+    # -- reporting ---------------------------------------------------------
+
+    def stats(self) -> dict:
+        ordered = sorted(self._samples)
+        return {
+            "samples": len(ordered),
+            **{f"p{int(q * 100)}_ms": round(_percentile(ordered, q) * 1000, 2) for q in _QUANTILES},
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+            "blocks": list(self.blocks),
+        }
+
+
+loop_monitor = LoopMonitor()
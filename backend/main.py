@@ -2,17 +2,41 @@ from dotenv import load_dotenv
 
 load_dotenv()  # must be called before any other imports that read env vars
 
+import time
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from database import connect_db, close_db
 from routes import router
+from metrics import MetricsMiddleware, render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from tracing import TracingMiddleware
+from profiler import ProfilerMiddleware
+from warmup import warmup
+
+_STARTED = time.monotonic()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    from podcast_engine import storage_gc_loop
+    from job_queue import job_queue
+    from loop_monitor import loop_monitor, LOOP_MONITOR_ENABLED
+    from gemini_client import close_clients
+
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
     await connect_db()
+    gc_task = asyncio.create_task(storage_gc_loop())
+    await job_queue.start()
+    await warmup.run()
     yield
+    await warmup.stop()
+    await job_queue.stop()
+    await loop_monitor.stop()
+    gc_task.cancel()
+    await close_clients()
     await close_db()
 
 
@@ -26,9 +50,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(ProfilerMiddleware)
+
 app.include_router(router, prefix="/api")
 
 
 @app.get("/")
 def root():
     return {"status": "ok", "service": "NeuroLearn API"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and its event loop is answering."""
+    from loop_monitor import loop_monitor
+    return {
+        "status": "alive",
+        "uptime_seconds": round(time.monotonic() - _STARTED, 1),
+        "event_loop_lag_p99_ms": loop_monitor.stats()["p99_ms"],
+    }
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: warm-up finished and required dependencies are healthy."""
+    ready, report = await warmup.readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
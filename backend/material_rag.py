@@ -9,6 +9,8 @@ RAG pipeline for uploaded PDF/PPTX materials.
 - Supports multi-file uploads per session (additive chunk store)
 
 Uses scikit-learn TfidfVectorizer for lightweight vector search (no GPU needed).
+scikit-learn (and with it scipy / numpy) is imported on first use, not at
+module load, so importing this module costs nothing at worker start.
 """
 
 from __future__ import annotations
@@ -18,9 +20,8 @@ import re
 import math
 from typing import BinaryIO
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from metrics import RAG_STAGE_SECONDS, RAG_CHUNKS, timed
+from tracing import traced
 
 
 # ---------------------------------------------------------------------------
@@ -60,6 +61,8 @@ def extract_text_pptx(file: BinaryIO) -> str:
     return "\n\n".join(slides)
 
 
+@timed(RAG_STAGE_SECONDS, stage="extract")
+@traced("rag.extract")
 def extract_text(filename: str, file: BinaryIO) -> str:
     """Route to the correct extractor based on file extension."""
     lower = filename.lower()
@@ -92,6 +95,8 @@ def _clean_text(text: str) -> str:
 _SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n{2,}")
 
 
+@timed(RAG_STAGE_SECONDS, stage="chunk")
+@traced("rag.chunk")
 def chunk_text(text: str, max_tokens: int = 500, overlap: int = 80) -> list[str]:
     """
     Split text into chunks of roughly `max_tokens` words.
@@ -157,6 +162,8 @@ def chunk_text(text: str, max_tokens: int = 500, overlap: int = 80) -> list[str]
 _stores: dict[str, dict] = {}
 
 
+@timed(RAG_STAGE_SECONDS, stage="index")
+@traced("rag.index")
 def store_chunks(session_id: str, chunks: list[str], filename: str = "") -> int:
     """
     Vectorize and store chunks for a session. Additive — uploading a second
@@ -174,6 +181,8 @@ def store_chunks(session_id: str, chunks: list[str], filename: str = "") -> int:
         all_chunks = chunks
         filenames = [filename] * len(chunks)
 
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
     vectorizer = TfidfVectorizer(
         stop_words="english",
         max_features=8000,
@@ -182,6 +191,7 @@ def store_chunks(session_id: str, chunks: list[str], filename: str = "") -> int:
     )
     matrix = vectorizer.fit_transform(all_chunks)
 
+    RAG_CHUNKS.inc(len(chunks))
     _stores[session_id] = {
         "chunks": all_chunks,
         "vectorizer": vectorizer,
@@ -191,6 +201,8 @@ def store_chunks(session_id: str, chunks: list[str], filename: str = "") -> int:
     return len(all_chunks)
 
 
+@timed(RAG_STAGE_SECONDS, stage="retrieve")
+@traced("rag.retrieve")
 def retrieve_chunks(
     session_id: str,
     query: str,
@@ -205,6 +217,8 @@ def retrieve_chunks(
     if not store:
         return []
 
+    from sklearn.metrics.pairwise import cosine_similarity
+
     query_vec = store["vectorizer"].transform([query])
     scores = cosine_similarity(query_vec, store["matrix"]).flatten()
 
@@ -251,6 +265,7 @@ def clear_material(session_id: str):
 # Prompt builders for RAG-based generation
 # ---------------------------------------------------------------------------
 
+@traced("rag.build_prompt", mode="lesson")
 def build_rag_lesson_prompt(chunks: list[str], subject: str, level: str) -> str:
     context = "\n\n---\n\n".join(chunks)
     return (
@@ -267,6 +282,7 @@ def build_rag_lesson_prompt(chunks: list[str], subject: str, level: str) -> str:
     )
 
 
+@traced("rag.build_prompt", mode="exercise")
 def build_rag_exercise_prompt(
     chunks: list[str], subject: str, level: str, question_type: str = "mixed"
 ) -> str:
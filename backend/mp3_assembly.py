@@ -0,0 +1,279 @@
+"""
+Frame-aware MP3 assembly for podcast episodes.
+
+Joining MP3 files byte for byte keeps each file's ID3 tags and Xing/Info
+header inside the result, so players misreport duration and seek badly.
+This module scans segment files frame by frame (headers only, no
+decoding), records where the audio frames are, and builds one Xing header
+for the whole episode with the total frame count, byte size and a 100-entry
+seek table. The episode is then served as that header followed by the
+audio-frame ranges of each segment. The work is O(bytes), with no
+re-encoding.
+
+Only MPEG audio Layer III is handled (which is what every TTS backend
+produces). Bytes that do not parse as frames are left out, and a segment
+with no frames at all is passed through unchanged.
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import accumulate
+from pathlib import Path
+
+_BITRATES = {
+    # kbit/s by bitrate index, Layer III
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),   # MPEG-1
+    2: (22050, 24000, 16000),   # MPEG-2
+    0: (11025, 12000, 8000),    # MPEG-2.5
+}
+
+_XING_FLAGS = 0x0001 | 0x0002 | 0x0004  # frames | bytes | TOC
+_XING_PAYLOAD = 4 + 4 + 4 + 4 + 100     # tag, flags, frames, bytes, TOC
+
+
+@dataclass(frozen=True)
+class FrameHeader:
+    version: int        # raw version bits: 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+    bitrate: int        # kbit/s
+    sample_rate: int
+    padding: int
+    mono: bool
+    raw: bytes          # the 4 header bytes
+
+    @property
+    def samples(self) -> int:
+        return 1152 if self.version == 3 else 576
+
+    @property
+    def length(self) -> int:
+        coeff = 144 if self.version == 3 else 72
+        return coeff * self.bitrate * 1000 // self.sample_rate + self.padding
+
+    @property
+    def side_info(self) -> int:
+        if self.version == 3:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+
+def parse_header(data: bytes, pos: int = 0) -> FrameHeader | None:
+    """Parse a Layer III frame header at `pos`, or None if there isn't one."""
+    if pos + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[pos:pos + 4]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 3
+    layer = (b1 >> 1) & 3
+    bitrate_idx = b2 >> 4
+    rate_idx = (b2 >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    return FrameHeader(
+        version=version,
+        bitrate=_BITRATES[1 if version == 3 else 2][bitrate_idx],
+        sample_rate=_SAMPLE_RATES[version][rate_idx],
+        padding=(b2 >> 1) & 1,
+        mono=(b3 >> 6) == 3,
+        raw=bytes(data[pos:pos + 4]),
+    )
+
+
+def _id3v2_size(data: bytes, pos: int) -> int:
+    """Length of an ID3v2 tag starting at `pos` (0 if none)."""
+    if data[pos:pos + 3] != b"ID3" or pos + 10 > len(data):
+        return 0
+    size = 0
+    for b in data[pos + 6:pos + 10]:
+        size = (size << 7) | (b & 0x7F)
+    footer = 10 if data[pos + 5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _is_info_frame(data: bytes, pos: int, header: FrameHeader) -> bool:
+    """Xing / Info / VBRI header frame (metadata, no audio worth keeping)."""
+    tag_at = pos + 4 + header.side_info
+    return data[tag_at:tag_at + 4] in (b"Xing", b"Info") or data[pos + 36:pos + 40] == b"VBRI"
+
+
+# ---------------------------------------------------------------------------
+# Segment scanning
+# ---------------------------------------------------------------------------
+
+@dataclass
+class SegmentFrames:
+    path: Path
+    runs: list[tuple[int, int]]   # (offset, length) of contiguous audio frames
+    sizes: array                  # byte size of every audio frame, in order
+    first: FrameHeader | None     # first audio frame (stream parameters)
+    vbr: bool
+
+
+def scan_frames(data: bytes, path: Path) -> SegmentFrames:
+    """Locate every audio frame, skipping tags, info frames and junk."""
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128  # ID3v1
+
+    runs: list[tuple[int, int]] = []
+    sizes = array("H")
+    first: FrameHeader | None = None
+    bitrates: set[int] = set()
+    run_start = -1
+    pos = 0
+    while pos < end:
+        tag = _id3v2_size(data, pos)
+        if tag:
+            if run_start >= 0:
+                runs.append((run_start, pos - run_start))
+                run_start = -1
+            pos += tag
+            continue
+        header = parse_header(data, pos)
+        if header is None or pos + header.length > end:
+            if run_start >= 0:
+                runs.append((run_start, pos - run_start))
+                run_start = -1
+            pos += 1
+            continue
+        if run_start < 0:
+            # Resync: require the next frame to line up too, unless this
+            # frame reaches the end of the data
+            nxt = pos + header.length
+            if nxt < end and parse_header(data, nxt) is None and _id3v2_size(data, nxt) == 0:
+                pos += 1
+                continue
+        if not sizes and first is None and _is_info_frame(data, pos, header):
+            pos += header.length
+            continue
+        if run_start < 0:
+            run_start = pos
+        if first is None:
+            first = header
+        sizes.append(header.length)
+        bitrates.add(header.bitrate)
+        pos += header.length
+    if run_start >= 0:
+        runs.append((run_start, pos - run_start))
+    return SegmentFrames(path=path, runs=runs, sizes=sizes, first=first, vbr=len(bitrates) > 1)
+
+
+_SCAN_CACHE_SIZE = 512
+_scan_cache: OrderedDict[tuple, SegmentFrames] = OrderedDict()
+_scan_lock = threading.Lock()
+
+
+def scan_segment(path: Path) -> SegmentFrames:
+    """scan_frames() for a file, memoised on (path, size, mtime)."""
+    st = os.stat(path)
+    key = (str(path), st.st_size, st.st_mtime_ns)
+    with _scan_lock:
+        hit = _scan_cache.get(key)
+        if hit is not None:
+            _scan_cache.move_to_end(key)
+            return hit
+    info = scan_frames(Path(path).read_bytes(), Path(path))
+    with _scan_lock:
+        _scan_cache[key] = info
+        while len(_scan_cache) > _SCAN_CACHE_SIZE:
+            _scan_cache.popitem(last=False)
+    return info
+
+
+# ---------------------------------------------------------------------------
+# Episode assembly
+# ---------------------------------------------------------------------------
+
+def xing_frame(template: FrameHeader, frames: int, stream_bytes: int, toc: list[int], vbr: bool) -> bytes:
+    """
+    A silent frame carrying a Xing (VBR) or Info (CBR) header. It uses the
+    stream's MPEG version, sample rate and channel mode, with the smallest
+    bitrate that fits the payload. `stream_bytes` excludes this frame.
+    """
+    b1 = template.raw[1] | 0x01                  # no CRC
+    b3 = template.raw[3] & 0xCF                  # mode extension off
+    rate_idx = (template.raw[2] >> 2) & 3
+    need = 4 + template.side_info + _XING_PAYLOAD
+    for bitrate_idx in range(1, 15):
+        header = parse_header(bytes((0xFF, b1, (bitrate_idx << 4) | (rate_idx << 2), b3)))
+        if header.length >= need:
+            break
+    frame = bytearray(header.length)
+    frame[0:4] = header.raw
+    at = 4 + template.side_info
+    frame[at:at + 16] = (b"Xing" if vbr else b"Info") + struct.pack(
+        ">III", _XING_FLAGS, frames, stream_bytes + header.length,
+    )
+    frame[at + 16:at + 116] = bytes(toc)
+    return bytes(frame)
+
+
+def _seek_table(sizes: list[int], header_len: int, total_bytes: int) -> list[int]:
+    """100 entries: byte position (scaled to 0-255) at each 1% of duration."""
+    offsets = [0, *accumulate(sizes)]
+    n = len(sizes)
+    toc = []
+    for i in range(100):
+        pos = header_len + offsets[min(i * n // 100, n)]
+        toc.append(min(pos * 256 // total_bytes, 255))
+    return toc
+
+
+@dataclass
+class EpisodeLayout:
+    header: bytes                          # Xing frame ('' if nothing parsed)
+    parts: list[tuple[Path, int, int]]     # (path, offset, length) in play order
+    frames: int
+    duration: float                        # seconds
+
+    @property
+    def size(self) -> int:
+        return len(self.header) + sum(length for _, _, length in self.parts)
+
+
+def assemble(paths: list[Path]) -> EpisodeLayout:
+    """Plan one well-formed MP3 stream out of segment files (no bytes copied)."""
+    scans = [scan_segment(p) for p in paths]
+    parts: list[tuple[Path, int, int]] = []
+    sizes: list[int] = []
+    template: FrameHeader | None = None
+    vbr = False
+    for seg in scans:
+        if seg.first is None:
+            size = os.stat(seg.path).st_size
+            print(f"[MP3] No MPEG frames in {seg.path.name}; passing it through as-is")
+            if size:
+                parts.append((seg.path, 0, size))
+            continue
+        if template is None:
+            template = seg.first
+        elif (seg.first.sample_rate, seg.first.mono) != (template.sample_rate, template.mono):
+            print(f"[MP3] {seg.path.name} has different stream parameters; duration may be off")
+        vbr = vbr or seg.vbr or seg.first.bitrate != template.bitrate
+        parts.extend((seg.path, offset, length) for offset, length in seg.runs)
+        sizes.extend(seg.sizes)
+
+    if template is None:
+        return EpisodeLayout(header=b"", parts=parts, frames=0, duration=0.0)
+
+    audio_bytes = sum(length for _, _, length in parts)
+    # Frame length depends only on the template, so size it once with a dummy TOC
+    header_len = len(xing_frame(template, 0, 0, [0] * 100, vbr))
+    toc = _seek_table(sizes, header_len, audio_bytes + header_len)
+    header = xing_frame(template, len(sizes), audio_bytes, toc, vbr)
+    return EpisodeLayout(
+        header=header,
+        parts=parts,
+        frames=len(sizes),
+        duration=len(sizes) * template.samples / template.sample_rate,
+    )
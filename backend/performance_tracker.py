@@ -7,6 +7,7 @@ All state is stored in the session document in MongoDB.
 
 from __future__ import annotations
 import math
+from array import array
 from datetime import datetime, timezone
 
 QUESTION_TYPES = ["mcq", "true_false", "short", "qa"]
@@ -19,6 +20,141 @@ _LOW_RESPONSE_TIME_THRESHOLD  = 8.0    # seconds per question
 _STRESS_MISTAKE_STREAK        = 3
 _ROLLING_WINDOW               = 5      # questions for rolling accuracy
 
+# Largest finite float32; bigger values would be stored as inf
+_FLOAT32_MAX = 3.4028234663852886e38
+
+# Ring buffer capacities
+_RESPONSE_TIME_CAPACITY       = 50
+_ROLLING_RESULTS_CAPACITY     = 20
+
+
+# ---------------------------------------------------------------------------
+# Compact ring buffers
+# ---------------------------------------------------------------------------
+
+class RingBuffer:
+    """
+    Fixed-size ring buffer over an `array` with a running sum and sum of
+    squares, so mean / variance / last-value queries are O(1) per update.
+
+    Serialises to a small dict whose `buf` field is raw bytes (stored as
+    BSON binary in MongoDB). NaN / inf are dropped and float values are
+    clamped to the float32 range, so one bad value cannot poison the
+    running totals.
+    """
+
+    __slots__ = ("typecode", "capacity", "buf", "head", "count", "total", "total_sq")
+
+    def __init__(self, capacity: int, typecode: str = "f"):
+        self.typecode = typecode
+        self.capacity = capacity
+        self.buf = array(typecode, bytes(array(typecode).itemsize * capacity))
+        self.head = 0          # next write position
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def push(self, value: float) -> None:
+        if not math.isfinite(value):
+            return
+        if self.typecode == "f":
+            value = min(max(value, -_FLOAT32_MAX), _FLOAT32_MAX)
+        if self.count == self.capacity:
+            old = self.buf[self.head]
+            self.total -= old
+            self.total_sq -= old * old
+        else:
+            self.count += 1
+        self.buf[self.head] = value
+        stored = self.buf[self.head]   # account for float32 rounding
+        self.total += stored
+        self.total_sq += stored * stored
+        self.head = (self.head + 1) % self.capacity
+
+    def extend(self, values) -> None:
+        for v in values:
+            self.push(v)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def last(self) -> float:
+        return self.buf[(self.head - 1) % self.capacity]
+
+    def tail_sum(self, n: int) -> float:
+        """Sum of the newest `n` values (n is bounded by capacity)."""
+        n = min(n, self.count)
+        return sum(self.buf[(self.head - 1 - i) % self.capacity] for i in range(n))
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def std(self) -> float:
+        if self.count < 2:
+            return 0.0
+        mean = self.total / self.count
+        return math.sqrt(max(self.total_sq / self.count - mean * mean, 0.0))
+
+    def values(self) -> list:
+        """Values in chronological order."""
+        start = (self.head - self.count) % self.capacity
+        return [self.buf[(start + i) % self.capacity] for i in range(self.count)]
+
+    def to_doc(self) -> dict:
+        return {
+            "buf": self.buf.tobytes(),
+            "head": self.head,
+            "count": self.count,
+            "sum": self.total,
+            "sumsq": self.total_sq,
+        }
+
+    @classmethod
+    def from_doc(cls, doc, capacity: int, typecode: str = "f") -> "RingBuffer":
+        """Load from `to_doc()` output, or from a legacy plain list."""
+        rb = cls(capacity, typecode)
+        if isinstance(doc, dict) and doc.get("buf"):
+            buf = array(typecode)
+            buf.frombytes(bytes(doc["buf"]))
+            if len(buf) == capacity:
+                rb.buf = buf
+                rb.head = int(doc.get("head", 0)) % capacity
+                rb.count = min(int(doc.get("count", 0)), capacity)
+                rb.total = float(doc.get("sum", 0.0))
+                rb.total_sq = float(doc.get("sumsq", 0.0))
+                if not (math.isfinite(rb.total) and math.isfinite(rb.total_sq)):
+                    # Poisoned before push() rejected non-finite values
+                    rb = cls(capacity, typecode)
+                    rb.extend(v for v in _ordered(buf, doc) if math.isfinite(v))
+                return rb
+            # Capacity changed — replay the stored values in order
+            rb.extend(_ordered(buf, doc))
+        elif isinstance(doc, list):
+            rb.extend(doc[-capacity:])
+        return rb
+
+
+def _ordered(buf: array, doc: dict) -> list:
+    """Values of a serialised buffer in chronological order."""
+    size = len(buf)
+    head = int(doc.get("head", 0)) % max(size, 1)
+    count = min(int(doc.get("count", 0)), size)
+    start = (head - count) % max(size, 1)
+    return [buf[(start + i) % size] for i in range(count)]
+
+
+def _response_times(perf: dict) -> RingBuffer:
+    return RingBuffer.from_doc(perf.get("response_times"), _RESPONSE_TIME_CAPACITY, "f")
+
+
+def _rolling_results(perf: dict) -> RingBuffer:
+    return RingBuffer.from_doc(perf.get("rolling_results"), _ROLLING_RESULTS_CAPACITY, "B")
+
+
+def avg_response_time(perf: dict) -> float:
+    """Mean of the recorded per-question response times (seconds)."""
+    return _response_times(perf).mean()
+
 
 def empty_performance() -> dict:
     """Return a blank performance record to embed in a new session."""
@@ -32,7 +168,7 @@ def empty_performance() -> dict:
         "streak": 0,
         "best_streak": 0,
         # Cognitive load fields
-        "response_times": [],           # list[float] — per-question seconds
+        "response_times": RingBuffer(_RESPONSE_TIME_CAPACITY, "f").to_doc(),   # per-question seconds
         "mistake_streak": 0,
         "correct_streak": 0,
         "cognitive_strain_index": 0.0,
@@ -40,7 +176,7 @@ def empty_performance() -> dict:
         # Weakness DNA
         "weakness_profile": {},         # topic -> WeaknessEntry
         # Rolling buffer for stress detection
-        "rolling_results": [],          # list[bool] — last N correct flags
+        "rolling_results": RingBuffer(_ROLLING_RESULTS_CAPACITY, "B").to_doc(),  # last N correct flags
         "stress_history": [],           # list[str] — logged stress events
     }
 
@@ -49,7 +185,7 @@ def empty_performance() -> dict:
 # Cognitive strain index
 # ---------------------------------------------------------------------------
 
-def _compute_csi(response_times: list[float], mistake_streak: int) -> float:
+def _compute_csi(response_times: RingBuffer, mistake_streak: int) -> float:
     """
     Cognitive Strain Index (0-100).
     Weighted combination of:
@@ -60,12 +196,8 @@ def _compute_csi(response_times: list[float], mistake_streak: int) -> float:
     if not response_times:
         return 0.0
 
-    avg_rt = sum(response_times) / len(response_times)
-    variance = (
-        sum((t - avg_rt) ** 2 for t in response_times) / len(response_times)
-        if len(response_times) > 1 else 0.0
-    )
-    std_rt = math.sqrt(variance)
+    avg_rt = response_times.mean()
+    std_rt = response_times.std()
 
     # Normalise: cap avg_rt at 60s → 0-1
     norm_avg   = min(avg_rt / 60.0, 1.0)
@@ -123,8 +255,8 @@ def detect_stress(perf: dict) -> dict:
     action: str | None = None
 
     mistake_streak = perf.get("mistake_streak", 0)
-    response_times = perf.get("response_times", [])
-    rolling: list[bool] = perf.get("rolling_results", [])
+    response_times = _response_times(perf)
+    rolling = _rolling_results(perf)
 
     # Trigger 1 — consecutive mistakes
     if mistake_streak >= _STRESS_MISTAKE_STREAK:
@@ -133,16 +265,15 @@ def detect_stress(perf: dict) -> dict:
 
     # Trigger 2 — sudden response-time spike
     if not stress and len(response_times) >= 2:
-        avg_prev = sum(response_times[:-1]) / len(response_times[:-1])
-        last = response_times[-1]
+        last = response_times.last()
+        avg_prev = (response_times.total - last) / (len(response_times) - 1)
         if avg_prev > 0 and last > 2.5 * avg_prev and last > _HIGH_RESPONSE_TIME_THRESHOLD:
             stress = True
             action = "micro_break"
 
     # Trigger 3 — rolling accuracy drop
     if not stress and len(rolling) >= _ROLLING_WINDOW:
-        recent = rolling[-_ROLLING_WINDOW:]
-        rolling_acc = sum(recent) / len(recent) * 100
+        rolling_acc = rolling.tail_sum(_ROLLING_WINDOW) / _ROLLING_WINDOW * 100
         if rolling_acc < 30:
             stress = True
             action = "simplified_explanation"
@@ -257,15 +388,14 @@ def record_answers(
     perf["total_time_seconds"] = perf.get("total_time_seconds", 0.0) + time_seconds
     perf["total_responses"] = perf.get("total_responses", 0) + total_count
 
-    # -- per-question times --
-    times_list: list[float] = perf.setdefault("response_times", [])
+    # -- per-question times (ring buffer keeps the last 50) --
+    times = _response_times(perf)
     if per_question_times and len(per_question_times) == total_count:
-        times_list.extend(per_question_times)
+        times.extend(per_question_times)
     elif total_count > 0 and time_seconds > 0:
         per = time_seconds / total_count
-        times_list.extend([per] * total_count)
-    # Keep last 50 entries to bound memory
-    perf["response_times"] = times_list[-50:]
+        times.extend([per] * total_count)
+    perf["response_times"] = times.to_doc()
 
     # -- streak --
     if correct_count == total_count and total_count > 0:
@@ -280,21 +410,19 @@ def record_answers(
     perf["best_streak"] = max(perf.get("best_streak", 0), perf.get("streak", 0))
 
     # -- rolling results for stress detection --
-    rolling: list[bool] = perf.setdefault("rolling_results", [])
-    for a in answers:
-        rolling.append(bool(a.get("correct", False)))
-    perf["rolling_results"] = rolling[-20:]  # keep last 20
+    rolling = _rolling_results(perf)
+    rolling.extend(1 if a.get("correct", False) else 0 for a in answers)
+    perf["rolling_results"] = rolling.to_doc()  # keep last 20
 
     # -- cognitive strain --
     perf["cognitive_strain_index"] = _compute_csi(
-        perf["response_times"], perf.get("mistake_streak", 0)
+        times, perf.get("mistake_streak", 0)
     )
 
     # -- adaptive mode --
     total_all = entry["total"]
     acc_all = (entry["correct"] / total_all * 100) if total_all > 0 else 0.0
-    rt_list = perf["response_times"]
-    avg_rt = sum(rt_list) / len(rt_list) if rt_list else 0.0
+    avg_rt = times.mean()
     perf["adaptive_mode"] = _determine_adaptive_mode(acc_all, avg_rt)
 
     # -- weakness DNA --
@@ -1,33 +1,50 @@
 """
 Podcast Engine — Generates two-speaker educational podcast scripts using the
 configured LLM (Gemini or Mistral/Ollama, via gemini_client) and synthesises
-speech with the ElevenLabs TTS API.
+speech with the deployment's TTS backend (ElevenLabs or a local engine, see
+tts_backends).
 """
 
 import os
 import re
 import json
+import time
 import uuid
+import asyncio
 from pathlib import Path
 
 import httpx
 
+from tts_backends import get_tts_backend
+from metrics import TTS_REQUEST_SECONDS, TTS_CACHE
+from tracing import span
+from tts_cache import SegmentCache, segment_key
+from episode_cache import EpisodeCache
+from podcast_storage import PodcastStorage
+from mp3_assembly import EpisodeLayout, assemble
+
 # ---------------------------------------------------------------------------
 # Config
 # ---------------------------------------------------------------------------
 
-ELEVENLABS_BASE = "https://api.elevenlabs.io/v1"
-ELEVENLABS_MODEL = os.getenv("ELEVENLABS_MODEL", "eleven_multilingual_v2")
+PODCAST_DIR = Path(__file__).parent / "podcast_audio"  # created on first write
 
-PODCAST_DIR = Path(__file__).parent / "podcast_audio"
-PODCAST_DIR.mkdir(exist_ok=True)
+# Synthesised segments are cached by content under PODCAST_DIR/tts_cache
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "512")) * 1024 * 1024
+_segment_cache = SegmentCache(PODCAST_DIR / "tts_cache", TTS_CACHE_MAX_BYTES)
 
-# ElevenLabs voice IDs  (override via env if needed)
-# Defaults: Adam (deep male) & Rachel (clear female)
-VOICE_MAP = {
-    "host": os.getenv("ELEVENLABS_HOST_VOICE", "pNInz6obpgDQGcFmaJgB"),   # Adam
-    "guest": os.getenv("ELEVENLABS_GUEST_VOICE", "21m00Tcm4TlvDq8ikWAM"),  # Rachel
-}
+# Episode audio lifecycle: manifests, age / size quotas, periodic GC
+PODCAST_MAX_AGE = float(os.getenv("PODCAST_MAX_AGE_DAYS", "30")) * 86400
+PODCAST_MAX_BYTES = int(os.getenv("PODCAST_MAX_TOTAL_MB", "2048")) * 1024 * 1024
+PODCAST_GC_INTERVAL = float(os.getenv("PODCAST_GC_INTERVAL_MINUTES", "30")) * 60
+_storage = PodcastStorage(PODCAST_DIR, PODCAST_MAX_AGE, PODCAST_MAX_BYTES)
+
+# Finished episodes are cached per normalised topic under PODCAST_DIR/episodes
+PODCAST_CACHE_MAX_AGE = float(os.getenv("PODCAST_CACHE_MAX_AGE_HOURS", "168")) * 3600
+PODCAST_CACHE_VARIANTS = int(os.getenv("PODCAST_CACHE_VARIANTS", "1"))
+_episode_cache = EpisodeCache(
+    PODCAST_DIR / "episodes", _storage.has_episode, PODCAST_CACHE_MAX_AGE, PODCAST_CACHE_VARIANTS,
+)
 
 SPEAKER_NAMES = {
     "host": "Alex",
@@ -35,11 +52,6 @@ SPEAKER_NAMES = {
 }
 
 
-def _get_api_key() -> str | None:
-    key = os.getenv("ELEVENLABS_API_KEY", "").strip()
-    return key if key else None
-
-
 # ---------------------------------------------------------------------------
 # 1. Script generation  (uses gemini_client → Gemini or Ollama/Mistral)
 # ---------------------------------------------------------------------------
@@ -130,123 +142,244 @@ def _fallback_script(topic: str) -> list[dict]:
 
 
 # ---------------------------------------------------------------------------
-# 2. TTS via ElevenLabs API
+# 2. TTS (backend selected per deployment, see tts_backends)
 # ---------------------------------------------------------------------------
 
-async def generate_tts_segment(text: str, voice_id: str) -> bytes | None:
-    """
-    Call ElevenLabs text-to-speech API.  Returns MP3 bytes or None on failure.
-    """
-    api_key = _get_api_key()
-    if not api_key:
-        return None
+def _clean_tts_text(text: str) -> str:
+    """Strip markdown characters the TTS engine would read out."""
+    return re.sub(r"[*_#`]", "", text).strip()
 
-    # Clean text for TTS
-    clean = re.sub(r"[*_#`]", "", text).strip()
-    if not clean:
-        return None
 
-    url = f"{ELEVENLABS_BASE}/text-to-speech/{voice_id}"
-    headers = {
-        "xi-api-key": api_key,
-        "Content-Type": "application/json",
-        "Accept": "audio/mpeg",
-    }
-    payload = {
-        "text": clean,
-        "model_id": ELEVENLABS_MODEL,
-        "voice_settings": {
-            "stability": 0.45,
-            "similarity_boost": 0.75,
-            "style": 0.35,
-            "use_speaker_boost": True,
-        },
-    }
+def tts_cache_key(text: str, voice_id: str) -> str:
+    """Cache key covering every input that changes the synthesised audio."""
+    return segment_key(*get_tts_backend().cache_parts(voice_id), _clean_tts_text(text))
 
-    try:
-        async with httpx.AsyncClient(timeout=120) as client:
-            resp = await client.post(url, headers=headers, json=payload)
-            if resp.status_code == 200:
-                return resp.content
-            else:
-                print(f"[TTS] ElevenLabs error {resp.status_code}: {resp.text[:200]}")
-                return None
-    except Exception as exc:
-        print(f"[TTS] Error: {exc}")
+
+async def generate_tts_segment(
+    text: str,
+    voice_id: str,
+    client: httpx.AsyncClient | None = None,
+) -> bytes | None:
+    """
+    Synthesise one segment with the configured TTS backend.  Returns MP3
+    bytes or None on failure.  `voice_id` is backend-specific (see
+    TTSBackend.voice_for); `client` is reused by HTTP backends.
+    """
+    clean = _clean_tts_text(text)
+    if not clean:
         return None
+    backend = get_tts_backend()
+    start = time.perf_counter()
+    with span("tts.synthesize", backend=backend.name, chars=len(clean)):
+        audio = await backend.synthesize(clean, voice_id, client=client)
+    TTS_REQUEST_SECONDS.observe(
+        time.perf_counter() - start, backend=backend.name, outcome="ok" if audio else "failed",
+    )
+    return audio
 
 
 # ---------------------------------------------------------------------------
 # 3. Audio utilities
 # ---------------------------------------------------------------------------
 
-def _concat_mp3s(segments: list[bytes]) -> bytes:
-    """Concatenate MP3 byte-strings (binary join works for CBR mp3)."""
-    return b"".join(segments)
+def _write_bytes(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+async def _write_file(path: Path, data: bytes):
+    """Write a file off the event loop."""
+    await asyncio.to_thread(_write_bytes, path, data)
+
+
+def full_episode_layout(filename: str) -> EpisodeLayout | None:
+    """
+    Resolve '<podcast_id>_full.mp3' to a single well-formed MP3 stream
+    built from the episode's segment files (see mp3_assembly). The full
+    episode is never stored as its own file. Reads segment files the first
+    time they are seen, so call it off the event loop.
+    """
+    podcast_id = _storage.full_episode_id(filename)
+    if podcast_id is None:
+        return None
+    paths = _storage.segment_paths(podcast_id)
+    if not paths or not all(p.exists() for p in paths):
+        return None
+    return assemble(paths)
+
+
+def run_storage_gc() -> dict:
+    """Apply podcast storage quotas and drop cache entries for deleted audio."""
+    result = _storage.gc()
+    result["cached_episodes"] = _episode_cache.prune()
+    return result
+
+
+def prime_caches() -> dict:
+    """Index the TTS segment cache now rather than on the first podcast."""
+    if not _segment_cache.enabled:
+        return {}
+    return {"tts_segments": _segment_cache.stats()["entries"]}
+
+
+async def storage_gc_loop():
+    """Background task: run storage GC every PODCAST_GC_INTERVAL seconds."""
+    while True:
+        try:
+            result = await asyncio.to_thread(run_storage_gc)
+            if result["episodes"] or result["bytes"]:
+                print(f"[Podcast] GC removed {result['episodes']} episodes, {result['bytes']} bytes")
+        except Exception as exc:
+            print(f"[Podcast] GC error: {exc}")
+        await asyncio.sleep(PODCAST_GC_INTERVAL)
 
 
 # ---------------------------------------------------------------------------
 # 4. Top-level pipeline
 # ---------------------------------------------------------------------------
 
-async def create_podcast(topic: str) -> dict:
+async def _synthesise_segment(
+    podcast_id: str,
+    idx: int,
+    total: int,
+    entry: dict,
+    client: httpx.AsyncClient,
+) -> tuple[int, str | None]:
+    speaker = entry.get("speaker", "host")
+    text = entry.get("text", "")
+    voice_id = get_tts_backend().voice_for(speaker)
+
+    seg_name = f"{podcast_id}_seg_{idx:02d}.mp3"
+    seg_path = PODCAST_DIR / seg_name
+    key = tts_cache_key(text, voice_id)
+
+    # Cache hit: hard-link the stored segment, no TTS call
+    if await asyncio.to_thread(_segment_cache.link_to, key, seg_path):
+        TTS_CACHE.inc(result="hit")
+        print(f"[Podcast] TTS {idx + 1}/{total}  [{speaker}]  cached")
+        entry["audio_url"] = f"/api/podcast-audio/{seg_name}"
+        return idx, seg_name
+
+    TTS_CACHE.inc(result="miss")
+    # The backend bounds provider concurrency across all episodes
+    print(f"[Podcast] TTS {idx + 1}/{total}  [{speaker}]  {text[:50]}…")
+    mp3 = await generate_tts_segment(text, voice_id, client=client)
+
+    if mp3:
+        await _write_file(seg_path, mp3)
+        await asyncio.to_thread(_segment_cache.put, key, seg_path)
+        entry["audio_url"] = f"/api/podcast-audio/{seg_name}"
+        return idx, seg_name
+    return idx, None
+
+
+async def stream_podcast(topic: str, use_cache: bool = True):
     """
-    End-to-end podcast creation:
-    1. Generate script with the configured LLM (Gemini / Mistral)
-    2. Synthesise speech per segment with ElevenLabs
-    3. Concatenate into a full episode MP3
+    Podcast pipeline as an async generator of (event, data) pairs:
+
+      script   — the full script, before any audio exists
+      segment  — one segment's audio is ready ({index, audio_url})
+      segment_failed — TTS gave up on a segment ({index})
+      episode  — the full episode grew ({full_audio_url, segments_ready, complete})
+      done     — final result, same shape as create_podcast()
+
+    All segments are submitted at once, and the TTS backend limits how
+    many run at a time across the process. Segments are reported as they
+    finish. The full episode (a virtual concatenation, see podcast_storage)
+    is extended in script order as soon as each contiguous prefix of
+    segments is ready. Closing the generator early (client disconnect)
+    cancels outstanding TTS work.
+
+    With use_cache, a cached episode for the topic is replayed as events
+    immediately and nothing is generated.
     """
     podcast_id = uuid.uuid4().hex[:12]
 
-    has_tts = _get_api_key() is not None
+    tts = get_tts_backend()
+    has_tts = tts.available()
     if not has_tts:
-        print("[Podcast] ELEVENLABS_API_KEY not set — text-only mode")
+        print(f"[Podcast] TTS backend '{tts.name}' not available — text-only mode")
+
+    if use_cache:
+        cached = await asyncio.to_thread(_episode_cache.get, topic, has_tts)
+        if cached:
+            print(f"[Podcast] Serving cached episode {cached['podcast_id']} for topic: {topic}")
+            yield "script", {
+                "podcast_id": cached["podcast_id"],
+                "topic": cached["topic"],
+                "script": cached["script"],
+                "has_tts": has_tts,
+            }
+            for idx, entry in enumerate(cached["script"]):
+                if entry.get("audio_url"):
+                    yield "segment", {"index": idx, "audio_url": entry["audio_url"]}
+            if cached.get("full_audio_url"):
+                yield "episode", {
+                    "full_audio_url": cached["full_audio_url"],
+                    "segments_ready": len(cached["script"]),
+                    "complete": True,
+                }
+            yield "done", cached
+            return
 
     # ── Step 1: script ──
     print(f"[Podcast] Generating script for topic: {topic}")
     script = await generate_podcast_script(topic)
-
-    # ── Step 2: TTS per segment ──
-    audio_parts: list[bytes] = []
-
-    for idx, entry in enumerate(script):
+    for entry in script:
         speaker = entry.get("speaker", "host")
-        text = entry.get("text", "")
-        voice_id = VOICE_MAP.get(speaker, VOICE_MAP["host"])
-
-        print(f"[Podcast] TTS {idx + 1}/{len(script)}  [{speaker}]  {text[:50]}…")
-
-        if has_tts:
-            mp3 = await generate_tts_segment(text, voice_id)
-        else:
-            mp3 = None
-
-        if mp3:
-            seg_name = f"{podcast_id}_seg_{idx:02d}.mp3"
-            seg_path = PODCAST_DIR / seg_name
-            with open(seg_path, "wb") as f:
-                f.write(mp3)
-            entry["audio_url"] = f"/api/podcast-audio/{seg_name}"
-            audio_parts.append(mp3)
-        else:
-            entry["audio_url"] = None
-
         if "name" not in entry:
             entry["name"] = SPEAKER_NAMES.get(speaker, speaker.title())
+        entry["audio_url"] = None
+
+    yield "script", {"podcast_id": podcast_id, "topic": topic, "script": script, "has_tts": has_tts}
 
-    # ── Step 3: full episode ──
+    # ── Step 2: TTS per segment (backend-bounded concurrency) + progressive episode ──
     full_audio_url = None
-    if audio_parts:
-        full_name = f"{podcast_id}_full.mp3"
-        full_path = PODCAST_DIR / full_name
-        with open(full_path, "wb") as f:
-            f.write(_concat_mp3s(audio_parts))
-        full_audio_url = f"/api/podcast-audio/{full_name}"
+    if has_tts and script:
+        await asyncio.to_thread(_storage.register, podcast_id, topic)
+        async with httpx.AsyncClient(timeout=120) as client:
+            tasks = [
+                asyncio.create_task(
+                    _synthesise_segment(podcast_id, idx, len(script), entry, client)
+                )
+                for idx, entry in enumerate(script)
+            ]
+            try:
+                ready: dict[int, str | None] = {}
+                next_idx = 0
+                for fut in asyncio.as_completed(tasks):
+                    idx, seg_name = await fut
+                    if seg_name:
+                        yield "segment", {"index": idx, "audio_url": script[idx]["audio_url"]}
+                    else:
+                        yield "segment_failed", {"index": idx}
+
+                    # ── Step 3: extend the full episode with the in-order prefix ──
+                    ready[idx] = seg_name
+                    appended: list[str] = []
+                    while next_idx in ready:
+                        name = ready.pop(next_idx)
+                        if name:
+                            appended.append(name)
+                        next_idx += 1
+                    if appended:
+                        await asyncio.to_thread(_storage.extend, podcast_id, appended)
+                        full_audio_url = f"/api/podcast-audio/{podcast_id}_full.mp3"
+                        yield "episode", {
+                            "full_audio_url": full_audio_url,
+                            "segments_ready": next_idx,
+                            "complete": next_idx == len(script),
+                        }
+            finally:
+                for task in tasks:
+                    task.cancel()
+        await asyncio.to_thread(_storage.finish, podcast_id)
 
     has_audio = full_audio_url is not None
     print(f"[Podcast] Done — {len(script)} segments, audio={'yes' if has_audio else 'no'}")
 
-    return {
+    result = {
         "podcast_id": podcast_id,
         "topic": topic,
         "script": script,
@@ -254,3 +387,49 @@ async def create_podcast(topic: str) -> dict:
         "has_audio": has_audio,
         "segments": len(script),
     }
+    # Only cache complete episodes: a text-only one when audio was expected,
+    # or one with failed segments (e.g. a 429 burst), would be served as
+    # the episode until it ages out
+    complete = bool(script) and all(entry.get("audio_url") for entry in script)
+    if complete or not has_tts:
+        await asyncio.to_thread(_episode_cache.put, topic, result)
+
+    yield "done", result
+
+
+async def create_podcast(topic: str, use_cache: bool = True) -> dict:
+    """
+    End-to-end podcast creation:
+    0. Serve a cached episode for the topic if one is fresh
+    1. Generate script with the configured LLM (Gemini / Mistral)
+    2. Synthesise speech per segment with the TTS backend, several at a time
+    3. Register the segments as a (virtual) full episode, served as one
+       MP3 stream with a single Xing header (see mp3_assembly)
+    """
+    result: dict = {}
+    async for event, data in stream_podcast(topic, use_cache=use_cache):
+        if event == "done":
+            result = data
+    return result
+
+
+async def prewarm_podcasts(topics: list[str], force: bool = False) -> list[dict]:
+    """
+    Generate episodes for `topics` one at a time (meant for off-peak runs).
+    Topics that already have enough cached variants are skipped unless
+    `force` is set.
+    """
+    summary = []
+    has_tts = get_tts_backend().available()
+    for topic in topics:
+        if not force and await asyncio.to_thread(_episode_cache.get, topic, has_tts):
+            summary.append({"topic": topic, "status": "cached"})
+            continue
+        try:
+            result = await create_podcast(topic, use_cache=False)
+            summary.append({"topic": topic, "status": "generated", "podcast_id": result["podcast_id"]})
+        except Exception as exc:
+            print(f"[Podcast] Pre-warm failed for {topic}: {exc}")
+            summary.append({"topic": topic, "status": "failed"})
+    print(f"[Podcast] Pre-warm finished: {summary}")
+    return summary
@@ -0,0 +1,158 @@
+"""
+Podcast audio storage lifecycle.
+
+Each episode has a small manifest (`<root>/manifests/<podcast_id>.json`)
+listing its segment files in play order. The full episode is never written
+as a separate file: it is served as a virtual concatenation of those
+segments, which halves disk usage.
+
+Garbage collection removes episodes older than `max_age_seconds` and then,
+least-recently-accessed first, enough episodes to keep the audio under
+`max_bytes`. Stray audio files without a manifest (e.g. from older
+versions) are removed once they are older than the age limit.
+"""
+
+from __future__ import annotations
+
+import re
+import json
+import time
+import threading
+from pathlib import Path
+
+_AUDIO_FILE = re.compile(r"^[a-z0-9]+_(seg_\d+|full)\.(mp3|wav)$")
+_FULL_NAME = re.compile(r"^([a-z0-9]+)_full\.mp3$")
+
+
+class PodcastStorage:
+    def __init__(self, root: Path, max_age_seconds: float, max_bytes: int):
+        self.root = root
+        self.manifest_dir = root / "manifests"
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    # -- manifests ---------------------------------------------------------
+
+    def _manifest_path(self, podcast_id: str) -> Path:
+        return self.manifest_dir / f"{podcast_id}.json"
+
+    def _read(self, podcast_id: str) -> dict | None:
+        try:
+            return json.loads(self._manifest_path(podcast_id).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, manifest: dict):
+        self.manifest_dir.mkdir(parents=True, exist_ok=True)
+        path = self._manifest_path(manifest["podcast_id"])
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        tmp.replace(path)
+
+    def register(self, podcast_id: str, topic: str):
+        """Start tracking a new (still empty) episode."""
+        now = time.time()
+        with self._lock:
+            self._write({
+                "podcast_id": podcast_id,
+                "topic": topic,
+                "created_at": now,
+                "last_access": now,
+                "segments": [],
+                "bytes": 0,
+                "complete": False,
+            })
+
+    def extend(self, podcast_id: str, segment_names: list[str]):
+        """Append segments (already on disk) to the episode in play order."""
+        with self._lock:
+            manifest = self._read(podcast_id)
+            if manifest is None:
+                return
+            for name in segment_names:
+                manifest["segments"].append(name)
+                manifest["bytes"] += (self.root / name).stat().st_size
+            self._write(manifest)
+
+    def finish(self, podcast_id: str):
+        with self._lock:
+            manifest = self._read(podcast_id)
+            if manifest is None:
+                return
+            manifest["complete"] = True
+            self._write(manifest)
+
+    def has_episode(self, podcast_id: str) -> bool:
+        manifest = self._read(podcast_id)
+        return bool(manifest and manifest["segments"]) and all(
+            (self.root / name).exists() for name in manifest["segments"]
+        )
+
+    def segment_paths(self, podcast_id: str) -> list[Path] | None:
+        """Ordered segment files of an episode, marking it recently used."""
+        with self._lock:
+            manifest = self._read(podcast_id)
+            if manifest is None or not manifest["segments"]:
+                return None
+            manifest["last_access"] = time.time()
+            self._write(manifest)
+        return [self.root / name for name in manifest["segments"]]
+
+    @staticmethod
+    def full_episode_id(filename: str) -> str | None:
+        """'<id>_full.mp3' -> '<id>', else None."""
+        m = _FULL_NAME.match(filename)
+        return m.group(1) if m else None
+
+    # -- garbage collection ------------------------------------------------
+
+    def _delete(self, manifest: dict):
+        for name in manifest["segments"]:
+            (self.root / name).unlink(missing_ok=True)
+        self._manifest_path(manifest["podcast_id"]).unlink(missing_ok=True)
+
+    def gc(self) -> dict:
+        """Apply age and size quotas. Returns what was removed."""
+        now = time.time()
+        removed_eps = 0
+        removed_bytes = 0
+        with self._lock:
+            manifests = []
+            if self.manifest_dir.is_dir():
+                for path in self.manifest_dir.glob("*.json"):
+                    manifest = self._read(path.stem)
+                    if manifest is not None:
+                        manifests.append(manifest)
+
+            # Age quota
+            keep = []
+            for m in manifests:
+                if self.max_age_seconds > 0 and now - m["created_at"] > self.max_age_seconds:
+                    self._delete(m)
+                    removed_eps += 1
+                    removed_bytes += m["bytes"]
+                else:
+                    keep.append(m)
+
+            # Size quota — least recently accessed first
+            total = sum(m["bytes"] for m in keep)
+            if self.max_bytes > 0 and total > self.max_bytes:
+                keep.sort(key=lambda m: m["last_access"])
+                while keep and total > self.max_bytes:
+                    m = keep.pop(0)
+                    self._delete(m)
+                    total -= m["bytes"]
+                    removed_eps += 1
+                    removed_bytes += m["bytes"]
+
+            # Untracked audio files
+            tracked = {name for m in keep for name in m["segments"]}
+            for path in (self.root.iterdir() if self.root.is_dir() else ()):
+                if path.is_file() and _AUDIO_FILE.match(path.name) and path.name not in tracked:
+                    st = path.stat()
+                    if self.max_age_seconds > 0 and now - st.st_mtime > self.max_age_seconds:
+                        path.unlink(missing_ok=True)
+                        removed_bytes += st.st_size
+
+        return {"episodes": removed_eps, "bytes": removed_bytes, "remaining_bytes": total}
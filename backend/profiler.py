@@ -0,0 +1,365 @@
+"""
+On-demand sampling profiler for individual requests.
+
+An admin adds `X-Profile: 1` (or `?_profile=1`) together with a valid
+`X-Admin-Token` to any request. While that request runs, a sampler thread
+records its stack every PROFILE_INTERVAL_MS. Nothing is installed in the
+interpreter (no setprofile / settrace), so unprofiled requests cost one
+header check and the profiled one stays close to its normal speed.
+
+Samples are attributed to the request in two places:
+  - on the event-loop thread, when the request's middleware frame is on the
+    stack (route handler, record_answers, store_chunks, ...);
+  - on worker threads, when the work item was started from the request's
+    context (asyncio.to_thread / Starlette's threadpool: extract_text,
+    chunk_text, sync routes, ...).
+
+When the request finishes, the profile is written to PROFILE_DIR as a
+speedscope JSON file and a collapsed-stack text file (for flamegraph.pl /
+inferno). Only the newest PROFILE_MAX_FILES profiles are kept. The response
+carries `X-Profile-Id`; GET /api/admin/profiles lists profiles and
+GET /api/admin/profiles/{id} downloads one.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import secrets
+import functools
+import threading
+import contextvars
+from pathlib import Path
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from auth import ADMIN_TOKEN
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(Path(__file__).parent / "profiles")))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+
+PROFILE_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+FORMATS = {
+    "speedscope": (".speedscope.json", "application/json"),
+    "collapsed": (".collapsed.txt", "text/plain; charset=utf-8"),
+}
+
+_active: contextvars.ContextVar["ProfileSession | None"] = contextvars.ContextVar("profile_session", default=None)
+
+# Frames under this many outermost frames of a worker thread are searched for
+# the contextvars.Context the work item runs in
+_WORKER_BASE_DEPTH = 8
+
+FrameKey = tuple[str, str, int]  # (qualified name, file, first line)
+
+
+class ProfileSession:
+    def __init__(self, name: str, anchor, loop_thread: int):
+        self.profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(4)}"
+        self.name = name
+        self.anchor = anchor                  # the middleware frame of this request
+        self.loop_thread = loop_thread
+        self.started = time.perf_counter()
+        self.created_at = time.time()
+        self.samples: list[tuple[tuple[FrameKey, ...], float]] = []  # (root-first stack, weight ms)
+        self.stopped = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+# ---------------------------------------------------------------------------
+# Sampler thread
+# ---------------------------------------------------------------------------
+
+_sessions: set[ProfileSession] = set()
+_sessions_lock = threading.Lock()
+_sampler: threading.Thread | None = None
+
+
+def _frame_key(frame) -> FrameKey:
+    code = frame.f_code
+    return (code.co_qualname, code.co_filename, code.co_firstlineno)
+
+
+def _loop_stack(frame, anchor) -> tuple[FrameKey, ...] | None:
+    """Root-first stack down to the request's anchor frame, or None if absent."""
+    keys = []
+    while frame is not None:
+        keys.append(_frame_key(frame))
+        if frame is anchor:
+            keys.reverse()
+            return tuple(keys)
+        frame = frame.f_back
+    return None
+
+
+def _worker_session(frame) -> tuple[ProfileSession | None, tuple[FrameKey, ...]]:
+    """Session whose context a worker thread is running in, and its stack."""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    for i, f in enumerate(frames[:_WORKER_BASE_DEPTH]):
+        local = f.f_locals
+        ctx = local.get("context")  # anyio WorkerThread.run
+        if not isinstance(ctx, contextvars.Context):
+            fn = getattr(local.get("self"), "fn", None)  # concurrent.futures _WorkItem.run
+            owner = getattr(getattr(fn, "func", None), "__self__", None) if isinstance(fn, functools.partial) else None
+            ctx = owner if isinstance(owner, contextvars.Context) else None
+        if ctx is not None:
+            session = ctx.get(_active)
+            if session is None:
+                return None, ()
+            stack = tuple(_frame_key(x) for x in frames[i + 1:])
+            return session, (("<worker thread>", "", 0), *stack)
+    return None, ()
+
+
+def _sample_loop():
+    global _sampler
+    last = time.perf_counter()
+    while True:
+        time.sleep(PROFILE_INTERVAL)
+        now = time.perf_counter()
+        weight = (now - last) * 1000
+        last = now
+        with _sessions_lock:
+            sessions = [s for s in _sessions if not s.stopped]
+            if not sessions:
+                _sampler = None
+                return
+        frames = sys._current_frames()
+        me = threading.get_ident()
+        for session in sessions:
+            if session.elapsed > PROFILE_MAX_SECONDS:
+                session.stopped = True
+                print(f"[Profile] {session.name}: sampling stopped after {PROFILE_MAX_SECONDS:.0f}s")
+                continue
+            loop_frame = frames.get(session.loop_thread)
+            stack = _loop_stack(loop_frame, session.anchor) if loop_frame is not None else None
+            if stack:
+                session.samples.append((stack, weight))
+        # Worker threads: attribute each to at most one session
+        for tid, frame in frames.items():
+            if tid == me or any(tid == s.loop_thread for s in sessions):
+                continue
+            session, stack = _worker_session(frame)
+            if session is not None and not session.stopped and stack:
+                session.samples.append((stack, weight))
+        del frames
+
+
+def _start(session: ProfileSession):
+    global _sampler
+    with _sessions_lock:
+        _sessions.add(session)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="profile-sampler", daemon=True)
+            _sampler.start()
+
+
+def _stop(session: ProfileSession):
+    with _sessions_lock:
+        session.stopped = True
+        _sessions.discard(session)
+
+
+# ---------------------------------------------------------------------------
+# Output formats
+# ---------------------------------------------------------------------------
+
+def _label(key: FrameKey) -> str:
+    name, filename, _ = key
+    label = f"{name} ({os.path.basename(filename)})" if filename else name
+    return label.replace(";", ":")
+
+
+def to_collapsed(session: ProfileSession) -> str:
+    """One `root;...;leaf <samples>` line per distinct stack."""
+    counts: dict[str, int] = {}
+    for stack, _ in session.samples:
+        line = ";".join(_label(k) for k in stack)
+        counts[line] = counts.get(line, 0) + 1
+    return "".join(f"{line} {n}\n" for line, n in sorted(counts.items()))
+
+
+def to_speedscope(session: ProfileSession, duration_ms: float, status: int) -> dict:
+    """Speedscope 'sampled' profile, in time order (runs of equal stacks merged)."""
+    frame_index: dict[FrameKey, int] = {}
+    frames: list[dict] = []
+    samples: list[list[int]] = []
+    weights: list[float] = []
+    previous = None
+    for stack, weight in session.samples:
+        if stack == previous:
+            weights[-1] += weight
+            continue
+        previous = stack
+        ids = []
+        for key in stack:
+            idx = frame_index.get(key)
+            if idx is None:
+                idx = frame_index[key] = len(frames)
+                frames.append({"name": key[0], "file": key[1], "line": key[2]} if key[1] else {"name": key[0]})
+            ids.append(idx)
+        samples.append(ids)
+        weights.append(weight)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": session.name,
+        "exporter": "neurolearn-profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": session.name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": [round(w, 3) for w in weights],
+        }],
+        "neurolearn": {
+            "profile_id": session.profile_id,
+            "created_at": session.created_at,
+            "duration_ms": round(duration_ms, 1),
+            "status": status,
+            "samples": len(session.samples),
+            "interval_ms": PROFILE_INTERVAL * 1000,
+        },
+    }
+
+
+def _prune():
+    files = sorted(PROFILE_DIR.glob("*.speedscope.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[max(PROFILE_MAX_FILES, 1):]:
+        profile_id = old.name.removesuffix(".speedscope.json")
+        for suffix, _ in FORMATS.values():
+            (PROFILE_DIR / f"{profile_id}{suffix}").unlink(missing_ok=True)
+
+
+def write_profile(session: ProfileSession, duration_ms: float, status: int):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    base = PROFILE_DIR / session.profile_id
+    Path(f"{base}.collapsed.txt").write_text(to_collapsed(session), encoding="utf-8")
+    doc = to_speedscope(session, duration_ms, status)
+    Path(f"{base}.speedscope.json").write_text(json.dumps(doc, separators=(",", ":")), encoding="utf-8")
+    _prune()
+    print(
+        f"[Profile] {session.name} {duration_ms:.0f}ms: {len(session.samples)} samples "
+        f"-> {session.profile_id}"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Listing / download
+# ---------------------------------------------------------------------------
+
+def list_profiles() -> list[dict]:
+    """Stored profiles, newest first."""
+    if not PROFILE_DIR.is_dir():
+        return []
+    out = []
+    for path in sorted(PROFILE_DIR.glob("*.speedscope.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+        try:
+            doc = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        meta = doc.get("neurolearn", {})
+        out.append({
+            "profile_id": meta.get("profile_id", path.name.removesuffix(".speedscope.json")),
+            "name": doc.get("name", ""),
+            "created_at": meta.get("created_at"),
+            "duration_ms": meta.get("duration_ms"),
+            "status": meta.get("status"),
+            "samples": meta.get("samples"),
+            "size_bytes": path.stat().st_size,
+        })
+    return out
+
+
+def profile_path(profile_id: str, fmt: str) -> Path | None:
+    """File for a profile id / format, or None (also for malformed ids)."""
+    if fmt not in FORMATS or not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = PROFILE_DIR / f"{profile_id}{FORMATS[fmt][0]}"
+    return path if path.is_file() else None
+
+
+# ---------------------------------------------------------------------------
+# ASGI middleware
+# ---------------------------------------------------------------------------
+
+def _requested(scope: Scope) -> bool:
+    """Profiling flag present and X-Admin-Token valid."""
+    flag = token = None
+    for key, value in scope.get("headers", ()):
+        if key == b"x-profile":
+            flag = value
+        elif key == b"x-admin-token":
+            token = value
+    if flag is None:
+        query = scope.get("query_string", b"")
+        if not re.search(rb"(^|&)_profile=(1|true)(&|$)", query):
+            return False
+    elif flag.strip().lower() not in (b"1", b"true"):
+        return False
+    if not ADMIN_TOKEN or token is None:
+        return False
+    return secrets.compare_digest(token, ADMIN_TOKEN.encode())
+
+
+class ProfilerMiddleware:
+    """Sample a single request's stacks when an admin asks for it."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+        with _sessions_lock:
+            busy = len(_sessions) >= PROFILE_MAX_CONCURRENT
+        if busy:
+            print(f"[Profile] {PROFILE_MAX_CONCURRENT} profiles already running; not profiling {scope['path']}")
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(f"{scope['method']} {scope['path']}", sys._getframe(), threading.get_ident())
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []), (b"x-profile-id", session.profile_id.encode()),
+                ]
+            await send(message)
+
+        token = _active.set(session)
+        _start(session)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _stop(session)
+            _active.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                session.name = f"{scope['method']} {route.path}"
+            duration_ms = session.elapsed * 1000
+            # Written from a thread so the loop isn't blocked on disk
+            try:
+                await asyncio.to_thread(write_profile, session, duration_ms, status)
+            except OSError as exc:
+                print(f"[Profile] Could not write {session.profile_id}: {exc}")
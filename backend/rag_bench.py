@@ -0,0 +1,427 @@
+"""
+Micro-benchmarks for material_rag ingestion and retrieval.
+
+    python rag_bench.py                                   # default matrix
+    python rag_bench.py --pages 1,100,1000,10000 --files 1,10,50 --json rag.json
+    python rag_bench.py --compare rag.json                # exit 1 on regression
+    python rag_bench.py --corpus-dir ~/slides --labels slides_queries.jsonl
+
+For each (pages, files) scenario a deterministic synthetic corpus is built:
+English-like filler sampled with a Zipf distribution, per-topic vocabulary,
+and one planted fact per page. The pages are split across `files`
+uploads, and each upload goes through chunk_text + store_chunks, as an
+upload does. Labeled queries then run through retrieve_chunks. There are
+two kinds of query:
+  - exact: names the fact's unique entity;
+  - paraphrase: only its object and topic words, which also appear in
+    distractor pages.
+
+Measured per scenario:
+  - ingest time (chunking and indexing split, per upload and total);
+  - peak RSS growth during ingest (each scenario runs in its own process);
+  - index size (pickled store, matrix non-zeros, vocabulary);
+  - retrieval latency p50 / p95 / p99;
+  - recall@1/3/5 and MRR, per query kind.
+
+--corpus-dir benchmarks real PDF / PPTX / TXT files instead. Recall is
+computed when --labels gives JSON lines of {"query": ..., "relevant":
+[substring, ...]}.
+
+Before measuring, each scenario indexes and queries a throwaway session,
+so lazily imported dependencies (scikit-learn, scipy) are loaded and the
+numbers are the engine's own, not import cost.
+
+Results are printed as a table and can be written as JSON (--json). Any
+module with the same chunk_text / store_chunks / retrieve_chunks /
+clear_material API can be benchmarked with --engine.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import pickle
+import random
+import argparse
+import platform
+import importlib
+import subprocess
+from pathlib import Path
+
+RECALL_KS = (1, 3, 5)
+
+# ---------------------------------------------------------------------------
+# Synthetic corpus
+# ---------------------------------------------------------------------------
+
+_COMMON = (
+    "the of and to in is that for it as with was on be by this are or from at which an have not "
+    "they but one all can were has more their also when there been its other these some time into "
+    "only used two may then first any each most such over new would where after system data value "
+    "process example number case result method model form part different between because set order "
+    "state following given point level important however structure function problem called way use "
+    "approach large small both while since often under within without through during across"
+).split()
+
+_SYLLABLES = ("ka", "lo", "mi", "ren", "to", "vax", "qui", "zor", "bel", "dra", "nu", "sen", "pho", "tri", "gal", "mor")
+_RELATIONS = ("stabilises", "encodes", "schedules", "compresses", "validates", "allocates", "routes", "indexes")
+
+
+def _word(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(syllables))
+
+
+class SyntheticCorpus:
+    """Deterministic pages with planted facts and labeled queries."""
+
+    def __init__(self, pages: int, seed: int = 7, topics: int = 40, words_per_page: int = 300):
+        rng = random.Random(seed)
+        self.topic_words = [[_word(rng, 3) for _ in range(30)] for _ in range(topics)]
+        zipf = [1 / (i + 1) for i in range(len(_COMMON))]
+        self.pages: list[str] = []
+        self.queries: list[dict] = []
+
+        objects = [_word(rng, 4) for _ in range(max(pages // 4, 1))]
+        for p in range(pages):
+            topic = p % topics
+            vocab = self.topic_words[topic]
+            entity = f"{_word(rng, 4)}{p}"
+            obj = objects[p % len(objects)]
+            relation = rng.choice(_RELATIONS)
+            context = rng.sample(vocab, 2)
+            fact = f"The {entity} {relation} the {obj} during {context[0]} {context[1]}."
+
+            sentences = []
+            words = 0
+            while words < words_per_page:
+                n = rng.randint(8, 20)
+                body = rng.choices(_COMMON, weights=zipf, k=n - 3) + rng.sample(vocab, 3)
+                rng.shuffle(body)
+                sentences.append(" ".join(body).capitalize() + ".")
+                words += n
+            sentences.insert(rng.randint(0, len(sentences)), fact)
+            self.pages.append(f"Page {p + 1}\n\n" + " ".join(sentences))
+
+            self.queries.append({"kind": "exact", "query": f"What does the {entity} {relation}?", "relevant": [fact]})
+            self.queries.append({
+                "kind": "paraphrase",
+                "query": f"Which component {relation} the {obj} in {context[0]} {context[1]}?",
+                "relevant": [fact],
+            })
+
+    def files(self, count: int) -> list[tuple[str, str]]:
+        """The pages split into `count` uploads of contiguous pages."""
+        count = max(min(count, len(self.pages)), 1)
+        per_file = -(-len(self.pages) // count)
+        return [
+            (f"synthetic_{i + 1}.pdf", "\n\n".join(self.pages[i * per_file:(i + 1) * per_file]))
+            for i in range(count)
+            if self.pages[i * per_file:(i + 1) * per_file]
+        ]
+
+
+def load_corpus_dir(path: Path, limit: int) -> list[tuple[str, str]]:
+    from material_rag import extract_text
+
+    files = []
+    for f in sorted(path.iterdir()):
+        if f.suffix.lower() not in (".pdf", ".pptx", ".txt", ".md"):
+            continue
+        with open(f, "rb") as fh:
+            files.append((f.name, extract_text(f.name, fh)))
+        if len(files) >= limit:
+            break
+    return files
+
+
+def load_labels(path: Path) -> list[dict]:
+    queries = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            item = json.loads(line)
+            queries.append({"kind": item.get("kind", "labeled"), "query": item["query"], "relevant": item["relevant"]})
+    return queries
+
+
+# ---------------------------------------------------------------------------
+# Measurements
+# ---------------------------------------------------------------------------
+
+def _peak_rss_bytes() -> int:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(max(int(round(q * len(sorted_values) + 0.5)) - 1, 0), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+
+def _index_stats(engine, session_id: str) -> dict:
+    store = getattr(engine, "_stores", {}).get(session_id)
+    if store is None:
+        return {}
+    stats = {"index_bytes": len(pickle.dumps(store, protocol=pickle.HIGHEST_PROTOCOL))}
+    matrix = store.get("matrix")
+    if matrix is not None and hasattr(matrix, "nnz"):
+        stats["matrix_nnz"] = int(matrix.nnz)
+    vectorizer = store.get("vectorizer")
+    if vectorizer is not None and hasattr(vectorizer, "vocabulary_"):
+        stats["vocabulary"] = len(vectorizer.vocabulary_)
+    return stats
+
+
+def _recall(queries: list[dict], results: list[list[str]]) -> dict:
+    by_kind: dict[str, dict] = {}
+    for q, chunks in zip(queries, results):
+        rank = next(
+            (i + 1 for i, chunk in enumerate(chunks) if any(r in chunk for r in q["relevant"])),
+            None,
+        )
+        for kind in ("all", q["kind"]):
+            entry = by_kind.setdefault(kind, {"queries": 0, "rr": 0.0, **{f"recall@{k}": 0 for k in RECALL_KS}})
+            entry["queries"] += 1
+            if rank is not None:
+                entry["rr"] += 1 / rank
+                for k in RECALL_KS:
+                    if rank <= k:
+                        entry[f"recall@{k}"] += 1
+    out = {}
+    for kind, entry in by_kind.items():
+        n = entry["queries"]
+        out[kind] = {"queries": n, "mrr": round(entry["rr"] / n, 4)}
+        out[kind].update({f"recall@{k}": round(entry[f"recall@{k}"] / n, 4) for k in RECALL_KS})
+    return out
+
+
+def _warm_up(engine):
+    """Index and query a throwaway session so lazy imports happen before measuring."""
+    session_id = "bench-warmup"
+    engine.store_chunks(session_id, engine.chunk_text("Warm-up text for the benchmark engine."), filename="warmup.txt")
+    engine.retrieve_chunks(session_id, "warm-up", top_k=1)
+    engine.clear_material(session_id)
+
+
+def run_scenario(spec: dict) -> dict:
+    """Ingest one corpus and query it; returns the result record."""
+    engine = importlib.import_module(spec["engine"])
+    if spec.get("corpus_dir"):
+        files = load_corpus_dir(Path(spec["corpus_dir"]), spec["files"])
+        queries = load_labels(Path(spec["labels"])) if spec.get("labels") else []
+    else:
+        corpus = SyntheticCorpus(spec["pages"], seed=spec["seed"])
+        files = corpus.files(spec["files"])
+        queries = corpus.queries
+    rng = random.Random(spec["seed"])
+    if len(queries) > spec["queries"]:
+        queries = rng.sample(queries, spec["queries"])
+
+    _warm_up(engine)
+    session_id = f"bench-{spec['name']}"
+    engine.clear_material(session_id)
+    rss_before = _peak_rss_bytes()
+
+    chunk_s = index_s = 0.0
+    per_file_ms = []
+    chunks_total = 0
+    for filename, text in files:
+        t0 = time.perf_counter()
+        chunks = engine.chunk_text(text)
+        t1 = time.perf_counter()
+        engine.store_chunks(session_id, chunks, filename=filename)
+        t2 = time.perf_counter()
+        chunk_s += t1 - t0
+        index_s += t2 - t1
+        per_file_ms.append(round((t2 - t0) * 1000, 2))
+        chunks_total += len(chunks)
+    peak_growth = max(_peak_rss_bytes() - rss_before, 0)
+
+    latencies = []
+    results = []
+    top_k = max(RECALL_KS)
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(engine.retrieve_chunks(session_id, q["query"], top_k=top_k))
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+
+    record = {
+        "name": spec["name"],
+        "engine": spec["engine"],
+        "corpus": "dir" if spec.get("corpus_dir") else "synthetic",
+        "pages": spec.get("pages"),
+        "files": len(files),
+        "text_bytes": sum(len(t.encode()) for _, t in files),
+        "chunks": chunks_total,
+        "ingest": {
+            "total_s": round(chunk_s + index_s, 4),
+            "chunk_s": round(chunk_s, 4),
+            "index_s": round(index_s, 4),
+            "per_file_ms": per_file_ms,
+        },
+        "memory": {"peak_rss_growth_bytes": peak_growth, "peak_rss_bytes": _peak_rss_bytes()},
+        "index": _index_stats(engine, session_id),
+        "query": {
+            "count": len(latencies),
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        },
+        "quality": _recall(queries, results) if queries else {},
+    }
+    engine.clear_material(session_id)
+    return record
+
+
+# ---------------------------------------------------------------------------
+# Driver, report and regression check
+# ---------------------------------------------------------------------------
+
+def _run_isolated(spec: dict) -> dict:
+    """Run a scenario in a fresh interpreter so peak RSS is its own."""
+    proc = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--run-scenario", json.dumps(spec)],
+        cwd=str(Path(__file__).parent), capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Scenario {spec['name']} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _environment() -> dict:
+    env = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+    for module in ("sklearn", "numpy", "scipy"):
+        try:
+            env[module] = importlib.import_module(module).__version__
+        except ImportError:
+            pass
+    try:
+        env["git"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=str(Path(__file__).parent),
+        ).stdout.strip()
+    except OSError:
+        pass
+    return env
+
+
+def print_table(results: list[dict]):
+    print(
+        f"\n{'scenario':<22} {'chunks':>7} {'ingest_s':>9} {'index_s':>8} {'rss_MB':>7} {'index_MB':>8} "
+        f"{'q_p50ms':>8} {'q_p95ms':>8} {'R@1':>5} {'R@5':>5} {'MRR':>5}"
+    )
+    for r in results:
+        quality = r["quality"].get("all", {})
+        print(
+            f"{r['name']:<22} {r['chunks']:>7} {r['ingest']['total_s']:>9.3f} {r['ingest']['index_s']:>8.3f} "
+            f"{r['memory']['peak_rss_growth_bytes'] / 1e6:>7.1f} {r['index'].get('index_bytes', 0) / 1e6:>8.2f} "
+            f"{r['query']['p50_ms']:>8.2f} {r['query']['p95_ms']:>8.2f} "
+            f"{quality.get('recall@1', float('nan')):>5.2f} {quality.get('recall@5', float('nan')):>5.2f} "
+            f"{quality.get('mrr', float('nan')):>5.2f}"
+        )
+    kinds = sorted({k for r in results for k in r["quality"] if k != "all"})
+    for kind in kinds:
+        line = ", ".join(
+            f"{r['name']} {r['quality'][kind]['recall@5']:.2f}" for r in results if kind in r["quality"]
+        )
+        print(f"  recall@5 ({kind}): {line}")
+
+
+def compare(
+    results: list[dict],
+    baseline_path: Path,
+    time_tolerance: float,
+    recall_tolerance: float,
+    noise_ms: float,
+) -> list[str]:
+    """Regressions of `results` against a previous --json report."""
+    baseline = {r["name"]: r for r in json.loads(baseline_path.read_text())["results"]}
+    problems = []
+    for r in results:
+        base = baseline.get(r["name"])
+        if base is None:
+            continue
+        # (metric, now, then, smallest absolute change that counts)
+        checks = (
+            ("ingest.total_s", r["ingest"]["total_s"], base["ingest"]["total_s"], noise_ms / 1000),
+            ("query.p95_ms", r["query"]["p95_ms"], base["query"]["p95_ms"], noise_ms),
+            ("index_bytes", r["index"].get("index_bytes", 0), base["index"].get("index_bytes", 0), 0),
+        )
+        for metric, now, then, floor in checks:
+            if then and now > then * (1 + time_tolerance) and now - then > floor:
+                problems.append(f"{r['name']}: {metric} {then} -> {now} (+{(now / then - 1) * 100:.0f}%)")
+        now_q, then_q = r["quality"].get("all", {}), base["quality"].get("all", {})
+        for k in RECALL_KS:
+            key = f"recall@{k}"
+            if key in now_q and key in then_q and now_q[key] < then_q[key] - recall_tolerance:
+                problems.append(f"{r['name']}: {key} {then_q[key]} -> {now_q[key]}")
+    return problems
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="material_rag ingestion / retrieval benchmarks")
+    parser.add_argument("--pages", type=_int_list, default=[1, 10, 100, 1000], help="comma-separated page counts")
+    parser.add_argument("--files", type=_int_list, default=[1, 10], help="comma-separated uploads per session")
+    parser.add_argument("--queries", type=int, default=200, help="max labeled queries per scenario")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--engine", default="material_rag", help="module with the material_rag API")
+    parser.add_argument("--corpus-dir", default="", help="benchmark real files from this directory instead")
+    parser.add_argument("--labels", default="", help="JSON lines {query, relevant: [substring, ...]} for --corpus-dir")
+    parser.add_argument("--in-process", action="store_true", help="don't isolate scenarios (peak RSS is then cumulative)")
+    parser.add_argument("--json", default="", help="write results to this file")
+    parser.add_argument("--compare", default="", help="previous --json report; exit 1 on regression")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="allowed slowdown / growth ratio")
+    parser.add_argument("--noise-ms", type=float, default=10.0, help="ignore timing changes smaller than this")
+    parser.add_argument("--recall-tolerance", type=float, default=0.02, help="allowed recall drop")
+    parser.add_argument("--run-scenario", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(json.loads(args.run_scenario))))
+        return
+
+    if args.corpus_dir:
+        specs = [{
+            "name": f"dir-f{n}", "engine": args.engine, "corpus_dir": args.corpus_dir, "labels": args.labels,
+            "files": n, "queries": args.queries, "seed": args.seed,
+        } for n in args.files]
+    else:
+        specs = [{
+            "name": f"synthetic-p{p}-f{f}", "engine": args.engine, "pages": p, "files": f,
+            "queries": args.queries, "seed": args.seed,
+        } for p in args.pages for f in args.files if f <= p]
+
+    results = []
+    for spec in specs:
+        start = time.perf_counter()
+        record = run_scenario(spec) if args.in_process else _run_isolated(spec)
+        results.append(record)
+        print(f"[RAGBench] {spec['name']} done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps({"environment": _environment(), "results": results}, indent=2))
+        print(f"[RAGBench] Results written to {args.json}")
+    if args.compare:
+        problems = compare(
+            results, Path(args.compare), args.time_tolerance, args.recall_tolerance, args.noise_ms,
+        )
+        for p in problems:
+            print(f"[RAGBench] REGRESSION {p}")
+        if problems:
+            sys.exit(1)
+        print("[RAGBench] No regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
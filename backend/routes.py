@@ -1,6 +1,10 @@
+import copy
+import math
 import uuid
+import asyncio
+import weakref
 from datetime import datetime, timezone
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header
 from schemas import (
     StartSessionRequest,
     StartSessionResponse,
@@ -11,6 +15,7 @@ from schemas import (
     ExerciseResponse,
     SubmitExerciseRequest,
     SubmitExerciseResponse,
+    QuestionResult,
     ProgressResponse,
     WeaknessProfileResponse,
     MaterialUploadResponse,
@@ -21,13 +26,18 @@ from schemas import (
     FlashcardResponse,
     PodcastRequest,
     PodcastResponse,
+    PodcastPrewarmRequest,
+    JobResponse,
+    CohortRequest,
+    CohortAnalyticsResponse,
+    UserDashboardResponse,
     UserCreate,
     UserLogin,
     User,
     Token,
 )
-from database import create_session, get_session, update_session, get_users_collection
-from auth import create_access_token, get_password_hash, verify_password, get_current_user
+from database import create_session, get_session, update_session, get_users_collection, SessionConflict
+from auth import create_access_token, get_password_hash, verify_password, get_current_user, require_admin
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi import Depends
 from adaptive_engine import (
@@ -39,13 +49,13 @@ from adaptive_engine import (
 )
 from gemini_client import generate_text, generate_json
 from performance_tracker import (
-    record_answers,
     compute_mastery,
     detect_weaknesses,
     get_study_recommendations,
     detect_stress,
     get_weakness_dna,
     empty_performance,
+    avg_response_time,
 )
 from material_rag import (
     extract_text,
@@ -56,6 +66,21 @@ from material_rag import (
     build_rag_lesson_prompt,
     build_rag_exercise_prompt,
 )
+from cohort_analytics import (
+    cohort_snapshot,
+    record_rollups,
+    get_subject_cohort,
+    get_user_group_cohort,
+    rebuild_subject_rollup,
+    RebuildThrottled,
+    get_user_dashboard,
+    rebuild_user_rollup,
+)
+from job_queue import job_queue, job_handler, JobError
+from loop_monitor import loop_monitor
+from profiler import FORMATS as PROFILE_FORMATS, list_profiles, profile_path
+from answer_keys import AnswerKeyError, store_question_set, grade, release
+from answer_log import make_answer_event, apply_answer_event, pending_event, flush_pending_event, AnswerLogError
 from flashcard_engine import (
     generate_flashcard_prompt,
     generate_flashcard_custom_topic_prompt,
@@ -137,6 +162,7 @@ async def diagnostic_questions(req: GenerateRequest):
 
     prompt = generate_diagnostic_prompt(session["subject"], req.question_type)
     questions = await generate_json(prompt)
+    questions = await store_question_set(session["id"], "diagnostic", questions, req.question_type)
     return {"questions": questions, "subject": session["subject"]}
 
 
@@ -146,31 +172,25 @@ async def diagnostic(req: DiagnosticRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    correct, total = _score_answers(req.answers)
+    scored = await _grade_or_400(session["id"], "diagnostic", req.answers)
+    correct, total = sum(a["correct"] for a in scored), len(scored)
     score = (correct / total * 100) if total > 0 else 0
     level = calculate_level(score)
 
     # Update performance tracker
-    perf = session.get("performance", None)
-    if perf is None:
-        from performance_tracker import empty_performance
-        perf = empty_performance()
-    scored = _add_correct_flags(req.answers)
-    qtype = scored[0].get("type", "short") if scored else "short"
-    perf = record_answers(perf, scored, qtype, session["subject"])
-
-    history = session["level_history"] + [level]
-    await update_session(
-        session["id"],
-        level=level,
-        total_correct=session["total_correct"] + correct,
-        total_attempts=session["total_attempts"] + total,
-        level_history=history,
-        performance=perf,
+    qtype = scored[0]["type"] if scored else "short"
+    event = make_answer_event(scored, qtype, session["subject"])
+    await _record_submission(session["id"], event, lambda current, perf: {
+        "level": level,
+        "total_correct": current["total_correct"] + correct,
+        "total_attempts": current["total_attempts"] + total,
+        "level_history": current["level_history"] + [level],
+    }, on_abort=lambda: release(session["id"], "diagnostic", scored))
+
+    return DiagnosticResponse(
+        score=round(score, 1), level=level, correct=correct, total=total, results=_question_results(scored),
     )
 
-    return DiagnosticResponse(score=round(score, 1), level=level, correct=correct, total=total)
-
 
 # ---------------------------------------------------------------------------
 # Lesson & Exercise
@@ -199,6 +219,7 @@ async def generate_exercise(req: GenerateRequest):
 
     prompt = generate_exercise_prompt(session["subject"], session["level"], req.question_type)
     questions = await generate_json(prompt)
+    questions = await store_question_set(session["id"], "exercise", questions, req.question_type)
     return ExerciseResponse(questions=questions, subject=session["subject"], level=session["level"])
 
 
@@ -208,7 +229,14 @@ async def submit_exercise(req: SubmitExerciseRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    correct, total = _score_answers(req.answers)
+    times = list(req.per_question_times or [])
+    if req.total_time_seconds is not None:
+        times.append(req.total_time_seconds)
+    if not all(math.isfinite(t) for t in times):
+        raise HTTPException(status_code=400, detail="Response times must be finite numbers")
+
+    scored = await _grade_or_400(session["id"], "exercise", req.answers)
+    correct, total = sum(a["correct"] for a in scored), len(scored)
     accuracy = (correct / total * 100) if total > 0 else 0
 
     # Resolve timing data
@@ -221,35 +249,35 @@ async def submit_exercise(req: SubmitExerciseRequest):
         total_time = max(0.0, float(req.total_time_seconds))
 
     # Update performance
-    perf = session.get("performance") or empty_performance()
-    scored = _add_correct_flags(req.answers)
-    qtype = scored[0].get("type", "short") if scored else "short"
-    perf = record_answers(
-        perf, scored, qtype, session["subject"],
+    qtype = scored[0]["type"] if scored else "short"
+    event = make_answer_event(
+        scored, qtype, session["subject"],
         time_seconds=total_time,
         per_question_times=per_q_times,
     )
-    mastery = compute_mastery(perf)
-
-    new_level = adjust_level(session["level"], accuracy, mastery)
-    level_changed = new_level != session["level"]
 
-    history = session["level_history"]
-    if level_changed:
-        history = history + [new_level]
-
-    await update_session(
-        session["id"],
-        level=new_level,
-        total_correct=session["total_correct"] + correct,
-        total_attempts=session["total_attempts"] + total,
-        level_history=history,
-        performance=perf,
+    def level_fields(current: dict, perf: dict) -> dict:
+        new_level = adjust_level(current["level"], accuracy, compute_mastery(perf))
+        history = current["level_history"]
+        if new_level != current["level"]:
+            history = history + [new_level]
+        return {
+            "level": new_level,
+            "total_correct": current["total_correct"] + correct,
+            "total_attempts": current["total_attempts"] + total,
+            "level_history": history,
+        }
+
+    previous, updated = await _record_submission(
+        session["id"], event, level_fields, on_abort=lambda: release(session["id"], "exercise", scored),
     )
+    perf = updated["performance"]
+    mastery = compute_mastery(perf)
+    new_level = updated["level"]
+    level_changed = new_level != previous["level"]
 
     # Cognitive metrics
-    rt_list: list[float] = perf.get("response_times", [])
-    avg_rt = round(sum(rt_list) / len(rt_list), 1) if rt_list else 0.0
+    avg_rt = round(avg_response_time(perf), 1)
     csi = perf.get("cognitive_strain_index", 0.0)
     adaptive_mode = perf.get("adaptive_mode", "standard") or "standard"
 
@@ -268,6 +296,7 @@ async def submit_exercise(req: SubmitExerciseRequest):
         avg_response_time=avg_rt,
         stress_detected=stress_signal["stress_detected"],
         recommended_action=stress_signal["recommended_action"],
+        results=_question_results(scored),
     )
 
 
@@ -275,28 +304,39 @@ async def submit_exercise(req: SubmitExerciseRequest):
 # Material upload (RAG)
 # ---------------------------------------------------------------------------
 
-@router.post("/upload-material", response_model=MaterialUploadResponse)
-async def upload_material(
-    session_id: str = Form(...),
-    file: UploadFile = File(...),
-):
-    # Session lookup is optional — allows standalone uploads without picking a subject
-    session = await get_session(session_id)
-    # (no HTTPException if session is None — standalone mode)
+# Job params are stored in one Mongo document (16 MB limit)
+_MAX_JOB_UPLOAD_BYTES = 15 * 1024 * 1024
+
+# session_id -> lock held while its material index is rebuilt
+_ingest_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _ingest_lock(session_id: str) -> asyncio.Lock:
+    lock = _ingest_locks.get(session_id)
+    if lock is None:
+        lock = _ingest_locks[session_id] = asyncio.Lock()
+    return lock
+
+
+async def _ingest_material(session_id: str, filename: str, content: bytes) -> MaterialUploadResponse:
+    """
+    Extract, chunk and index an uploaded PDF / PPTX for a session. All
+    three steps run in threads; indexing refits the session's whole TF-IDF
+    matrix, so uploads to the same session are indexed one at a time.
+    """
+    import io as _io
 
-    content = await file.read()
-    filename = file.filename or "upload"
     ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
     if ext not in ("pdf", "pptx"):
         raise HTTPException(status_code=400, detail="Only PDF and PPTX files are supported")
 
-    import io as _io
-    text = extract_text(filename, _io.BytesIO(content))
+    text = await asyncio.to_thread(extract_text, filename, _io.BytesIO(content))
     if not text.strip():
         raise HTTPException(status_code=400, detail="Could not extract text from file")
 
-    chunks = chunk_text(text)
-    store_chunks(session_id, chunks, filename=filename)
+    chunks = await asyncio.to_thread(chunk_text, text)
+    async with _ingest_lock(session_id):
+        await asyncio.to_thread(store_chunks, session_id, chunks, filename)
 
     return MaterialUploadResponse(
         session_id=session_id,
@@ -306,6 +346,46 @@ async def upload_material(
     )
 
 
+@router.post("/upload-material", response_model=MaterialUploadResponse)
+async def upload_material(
+    session_id: str = Form(...),
+    file: UploadFile = File(...),
+):
+    # Session lookup is optional — allows standalone uploads without picking a subject
+    session = await get_session(session_id)
+    # (no HTTPException if session is None — standalone mode)
+
+    content = await file.read()
+    return await _ingest_material(session_id, file.filename or "upload", content)
+
+
+@router.post("/upload-material/jobs", response_model=JobResponse, status_code=202)
+async def upload_material_job(
+    session_id: str = Form(...),
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user),
+):
+    """Queue material ingestion; poll GET /jobs/{job_id} for the result."""
+    content = await file.read()
+    if len(content) > _MAX_JOB_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large for background processing")
+    return await job_queue.enqueue("material_upload", {
+        "session_id": session_id,
+        "filename": file.filename or "upload",
+        "content": content,
+    }, owner=current_user["user_id"])
+
+
+# The RAG store lives in process memory, so ingest where the upload arrived
+@job_handler("material_upload", concurrency=2, priority=10, local=True)
+async def _material_upload_job(params: dict) -> dict:
+    try:
+        resp = await _ingest_material(params["session_id"], params["filename"], params["content"])
+    except HTTPException as exc:
+        raise JobError(exc.detail)
+    return resp.model_dump()
+
+
 @router.post("/generate-from-material")
 async def generate_from_material(req: MaterialGenerateRequest):
     # Try session lookup first; fall back to request-level subject/level
@@ -412,8 +492,7 @@ async def progress(req: GenerateRequest):
     weaknesses = detect_weaknesses(perf)
     recs = get_study_recommendations(perf, session["subject"])
 
-    rt_list: list[float] = perf.get("response_times", [])
-    avg_rt = round(sum(rt_list) / len(rt_list), 1) if rt_list else 0.0
+    avg_rt = round(avg_response_time(perf), 1)
 
     return ProgressResponse(
         session_id=session["id"],
@@ -450,6 +529,54 @@ async def weakness_profile(session_id: str):
     )
 
 
+@router.get("/users/{user_id}/dashboard", response_model=UserDashboardResponse)
+async def user_dashboard(user_id: str, current_user: dict = Depends(get_current_user)):
+    """Aggregate stats across all of a user's sessions (one rollup read)."""
+    if current_user["user_id"] != user_id:
+        raise HTTPException(status_code=403, detail="Not allowed to view this dashboard")
+    return UserDashboardResponse(**await get_user_dashboard(user_id))
+
+
+@router.post("/users/{user_id}/dashboard/rebuild", response_model=UserDashboardResponse)
+async def rebuild_user_dashboard(user_id: str, current_user: dict = Depends(get_current_user)):
+    """Recompute a user's dashboard rollup from their sessions."""
+    if current_user["user_id"] != user_id:
+        raise HTTPException(status_code=403, detail="Not allowed to rebuild this dashboard")
+    return UserDashboardResponse(**await rebuild_user_rollup(user_id))
+
+
+# ---------------------------------------------------------------------------
+# Cohort analytics (instructors)
+# ---------------------------------------------------------------------------
+
+@router.get("/cohort-analytics/subject/{subject}", response_model=CohortAnalyticsResponse,
+            dependencies=[Depends(require_admin)])
+async def subject_cohort(subject: str):
+    """Class-wide stats for a subject, served from its rollup document."""
+    return CohortAnalyticsResponse(**await get_subject_cohort(subject))
+
+
+@router.post("/cohort-analytics/users", response_model=CohortAnalyticsResponse,
+             dependencies=[Depends(require_admin)])
+async def user_group_cohort(req: CohortRequest):
+    """Stats for an arbitrary group of users, computed in one aggregation."""
+    if not req.user_ids:
+        raise HTTPException(status_code=400, detail="Provide at least one user id")
+    return CohortAnalyticsResponse(**await get_user_group_cohort(req.user_ids, req.subject))
+
+
+@router.post("/cohort-analytics/subject/{subject}/rebuild", response_model=CohortAnalyticsResponse,
+             dependencies=[Depends(require_admin)])
+async def rebuild_subject_cohort(subject: str):
+    """Recompute a subject rollup from the sessions collection (throttled per subject)."""
+    try:
+        return CohortAnalyticsResponse(**await rebuild_subject_rollup(subject))
+    except RebuildThrottled as exc:
+        raise HTTPException(
+            status_code=429, detail=str(exc), headers={"Retry-After": str(int(exc.retry_after) + 1)},
+        )
+
+
 # ---------------------------------------------------------------------------
 # Podcast
 # ---------------------------------------------------------------------------
@@ -457,70 +584,248 @@ async def weakness_profile(session_id: str):
 @router.post("/generate-podcast", response_model=PodcastResponse)
 async def generate_podcast_route(req: PodcastRequest):
     from podcast_engine import create_podcast
-    result = await create_podcast(req.topic)
+    result = await create_podcast(req.topic, use_cache=not req.fresh)
     return PodcastResponse(**result)
 
 
-@router.get("/podcast-audio/{filename}")
-async def serve_podcast_audio(filename: str):
-    """Serve generated podcast audio files (mp3)."""
+@router.post("/generate-podcast/jobs", response_model=JobResponse, status_code=202)
+async def generate_podcast_job(req: PodcastRequest, current_user: dict = Depends(get_current_user)):
+    """Queue podcast generation; poll GET /jobs/{job_id} for the episode."""
+    return await job_queue.enqueue(
+        "podcast", {"topic": req.topic, "fresh": req.fresh}, owner=current_user["user_id"],
+    )
+
+
+@job_handler("podcast", concurrency=2, retries=1)
+async def _podcast_job(params: dict) -> dict:
+    from podcast_engine import create_podcast
+    return await create_podcast(params["topic"], use_cache=not params.get("fresh", False))
+
+
+@router.get("/generate-podcast/stream")
+async def generate_podcast_stream(topic: str, fresh: bool = False):
+    """
+    Server-sent events version of /generate-podcast: the script is sent
+    first, then each segment's audio URL as it finishes.
+    """
+    import json as _json
+    from fastapi.responses import StreamingResponse
+    from podcast_engine import stream_podcast
+
+    async def events():
+        async for event, data in stream_podcast(topic, use_cache=not fresh):
+            yield f"event: {event}\ndata: {_json.dumps(data)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/admin/podcasts/prewarm", response_model=JobResponse, status_code=202,
+             dependencies=[Depends(require_admin)])
+async def prewarm_podcasts_route(req: PodcastPrewarmRequest):
+    """Queue generation of cached episodes (default: every subject)."""
+    from models import SUBJECTS
+    return await job_queue.enqueue("podcast_prewarm", {
+        "topics": req.topics or SUBJECTS,
+        "force": req.force,
+    })
+
+
+@job_handler("podcast_prewarm", concurrency=1, priority=-10)
+async def _podcast_prewarm_job(params: dict) -> dict:
+    from podcast_engine import prewarm_podcasts
+    return {"topics": await prewarm_podcasts(params["topics"], force=params.get("force", False))}
+
+
+@router.api_route("/podcast-audio/{filename}", methods=["GET", "HEAD"])
+async def serve_podcast_audio(
+    filename: str,
+    range_header: str | None = Header(default=None, alias="Range"),
+):
+    """
+    Serve generated podcast audio files (mp3) with HTTP Range support.
+    A full episode is served as one Xing header followed by the audio
+    frames of its segment files; byte ranges are mapped across segments,
+    so no concatenated copy exists.
+    """
     import re as _re
-    from fastapi.responses import FileResponse
-    from podcast_engine import PODCAST_DIR
+    from audio_response import ConcatFileResponse
+    from podcast_engine import PODCAST_DIR, full_episode_layout
 
     # Sanitise filename
     if not _re.match(r"^[a-z0-9_]+\.(mp3|wav)$", filename):
         raise HTTPException(status_code=400, detail="Invalid filename")
 
     path = PODCAST_DIR / filename
-    if not path.exists():
-        raise HTTPException(status_code=404, detail="Audio file not found")
+    if path.exists():
+        media = "audio/mpeg" if filename.endswith(".mp3") else "audio/wav"
+        return ConcatFileResponse(
+            [path], range_header, media_type=media,
+            headers={"Cache-Control": "public, max-age=3600"},
+        )
 
-    media = "audio/mpeg" if filename.endswith(".mp3") else "audio/wav"
-    return FileResponse(
-        path,
-        media_type=media,
-        headers={"Accept-Ranges": "bytes", "Cache-Control": "public, max-age=3600"},
+    layout = await asyncio.to_thread(full_episode_layout, filename)
+    if layout is None:
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    # A full episode can still be growing while it streams, so don't cache it
+    return ConcatFileResponse(
+        [layout.header, *layout.parts], range_header,
+        headers={"Cache-Control": "no-cache"},
     )
 
 
+# ---------------------------------------------------------------------------
+# Diagnostics
+# ---------------------------------------------------------------------------
+
+@router.get("/admin/loop-blocks", dependencies=[Depends(require_admin)])
+async def loop_blocks():
+    """Event-loop lag percentiles and recent stalls with their stacks."""
+    return loop_monitor.stats()
+
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def profiles():
+    """Stored request profiles (see profiler.py), newest first."""
+    return {"profiles": await asyncio.to_thread(list_profiles)}
+
+
+@router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str, format: str = "speedscope"):
+    """Download a profile as speedscope JSON or collapsed stacks."""
+    from fastapi.responses import FileResponse
+
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(PROFILE_FORMATS)}")
+    path = profile_path(profile_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type=PROFILE_FORMATS[format][1], filename=path.name)
+
+
+# ---------------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------------
+
+# Users see only the jobs they enqueued; other ids are reported as not found
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await job_queue.get(job_id, owner=current_user["user_id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await job_queue.cancel(job_id, owner=current_user["user_id"])
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/admin/jobs/{job_id}", response_model=JobResponse, dependencies=[Depends(require_admin)])
+async def admin_get_job(job_id: str):
+    """Any job, including ones without an owner (e.g. podcast pre-warm)."""
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.delete("/admin/jobs/{job_id}", response_model=JobResponse, dependencies=[Depends(require_admin)])
+async def admin_cancel_job(job_id: str):
+    job = await job_queue.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _is_answer_correct(qtype: str, user: str, expected: str) -> bool:
-    """Check if a single answer is correct based on question type."""
-    if qtype == "true_false":
-        if user in ("true", "1", "yes") and expected in ("true", "1", "yes"):
-            return True
-        if user in ("false", "0", "no") and expected in ("false", "0", "no"):
-            return True
-        return False
-    elif qtype == "qa":
-        return bool(user and expected and (user in expected or expected in user))
-    else:
-        return user == expected
-
-
-def _add_correct_flags(answers: list[dict]) -> list[dict]:
-    """Return answer dicts with a 'correct' boolean added, based on scoring logic."""
-    scored = []
-    for ans in answers:
-        qtype = ans.get("type", "short")
-        user = str(ans.get("user_answer", "")).strip().lower()
-        expected = str(ans.get("correct_answer", "")).strip().lower()
-        scored.append({**ans, "correct": _is_answer_correct(qtype, user, expected)})
-    return scored
-
-
-def _score_answers(answers: list[dict]) -> tuple[int, int]:
-    """Return (correct, total) from a list of answer dicts."""
-    correct = 0
-    total = len(answers)
-    for ans in answers:
-        qtype = ans.get("type", "short")
-        user = str(ans.get("user_answer", "")).strip().lower()
-        expected = str(ans.get("correct_answer", "")).strip().lower()
-        if _is_answer_correct(qtype, user, expected):
-            correct += 1
-    return correct, total
+async def _grade_or_400(session_id: str, kind: str, answers: list) -> list[dict]:
+    """Grade a submission against its stored answer keys (see answer_keys)."""
+    try:
+        return await grade(session_id, kind, answers)
+    except AnswerKeyError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+# Attempts at a versioned read-modify-write before answering 409
+_SESSION_WRITE_ATTEMPTS = 3
+
+
+async def _record_submission(session_id: str, event: dict, fields_for, on_abort=None) -> tuple[dict, dict]:
+    """
+    Fold an answer event into the session and persist it.
+
+    The session is re-read uncached and written back only if its version is
+    unchanged (optimistic concurrency), so a concurrent submission on
+    another worker is never overwritten; on a conflict the event is
+    re-applied to the newer state. The version check also makes the
+    event's sequence number unique. The event is stored on the session as
+    `pending_event` by the same write and appended to the answer log
+    afterwards; if the append fails, the submission still stands and the
+    event is appended by the next one (see answer_log). `fields_for(session,
+    perf)` returns the other fields to set. If nothing is written (404, 409,
+    503 or any other error), `on_abort()` is awaited first, e.g. to release
+    the graded question sets. Returns (session as read, session as written).
+    """
+    try:
+        current, updated, cohort_prev = await _write_submission(session_id, event, fields_for)
+    except BaseException:
+        if on_abort is not None:
+            await on_abort()
+        raise
+    await record_rollups(updated, cohort_prev)
+    try:
+        await flush_pending_event(updated)
+    except AnswerLogError as exc:
+        print(f"[Routes] {exc}; left pending on the session")
+    return current, updated
+
+
+async def _write_submission(session_id: str, event: dict, fields_for) -> tuple[dict, dict, dict]:
+    """The versioned write of _record_submission: (read, written, cohort snapshot before)."""
+    for _ in range(_SESSION_WRITE_ATTEMPTS):
+        current = await get_session(session_id, fresh=True)
+        if not current:
+            raise HTTPException(status_code=404, detail="Session not found")
+        try:
+            # An earlier submission's event has to be in the log before this one
+            await flush_pending_event(current)
+        except AnswerLogError as exc:
+            raise HTTPException(status_code=503, detail=str(exc))
+        perf = current.get("performance") or empty_performance()
+        cohort_prev = cohort_snapshot(perf)
+        # apply_answer_event works in place; keep the pre-log state for the baseline
+        previous = copy.deepcopy(perf) if not perf.get("event_seq") else None
+        perf = apply_answer_event(perf, event)
+        try:
+            updated = await update_session(
+                session_id,
+                expected_version=current["version"],
+                performance=perf,
+                pending_event=pending_event(perf, event, previous),
+                **fields_for(current, perf),
+            )
+        except SessionConflict:
+            continue
+        return current, updated, cohort_prev
+    raise HTTPException(status_code=409, detail="Session was updated concurrently, please retry")
+
+
+def _question_results(scored: list[dict]) -> list[QuestionResult]:
+    return [
+        QuestionResult(
+            question_id=a["question_id"], correct=a["correct"], score=a["score"], coverage=a.get("coverage"),
+            correct_answer=a.get("correct_answer"), expected_points=a.get("expected_points"),
+        )
+        for a in scored
+    ]
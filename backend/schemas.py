@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime
 
 
 class StartSessionRequest(BaseModel):
@@ -12,9 +13,23 @@ class StartSessionResponse(BaseModel):
     level: str
 
 
+class AnswerSubmission(BaseModel):
+    question_id: str        # as returned with the generated question
+    user_answer: str = ""
+
+
 class DiagnosticRequest(BaseModel):
     session_id: str
-    answers: list[dict]  # [{question, user_answer, correct_answer, type?}]
+    answers: list[AnswerSubmission]
+
+
+class QuestionResult(BaseModel):
+    question_id: str
+    correct: bool
+    score: float                            # similarity for short, covered fraction for qa
+    coverage: Optional[list[bool]] = None   # qa: one flag per expected point
+    correct_answer: Optional[str] = None    # revealed once the set is graded
+    expected_points: Optional[list[str]] = None  # qa
 
 
 class DiagnosticResponse(BaseModel):
@@ -22,6 +37,7 @@ class DiagnosticResponse(BaseModel):
     level: str
     correct: int
     total: int
+    results: list[QuestionResult] = []
 
 
 class GenerateRequest(BaseModel):
@@ -43,8 +59,8 @@ class ExerciseResponse(BaseModel):
 
 class SubmitExerciseRequest(BaseModel):
     session_id: str
-    answers: list[dict]  # [{question, user_answer, correct_answer, type?}]
-    per_question_times: Optional[list[float]] = None  # seconds per question
+    answers: list[AnswerSubmission]
+    per_question_times: Optional[list[float]] = None  # seconds per question, in question order
     total_time_seconds: Optional[float] = None        # fallback total time
 
 
@@ -62,6 +78,8 @@ class SubmitExerciseResponse(BaseModel):
     # Stress detection
     stress_detected: bool = False
     recommended_action: Optional[str] = None
+    # Per-question grading, in question order
+    results: list[QuestionResult] = []
 
 
 # --- Material upload ---
@@ -108,6 +126,26 @@ class FlashcardResponse(BaseModel):
 # --- Podcast ---
 class PodcastRequest(BaseModel):
     topic: str
+    fresh: bool = False  # bypass the episode cache
+
+
+class PodcastPrewarmRequest(BaseModel):
+    topics: Optional[list[str]] = None  # defaults to models.SUBJECTS
+    force: bool = False
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str      # podcast | material_upload | podcast_prewarm
+    status: str    # queued | running | succeeded | failed | cancelled
+    priority: int = 0
+    attempts: int = 0
+    max_attempts: int = 1
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
 
 
 class PodcastScriptEntry(BaseModel):
@@ -162,6 +200,45 @@ class WeaknessProfileResponse(BaseModel):
     weakness_profile: dict  # topic -> WeaknessTopicEntry dict
 
 
+# --- Cohort analytics ---
+class CohortRequest(BaseModel):
+    user_ids: list[str]
+    subject: Optional[str] = None
+
+
+class CohortDistribution(BaseModel):
+    mean: float = 0.0
+    p25: float = 0.0
+    p50: float = 0.0
+    p75: float = 0.0
+    p90: float = 0.0
+    histogram: list[int]  # 10 bins over 0-100
+
+
+class CohortAnalyticsResponse(BaseModel):
+    scope: str   # subject | users
+    key: str
+    sessions: int
+    topic_accuracy: dict  # topic -> {correct, total, accuracy}
+    type_accuracy: dict   # question_type -> {correct, total, accuracy}
+    mastery: CohortDistribution
+    cognitive_strain_index: CohortDistribution
+
+
+class UserDashboardResponse(BaseModel):
+    user_id: str
+    sessions: list[dict]  # [{session_id, subject, level, mastery, cognitive_strain_index, ...}]
+    total_correct: int
+    total_attempts: int
+    accuracy: float
+    topic_accuracy: dict
+    type_accuracy: dict
+    mastery: CohortDistribution
+    cognitive_strain_index: CohortDistribution
+    weaknesses: list[dict]
+    recommendations: list[str]
+
+
 # --- Authentication ---
 class UserCreate(BaseModel):
     username: str
@@ -0,0 +1,298 @@
+"""
+Lightweight request tracing.
+
+Every HTTP request gets a trace (id returned in the `X-Trace-Id` header; an
+incoming W3C `traceparent` header is continued). Code inside the request
+opens nested spans with `with span("name", key=value):` or the @traced
+decorator; the current span lives in a contextvar, so spans follow the
+request through awaits, `asyncio.to_thread` and child tasks. Outside a
+traced request, spans are no-ops.
+
+When a request finishes:
+  - if it took longer than TRACE_SLOW_MS, its span tree is printed;
+  - if TRACE_EXPORT_FILE is set, the trace is appended to that file as one
+    OTLP/JSON `resourceSpans` document per line (readable by the
+    OpenTelemetry Collector's otlpjsonfile receiver), written by a
+    background thread.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import queue
+import inspect
+import secrets
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "")
+TRACE_EXPORT_MIN_MS = float(os.getenv("TRACE_EXPORT_MIN_MS", "0"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "neurolearn-api")
+
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    __slots__ = (
+        "trace", "span_id", "parent_id", "name", "attributes",
+        "start_ns", "end_ns", "error", "children",
+    )
+
+    def __init__(self, trace: "Trace", name: str, parent: "Span | None", attributes: dict):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else trace.remote_parent
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: str | None = None
+        self.children: list[Span] = []
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Trace:
+    def __init__(self, trace_id: str | None = None, remote_parent: str | None = None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.remote_parent = remote_parent
+        self.span_count = 0
+        self.dropped = 0
+
+
+class _NoopSpan:
+    """Stand-in yielded outside a trace so callers can always call .set()."""
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+_current: contextvars.ContextVar[Span | None] = contextvars.ContextVar("trace_span", default=None)
+
+
+def current_trace_id() -> str | None:
+    current = _current.get()
+    return current.trace.trace_id if current else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Nested span under the current one; does nothing outside a trace."""
+    parent = _current.get()
+    if parent is None:
+        yield _NOOP
+        return
+    trace = parent.trace
+    if trace.span_count >= TRACE_MAX_SPANS:
+        trace.dropped += 1
+        yield _NOOP
+        return
+    trace.span_count += 1
+    child = Span(trace, name, parent, attributes)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current.reset(token)
+
+
+def traced(name: str | None = None, **attributes):
+    """Decorator: run each call of a sync or async function in a span."""
+    def decorator(fn):
+        span_name = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def start_trace(name: str, traceparent: str | None = None, **attributes):
+    """Open a root span (a new trace, or a continued remote one)."""
+    trace_id = remote_parent = None
+    if traceparent:
+        m = _TRACEPARENT.match(traceparent.strip().lower())
+        if m:
+            trace_id, remote_parent = m.groups()
+    trace = Trace(trace_id, remote_parent)
+    trace.span_count = 1
+    root = Span(trace, name, None, attributes)
+    token = _current.set(root)
+    try:
+        yield root
+    except BaseException as exc:
+        root.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        root.end_ns = time.time_ns()
+        _current.reset(token)
+        _finish(root)
+
+
+# ---------------------------------------------------------------------------
+# Slow-request log and OTLP/JSON file export
+# ---------------------------------------------------------------------------
+
+def format_tree(root: Span) -> str:
+    lines = []
+
+    def walk(s: Span, depth: int):
+        offset = (s.start_ns - root.start_ns) / 1e6
+        attrs = " ".join(f"{k}={v}" for k, v in s.attributes.items())
+        err = f"  ERROR {s.error}" if s.error else ""
+        lines.append(f"  {offset:>8.1f}ms {s.duration_ms:>9.1f}ms  {'  ' * depth}{s.name} {attrs}{err}".rstrip())
+        for c in s.children:
+            walk(c, depth + 1)
+
+    walk(root, 0)
+    if root.trace.dropped:
+        lines.append(f"  ... {root.trace.dropped} spans dropped (TRACE_MAX_SPANS)")
+    return "\n".join(lines)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(root: Span) -> dict:
+    spans = []
+
+    def walk(s: Span):
+        item = {
+            "traceId": s.trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 2 if s is root else 1,  # SERVER / INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        spans.append(item)
+        for c in s.children:
+            walk(c)
+
+    walk(root)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "neurolearn.tracing"}, "spans": spans}],
+    }]}
+
+
+_export_queue: "queue.SimpleQueue[dict]" = queue.SimpleQueue()
+_export_thread: threading.Thread | None = None
+_export_lock = threading.Lock()
+
+
+def _export_worker():
+    while True:
+        doc = _export_queue.get()
+        try:
+            with open(TRACE_EXPORT_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(doc, separators=(",", ":")) + "\n")
+        except OSError as exc:
+            print(f"[Trace] Export failed: {exc}")
+
+
+def _export(root: Span):
+    global _export_thread
+    if _export_thread is None:
+        with _export_lock:
+            if _export_thread is None:
+                _export_thread = threading.Thread(target=_export_worker, name="trace-export", daemon=True)
+                _export_thread.start()
+    _export_queue.put(to_otlp(root))
+
+
+def _finish(root: Span):
+    duration = root.duration_ms
+    # Server-sent event streams are long-lived by design; export them only
+    if TRACE_SLOW_MS > 0 and duration >= TRACE_SLOW_MS and not root.attributes.get("streaming"):
+        print(f"[Trace] SLOW {duration:.0f}ms {root.name} trace={root.trace.trace_id}\n{format_tree(root)}")
+    if TRACE_EXPORT_FILE and duration >= TRACE_EXPORT_MIN_MS:
+        _export(root)
+
+
+# ---------------------------------------------------------------------------
+# ASGI middleware
+# ---------------------------------------------------------------------------
+
+class TracingMiddleware:
+    """Root span per HTTP request, named after the matched route template."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with start_trace(f"{scope['method']} {scope['path']}", traceparent) as root:
+            trace_header = (b"x-trace-id", root.trace.trace_id.encode())
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    # Starlette appends "; charset=utf-8" to the media type
+                    if any(
+                        key.lower() == b"content-type" and value.split(b";")[0].strip() == b"text/event-stream"
+                        for key, value in headers
+                    ):
+                        root.set(streaming=True)
+                    message["headers"] = [*headers, trace_header]
+                    root.set(status=message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    root.name = f"{scope['method']} {route.path}"
+                root.set(path=scope["path"])
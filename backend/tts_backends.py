@@ -0,0 +1,334 @@
+"""
+Text-to-speech backends for the podcast pipeline.
+
+One backend is selected per deployment with TTS_BACKEND:
+
+  elevenlabs — ElevenLabs HTTP API (default; needs ELEVENLABS_API_KEY)
+  espeak     — local espeak-ng, CPU only
+  piper      — local Piper neural TTS, CPU only (TTS_LOCAL_HOST_VOICE /
+               TTS_LOCAL_GUEST_VOICE are paths to .onnx voice models)
+  none       — text-only podcasts
+
+Local engines run as one subprocess per segment, TTS_LOCAL_WORKERS (default:
+one per core) at a time, so an episode's segments are synthesised in
+parallel across cores. Their WAV output is encoded to MP3 with ffmpeg so
+every backend produces the same segment format.
+"""
+
+from __future__ import annotations
+
+import os
+import shlex
+import shutil
+import asyncio
+import tempfile
+from pathlib import Path
+
+import httpx
+
+from cassette import cassette
+
+# ---------------------------------------------------------------------------
+# Config
+# ---------------------------------------------------------------------------
+
+TTS_BACKEND = os.getenv("TTS_BACKEND", "elevenlabs").strip().lower()
+
+ELEVENLABS_BASE = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io/v1")
+ELEVENLABS_MODEL = os.getenv("ELEVENLABS_MODEL", "eleven_multilingual_v2")
+
+# Parallel ElevenLabs requests per process, across all episodes (keep within
+# the provider's concurrency limit for your plan) and per-segment retries on
+# 429 / 5xx / network errors.
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+TTS_RETRIES = int(os.getenv("TTS_RETRIES", "2"))
+
+# ElevenLabs voice IDs  (override via env if needed)
+# Defaults: Adam (deep male) & Rachel (clear female)
+VOICE_MAP = {
+    "host": os.getenv("ELEVENLABS_HOST_VOICE", "pNInz6obpgDQGcFmaJgB"),   # Adam
+    "guest": os.getenv("ELEVENLABS_GUEST_VOICE", "21m00Tcm4TlvDq8ikWAM"),  # Rachel
+}
+
+VOICE_SETTINGS = {
+    "stability": 0.45,
+    "similarity_boost": 0.75,
+    "style": 0.35,
+    "use_speaker_boost": True,
+}
+
+# Local engines: command templates take {voice} and {wav}; text arrives on stdin
+LOCAL_COMMANDS = {
+    "espeak": "espeak-ng -v {voice} -w {wav} --stdin",
+    "piper": "piper --model {voice} --output_file {wav}",
+}
+LOCAL_VOICES = {
+    "espeak": {"host": "en-us+m3", "guest": "en-us+f3"},
+    "piper": {"host": "en_US-ryan-medium.onnx", "guest": "en_US-amy-medium.onnx"},
+}
+TTS_LOCAL_COMMAND = os.getenv("TTS_LOCAL_COMMAND", "")
+TTS_LOCAL_ENCODER = os.getenv(
+    "TTS_LOCAL_ENCODER",
+    "ffmpeg -loglevel error -y -i {wav} -codec:a libmp3lame -b:a 64k {mp3}",
+)
+TTS_LOCAL_WORKERS = int(os.getenv("TTS_LOCAL_WORKERS", "0")) or os.cpu_count() or 1
+TTS_LOCAL_TIMEOUT = float(os.getenv("TTS_LOCAL_TIMEOUT", "120"))
+
+
+# Process-wide limit on in-flight ElevenLabs requests
+_elevenlabs_slots = asyncio.Semaphore(max(TTS_CONCURRENCY, 1))
+
+
+def _get_api_key() -> str | None:
+    key = os.getenv("ELEVENLABS_API_KEY", "").strip()
+    return key if key else None
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class TTSBackend:
+    """Base backend: no speech (text-only podcasts)."""
+
+    name = "none"
+    concurrency = 1
+
+    def available(self) -> bool:
+        return False
+
+    def voice_for(self, speaker: str) -> str:
+        return speaker
+
+    def cache_parts(self, voice: str) -> tuple:
+        """Inputs besides the text that change the synthesised audio."""
+        return (self.name, voice)
+
+    async def synthesize(
+        self,
+        text: str,
+        voice: str,
+        client: httpx.AsyncClient | None = None,
+    ) -> bytes | None:
+        return None
+
+
+class ElevenLabsBackend(TTSBackend):
+    name = "elevenlabs"
+
+    def __init__(self):
+        self.concurrency = max(TTS_CONCURRENCY, 1)
+
+    def available(self) -> bool:
+        return _get_api_key() is not None
+
+    def voice_for(self, speaker: str) -> str:
+        return VOICE_MAP.get(speaker, VOICE_MAP["host"])
+
+    def cache_parts(self, voice: str) -> tuple:
+        return (voice, ELEVENLABS_MODEL, VOICE_SETTINGS)
+
+    async def synthesize(
+        self,
+        text: str,
+        voice: str,
+        client: httpx.AsyncClient | None = None,
+    ) -> bytes | None:
+        """
+        Call ElevenLabs text-to-speech API.  Returns MP3 bytes or None on failure.
+        Retries rate-limit / server / network errors up to TTS_RETRIES times.
+        At most TTS_CONCURRENCY requests are in flight per process; retry
+        back-off happens outside that limit. Pass a shared `client` to
+        reuse connections across segments.
+        """
+        api_key = _get_api_key()
+        if not api_key:
+            return None
+
+        url = f"{ELEVENLABS_BASE}/text-to-speech/{voice}"
+        headers = {
+            "xi-api-key": api_key,
+            "Content-Type": "application/json",
+            "Accept": "audio/mpeg",
+        }
+        payload = {
+            "text": text,
+            "model_id": ELEVENLABS_MODEL,
+            "voice_settings": VOICE_SETTINGS,
+        }
+
+        own_client = client is None
+        if own_client:
+            client = httpx.AsyncClient(timeout=120)
+        try:
+            for attempt in range(1 + TTS_RETRIES):
+                try:
+                    async with _elevenlabs_slots:
+                        resp = await client.post(url, headers=headers, json=payload)
+                    if resp.status_code == 200:
+                        return resp.content
+                    print(f"[TTS] ElevenLabs error {resp.status_code}: {resp.text[:200]}")
+                    if resp.status_code != 429 and resp.status_code < 500:
+                        return None
+                except httpx.HTTPError as exc:
+                    print(f"[TTS] Error (attempt {attempt + 1}): {exc}")
+                if attempt < TTS_RETRIES:
+                    await asyncio.sleep(2 ** attempt)
+            return None
+        except Exception as exc:
+            print(f"[TTS] Error: {exc}")
+            return None
+        finally:
+            if own_client:
+                await client.aclose()
+
+
+class LocalTTSBackend(TTSBackend):
+    """
+    Local CPU engine driven through subprocesses: `command` renders WAV from
+    text on stdin, `encoder` turns it into MP3. At most `workers` segments
+    are rendered at once across all episodes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        command: str,
+        encoder: str,
+        voices: dict[str, str],
+        workers: int,
+        timeout: float,
+    ):
+        self.name = name
+        self.command = shlex.split(command)
+        self.encoder = shlex.split(encoder)
+        self.voices = voices
+        self.concurrency = max(workers, 1)
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._available: bool | None = None
+
+    def available(self) -> bool:
+        if self._available is None:
+            missing = [
+                argv[0] for argv in (self.command, self.encoder)
+                if not argv or shutil.which(argv[0]) is None
+            ]
+            if missing:
+                print(f"[TTS] Local backend '{self.name}' unavailable — not found: {missing}")
+            self._available = not missing
+        return self._available
+
+    def voice_for(self, speaker: str) -> str:
+        return self.voices.get(speaker, self.voices["host"])
+
+    def cache_parts(self, voice: str) -> tuple:
+        return (self.name, voice, self.command, self.encoder)
+
+    async def _run(self, argv: list[str], stdin: bytes | None = None) -> bool:
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, err = await asyncio.wait_for(proc.communicate(stdin), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            proc.kill()
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            print(f"[TTS] {argv[0]} exited {proc.returncode}: {err.decode(errors='replace')[:200]}")
+            return False
+        return True
+
+    async def synthesize(
+        self,
+        text: str,
+        voice: str,
+        client: httpx.AsyncClient | None = None,
+    ) -> bytes | None:
+        """Render one segment locally. Returns MP3 bytes or None on failure."""
+        if not self.available():
+            return None
+        workdir = Path(tempfile.mkdtemp(prefix="tts_"))
+        wav, mp3 = workdir / "seg.wav", workdir / "seg.mp3"
+        fill = {"voice": voice, "wav": str(wav), "mp3": str(mp3)}
+        try:
+            async with self._slots:
+                if not await self._run([a.format(**fill) for a in self.command], text.encode("utf-8")):
+                    return None
+                if not await self._run([a.format(**fill) for a in self.encoder]):
+                    return None
+            return await asyncio.to_thread(mp3.read_bytes)
+        except asyncio.TimeoutError:
+            print(f"[TTS] Local backend '{self.name}' timed out after {self.timeout:.0f}s")
+            return None
+        except OSError as exc:
+            print(f"[TTS] Local backend '{self.name}' error: {exc}")
+            return None
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _build_backend(name: str) -> TTSBackend:
+    if name == "elevenlabs":
+        return ElevenLabsBackend()
+    if name in LOCAL_COMMANDS:
+        voices = {
+            "host": os.getenv("TTS_LOCAL_HOST_VOICE", LOCAL_VOICES[name]["host"]),
+            "guest": os.getenv("TTS_LOCAL_GUEST_VOICE", LOCAL_VOICES[name]["guest"]),
+        }
+        return LocalTTSBackend(
+            name,
+            TTS_LOCAL_COMMAND or LOCAL_COMMANDS[name],
+            TTS_LOCAL_ENCODER,
+            voices,
+            TTS_LOCAL_WORKERS,
+            TTS_LOCAL_TIMEOUT,
+        )
+    if name != "none":
+        print(f"[TTS] Unknown TTS_BACKEND '{name}' — text-only mode")
+    return TTSBackend()
+
+
+class CassetteBackend(TTSBackend):
+    """Records or replays another backend's synthesis (see cassette.py)."""
+
+    def __init__(self, inner: TTSBackend):
+        self.inner = inner
+        self.name = inner.name
+        self.concurrency = inner.concurrency
+
+    def available(self) -> bool:
+        return cassette.mode == "replay" or self.inner.available()
+
+    def voice_for(self, speaker: str) -> str:
+        return self.inner.voice_for(speaker)
+
+    def cache_parts(self, voice: str) -> tuple:
+        return self.inner.cache_parts(voice)
+
+    async def synthesize(
+        self,
+        text: str,
+        voice: str,
+        client: httpx.AsyncClient | None = None,
+    ) -> bytes | None:
+        return await cassette.tts(
+            self.inner.name, voice, text, lambda: self.inner.synthesize(text, voice, client),
+        )
+
+
+_backend: TTSBackend | None = None
+
+
+def get_tts_backend() -> TTSBackend:
+    """The deployment's TTS backend (chosen by TTS_BACKEND, built once)."""
+    global _backend
+    if _backend is None:
+        _backend = _build_backend(TTS_BACKEND)
+        if cassette.enabled:
+            _backend = CassetteBackend(_backend)
+    return _backend
@@ -0,0 +1,146 @@
+"""
+Content-addressed cache for synthesised TTS segments.
+
+A segment is keyed by a hash of everything that affects the audio (voice,
+model, voice settings, cleaned text), so repeated lines — fallback scripts,
+intros / outros — are synthesised once. Entries are hard-linked into and
+out of the cache rather than copied, and the cache is kept under a size
+limit with least-recently-used eviction.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+def segment_key(*parts) -> str:
+    """Stable hash of the inputs that determine a segment's audio."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _link_or_copy(src: Path, dest: Path):
+    try:
+        if dest.exists():
+            dest.unlink()
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class SegmentCache:
+    """Size-bounded LRU of audio files stored as `<key><suffix>` under `root`."""
+
+    def __init__(self, root: Path, max_bytes: int, suffix: str = ".mp3"):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._index: OrderedDict[str, int] | None = None  # key -> size, LRU order
+        self._total = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}{self.suffix}"
+
+    def _load(self):
+        """Build the LRU index from disk, oldest mtime first (lock held)."""
+        if self._index is not None:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for p in self.root.glob(f"*{self.suffix}"):
+            st = p.stat()
+            entries.append((st.st_mtime, p.stem, st.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total = sum(self._index.values())
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _lookup(self, key: str) -> Path | None:
+        """Cached file for `key`, marked recently used (lock held)."""
+        self._load()
+        if key not in self._index:
+            return None
+        path = self._path(key)
+        if not path.exists():
+            self._total -= self._index.pop(key)
+            return None
+        self._index.move_to_end(key)
+        return path
+
+    def get(self, key: str) -> Path | None:
+        """Return the cached file for `key` and mark it recently used."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            path = self._lookup(key)
+        if path is None:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def link_to(self, key: str, dest: Path) -> bool:
+        """
+        Hard-link a cached segment to `dest`. Returns False on a miss.
+        Linking happens under the lock so a concurrent put() cannot evict
+        the file in between; a file removed behind the cache's back is a miss.
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            path = self._lookup(key)
+            if path is None:
+                return False
+            try:
+                _link_or_copy(path, dest)
+            except FileNotFoundError:
+                self._total -= self._index.pop(key, 0)
+                return False
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return True
+
+    def put(self, key: str, src: Path):
+        """Add an already-written file to the cache (hard link, no copy)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._load()
+            if key in self._index:
+                self._index.move_to_end(key)
+                return
+            path = self._path(key)
+            _link_or_copy(src, path)
+            size = path.stat().st_size
+            self._index[key] = size
+            self._total += size
+            self._evict()
+
+    def _evict(self):
+        """Drop least-recently-used entries until under max_bytes (lock held)."""
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load()
+            return {"entries": len(self._index), "bytes": self._total, "max_bytes": self.max_bytes}
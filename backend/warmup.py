@@ -0,0 +1,231 @@
+"""
+Worker warm-up and readiness.
+
+A fresh worker would otherwise pay for cold state in its first requests:
+the Mongo pool opens its first connections, google.genai and scikit-learn
+are imported, the provider client is created and connects, and the TTS
+segment cache indexes its directory. main.lifespan starts `warmup.run()`
+after the database client exists. The steps run concurrently:
+
+    mongo    ping MongoDB over WARMUP_MONGO_CONNECTIONS pooled connections
+    modules  import WARMUP_MODULES (scikit-learn, PyPDF2, python-pptx, the grader)
+    llm      create the Gemini / Ollama client and make one cheap request
+    tts      resolve the TTS backend and check that it is usable
+    caches   index on-disk caches (WARMUP_PRIME_CACHES)
+
+GET /healthz (liveness) answers as long as the event loop does. GET /readyz
+(readiness) returns 503 until warm-up has finished, while any step in
+WARMUP_REQUIRED has failed, when the live Mongo ping fails, and once
+shutdown has begun. A load balancer polling /readyz therefore sends
+traffic only to warm workers. A failed required step is retried from the
+probe, at most every READINESS_RETRY_SECONDS, so a worker that started
+while Mongo was down becomes ready once Mongo is back.
+
+By default the server accepts connections while warm-up runs in the
+background. With WARMUP_BLOCKING=true, startup waits for it instead.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import importlib
+
+from metrics import Gauge
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").strip().lower() in ("true", "1", "yes")
+WARMUP_BLOCKING = os.getenv("WARMUP_BLOCKING", "false").strip().lower() in ("true", "1", "yes")
+WARMUP_MODULES = [
+    m.strip() for m in os.getenv(
+        "WARMUP_MODULES", "sklearn.feature_extraction.text,sklearn.metrics.pairwise,PyPDF2,pptx,answer_grader",
+    ).split(",") if m.strip()
+]
+WARMUP_MONGO_CONNECTIONS = int(os.getenv("WARMUP_MONGO_CONNECTIONS", "4"))
+WARMUP_PROVIDERS = os.getenv("WARMUP_PROVIDERS", "true").strip().lower() in ("true", "1", "yes")
+WARMUP_PRIME_CACHES = os.getenv("WARMUP_PRIME_CACHES", "true").strip().lower() in ("true", "1", "yes")
+WARMUP_REQUIRED = {s.strip() for s in os.getenv("WARMUP_REQUIRED", "mongo").split(",") if s.strip()}
+READINESS_PING_TIMEOUT = float(os.getenv("READINESS_PING_TIMEOUT_SECONDS", "2"))
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "2"))
+READINESS_RETRY_SECONDS = float(os.getenv("READINESS_RETRY_SECONDS", "10"))
+
+WORKER_READY = Gauge("worker_ready", "1 when this worker reports ready on /readyz")
+WARMUP_STEP_SECONDS = Gauge("warmup_step_seconds", "Duration of each warm-up step", ("step",))
+
+
+# ---------------------------------------------------------------------------
+# Steps
+# ---------------------------------------------------------------------------
+
+async def _warm_mongo() -> dict:
+    from database import ping_db
+
+    # Concurrent pings make the pool open several connections, not just one
+    results = await asyncio.gather(
+        *(ping_db(READINESS_PING_TIMEOUT * 2) for _ in range(max(WARMUP_MONGO_CONNECTIONS, 1)))
+    )
+    failed = [r for r in results if not r["ok"]]
+    if failed:
+        return {"ok": False, "error": failed[0]["error"]}
+    return {"ok": True, "connections": len(results)}
+
+
+def _import_modules() -> dict:
+    loaded, failed = [], {}
+    for name in WARMUP_MODULES:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception as exc:
+            failed[name] = str(exc)[:200]
+    result: dict = {"ok": not failed, "loaded": loaded}
+    if failed:
+        result["error"] = "; ".join(f"{k}: {v}" for k, v in failed.items())
+    return result
+
+
+async def _warm_modules() -> dict:
+    return await asyncio.to_thread(_import_modules)
+
+
+async def _warm_llm() -> dict:
+    from gemini_client import check_provider
+    return await check_provider()
+
+
+async def _warm_tts() -> dict:
+    from tts_backends import get_tts_backend
+
+    backend = await asyncio.to_thread(get_tts_backend)
+    ok = await asyncio.to_thread(backend.available)
+    result = {"ok": ok, "backend": backend.name}
+    if not ok:
+        result["error"] = "backend unavailable"
+    return result
+
+
+async def _warm_caches() -> dict:
+    from podcast_engine import prime_caches
+    return {"ok": True, **await asyncio.to_thread(prime_caches)}
+
+
+_STEPS = {
+    "mongo": _warm_mongo,
+    "modules": _warm_modules,
+    "llm": _warm_llm,
+    "tts": _warm_tts,
+    "caches": _warm_caches,
+}
+
+
+# ---------------------------------------------------------------------------
+# Warm-up state and readiness
+# ---------------------------------------------------------------------------
+
+class Warmup:
+    def __init__(self):
+        self.state = "pending"  # pending | warming | done | stopping
+        self.started_at = time.time()
+        self.finished_at: float | None = None
+        self.steps: dict[str, dict] = {}
+        self._task: asyncio.Task | None = None
+        self._last_retry: dict[str, float] = {}
+        self._mongo: tuple[float, dict] | None = None  # (checked_at, result)
+
+    def _enabled_steps(self) -> list[str]:
+        names = ["mongo"]
+        if WARMUP_ENABLED:
+            names.append("modules")
+            if WARMUP_PROVIDERS:
+                names += ["llm", "tts"]
+            if WARMUP_PRIME_CACHES:
+                names.append("caches")
+        return names
+
+    async def _step(self, name: str):
+        start = time.perf_counter()
+        try:
+            result = await _STEPS[name]()
+        except Exception as exc:
+            result = {"ok": False, "error": str(exc)[:200] or type(exc).__name__}
+        elapsed = time.perf_counter() - start
+        result["seconds"] = round(elapsed, 3)
+        self.steps[name] = result
+        self._last_retry[name] = time.monotonic()
+        WARMUP_STEP_SECONDS.set(elapsed, step=name)
+        if not result["ok"]:
+            print(f"[Warmup] {name} failed after {elapsed:.2f}s: {result.get('error')}")
+
+    async def _run(self):
+        self.state = "warming"
+        start = time.perf_counter()
+        await asyncio.gather(*(self._step(name) for name in self._enabled_steps()))
+        if self.state == "warming":
+            self.state = "done"
+        self.finished_at = time.time()
+        failed = [n for n, r in self.steps.items() if not r["ok"]]
+        print(f"[Warmup] Finished in {time.perf_counter() - start:.2f}s"
+              + (f" — failed: {', '.join(failed)}" if failed else ""))
+
+    async def run(self):
+        """Start warm-up (in the background unless WARMUP_BLOCKING)."""
+        if self._task is not None:
+            return
+        self.started_at = time.time()
+        self._task = asyncio.create_task(self._run())
+        if WARMUP_BLOCKING:
+            await self._task
+
+    async def stop(self):
+        """Shutdown has begun: report not-ready from now on."""
+        self.state = "stopping"
+        WORKER_READY.set(0)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    async def _live_mongo(self) -> dict:
+        from database import ping_db
+
+        now = time.monotonic()
+        if self._mongo is None or now - self._mongo[0] >= READINESS_CACHE_SECONDS:
+            self._mongo = (now, await ping_db(READINESS_PING_TIMEOUT))
+        return self._mongo[1]
+
+    async def readiness(self) -> tuple[bool, dict]:
+        """(ready, report) for GET /readyz."""
+        checks: dict[str, dict] = {}
+        if self.state == "done":
+            for name in sorted(WARMUP_REQUIRED & set(self.steps)):
+                if name != "mongo" and not self.steps[name]["ok"] \
+                        and time.monotonic() - self._last_retry.get(name, 0) >= READINESS_RETRY_SECONDS:
+                    await self._step(name)
+            checks["mongo"] = await self._live_mongo()
+
+        failed = [
+            n for n in WARMUP_REQUIRED
+            if n in self.steps and not (checks[n] if n in checks else self.steps[n])["ok"]
+        ]
+        ready = self.state == "done" and not failed
+        WORKER_READY.set(1 if ready else 0)
+
+        if ready:
+            status = "ready"
+        elif self.state in ("pending", "warming"):
+            status = "warming"
+        elif self.state == "stopping":
+            status = "stopping"
+        else:
+            status = "not_ready"
+        return ready, {
+            "status": status,
+            "warmup": {
+                "state": self.state,
+                "seconds": round((self.finished_at or time.time()) - self.started_at, 2),
+                "required": sorted(WARMUP_REQUIRED),
+                "steps": self.steps,
+            },
+            "checks": checks,
+        }
+
+
+warmup = Warmup()
@@ -43,10 +43,8 @@ export default function QuizPage({ sessionId, subject, onComplete }: QuizPagePro
     setError("");
     try {
       const payload = questions.map((q, i) => ({
-        question: q.question,
+        question_id: q.question_id ?? "",
         user_answer: answers[i],
-        correct_answer: String(q.answer ?? ""),
-        type: q.type || questionType,
       }));
       const res = await submitDiagnostic(sessionId, payload);
       setResult(res);
@@ -274,7 +272,6 @@ export default function QuizPage({ sessionId, subject, onComplete }: QuizPagePro
             question={q.question}
             questionType={q.type || "short"}
             options={q.options}
-            expectedPoints={q.expected_points}
             userAnswer={answers[i]}
             onChange={(val) => {
               const updated = [...answers];
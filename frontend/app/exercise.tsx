@@ -2,7 +2,7 @@
 
 import { useState, useEffect, useRef } from "react";
 import { motion } from "framer-motion";
-import { generateExercise, submitExercise, Question, QuestionType } from "@/lib/api";
+import { generateExercise, submitExercise, Question, QuestionResult, QuestionType } from "@/lib/api";
 import QuestionCard from "@/components/QuestionCard";
 import DifficultyBadge from "@/components/DifficultyBadge";
 import ProgressBar from "@/components/ProgressBar";
@@ -45,6 +45,7 @@ export default function ExercisePage({ sessionId, subject, level, onComplete }:
     avg_response_time: number;
     stress_detected: boolean;
     recommended_action: string | null;
+    results?: QuestionResult[];
   } | null>(null);
   const [error, setError] = useState("");
   const [started, setStarted] = useState(false);
@@ -98,10 +99,8 @@ export default function ExercisePage({ sessionId, subject, level, onComplete }:
     try {
       const totalTime = (Date.now() - sessionStartRef.current) / 1000;
       const payload = questions.map((q, i) => ({
-        question: q.question,
+        question_id: q.question_id ?? "",
         user_answer: answers[i],
-        correct_answer: String(q.answer ?? ""),
-        type: q.type || questionType,
       }));
       // Fill any unrecorded question times with 0
       const times = questions.map((_, i) => perQuestionTimes[i] ?? 0);
@@ -356,21 +355,25 @@ export default function ExercisePage({ sessionId, subject, level, onComplete }:
             Answer Review
           </h3>
           <div className="flex flex-col gap-3">
-            {questions.map((q, i) => (
-              <QuestionCard
-                key={i}
-                index={i}
-                question={q.question}
-                questionType={q.type || questionType}
-                options={q.options}
-                expectedPoints={q.expected_points}
-                userAnswer={answers[i]}
-                onChange={() => {}}
-                disabled
-                correctAnswer={String(q.answer ?? "")}
-                showResult
-              />
-            ))}
+            {questions.map((q, i) => {
+              const graded = result.results?.find((r) => r.question_id === q.question_id);
+              return (
+                <QuestionCard
+                  key={i}
+                  index={i}
+                  question={q.question}
+                  questionType={q.type || questionType}
+                  options={q.options}
+                  expectedPoints={graded?.expected_points ?? undefined}
+                  userAnswer={answers[i]}
+                  onChange={() => {}}
+                  disabled
+                  correctAnswer={graded?.correct_answer ?? undefined}
+                  showResult
+                  graded={graded?.correct}
+                />
+              );
+            })}
           </div>
         </motion.div>
 
@@ -427,7 +430,6 @@ export default function ExercisePage({ sessionId, subject, level, onComplete }:
             question={q.question}
             questionType={q.type || questionType}
             options={q.options}
-            expectedPoints={q.expected_points}
             userAnswer={answers[i]}
             onChange={(val) => handleAnswerChange(i, val)}
           />
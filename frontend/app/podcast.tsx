@@ -2,7 +2,7 @@
 
 import { useState, useRef, useEffect, useCallback } from "react";
 import { motion, AnimatePresence } from "framer-motion";
-import { generatePodcast, PodcastResponse, PodcastScriptEntry, AUDIO_BASE } from "@/lib/api";
+import { streamPodcast, PodcastResponse, PodcastScriptEntry, AUDIO_BASE } from "@/lib/api";
 
 // ---------------------------------------------------------------------------
 // Types
@@ -195,6 +195,147 @@ function AudioPlayer({
   );
 }
 
+// ---------------------------------------------------------------------------
+// Live player: plays segments in script order as they finish synthesising
+// ---------------------------------------------------------------------------
+
+function LivePlayer({
+  script,
+  failed,
+  generating,
+  onSegmentChange,
+}: {
+  script: PodcastScriptEntry[];
+  failed: Set<number>;
+  generating: boolean;
+  onSegmentChange: (idx: number | null) => void;
+}) {
+  const audioRef = useRef<HTMLAudioElement>(null);
+  const [current, setCurrent] = useState(0);
+  const [playing, setPlaying] = useState(false);
+  const [waiting, setWaiting] = useState(false);
+
+  const ready = script.filter((e) => e.audio_url).length;
+
+  // Skip failed segments; stop at the end of the script
+  const nextPlayable = useCallback(
+    (from: number) => {
+      let idx = from;
+      while (idx < script.length && failed.has(idx)) idx++;
+      return idx;
+    },
+    [script.length, failed]
+  );
+
+  const playFrom = useCallback(
+    (from: number) => {
+      const a = audioRef.current;
+      const idx = nextPlayable(from);
+      setCurrent(idx);
+      if (!a || idx >= script.length) {
+        setPlaying(false);
+        setWaiting(false);
+        onSegmentChange(null);
+        return;
+      }
+      const url = script[idx].audio_url;
+      if (!url) {
+        // Not synthesised yet — resume when its segment event arrives
+        setWaiting(true);
+        return;
+      }
+      setWaiting(false);
+      onSegmentChange(idx);
+      a.src = `${AUDIO_BASE}${url}`;
+      a.play().catch(() => setPlaying(false));
+    },
+    [script, nextPlayable, onSegmentChange]
+  );
+
+  // A segment we were waiting for has arrived (or failed)
+  useEffect(() => {
+    if (playing && waiting) playFrom(current);
+  }, [script, failed, playing, waiting, current, playFrom]);
+
+  useEffect(() => {
+    const a = audioRef.current;
+    if (!a) return;
+    const onEnd = () => playFrom(current + 1);
+    a.addEventListener("ended", onEnd);
+    return () => a.removeEventListener("ended", onEnd);
+  }, [current, playFrom]);
+
+  const toggle = () => {
+    const a = audioRef.current;
+    if (!a) return;
+    if (playing) {
+      a.pause();
+      setPlaying(false);
+      return;
+    }
+    setPlaying(true);
+    if (a.src && !waiting && current < script.length) {
+      a.play().catch(() => setPlaying(false));
+    } else {
+      playFrom(current >= script.length ? 0 : current);
+    }
+  };
+
+  const status = waiting
+    ? `Waiting for segment ${current + 1}…`
+    : current < script.length && playing
+      ? `Playing segment ${current + 1} of ${script.length}`
+      : `${ready} of ${script.length} segments ready`;
+
+  return (
+    <div className="glass-card p-5">
+      <audio ref={audioRef} preload="auto" />
+      <div className="mb-3 flex items-center justify-between gap-2">
+        <span className="text-sm font-medium text-text-secondary">
+          {generating ? "Listen while it generates" : "Segment by segment"}
+        </span>
+        <span className="text-[10px] text-text-dim font-mono">{status}</span>
+      </div>
+
+      <WaveformBars playing={playing && !waiting} />
+
+      <div className="mt-4 flex items-center gap-3">
+        <button
+          onClick={toggle}
+          disabled={ready === 0 && !playing}
+          className="flex h-10 w-10 flex-shrink-0 items-center justify-center rounded-full bg-accent-primary text-white shadow-glow-sm transition-all hover:bg-accent-muted hover:shadow-glow-md active:scale-95 disabled:opacity-40"
+        >
+          {playing ? (
+            <svg className="h-4 w-4" fill="currentColor" viewBox="0 0 24 24">
+              <path d="M6 4h4v16H6V4zm8 0h4v16h-4V4z" />
+            </svg>
+          ) : (
+            <svg className="h-4 w-4 ml-0.5" fill="currentColor" viewBox="0 0 24 24">
+              <path d="M8 5v14l11-7z" />
+            </svg>
+          )}
+        </button>
+        <div className="flex flex-1 gap-[2px]">
+          {script.map((e, i) => (
+            <div
+              key={i}
+              className={`h-2 flex-1 rounded-full ${
+                failed.has(i)
+                  ? "bg-status-error/40"
+                  : i === current && playing
+                    ? "bg-accent-cyan"
+                    : e.audio_url
+                      ? "bg-accent-primary/60"
+                      : "bg-border-primary"
+              }`}
+            />
+          ))}
+        </div>
+      </div>
+    </div>
+  );
+}
+
 // ---------------------------------------------------------------------------
 // Speaker avatar
 // ---------------------------------------------------------------------------
@@ -288,7 +429,7 @@ function PodcastLoading() {
             {LOADING_TIPS[tipIdx]}
           </motion.p>
         </AnimatePresence>
-        <p className="text-xs text-text-dim mt-2">This may take a few minutes — hang tight!</p>
+        <p className="text-xs text-text-dim mt-2">Writing the script — audio starts as soon as the first segment is ready.</p>
       </div>
 
       {/* Decorative waveform */}
@@ -307,23 +448,62 @@ export default function PodcastPage({ onBack }: Props) {
   const [podcast, setPodcast] = useState<PodcastResponse | null>(null);
   const [error, setError] = useState("");
   const [activeSpeaker, setActiveSpeaker] = useState<number | null>(null);
+  const [generating, setGenerating] = useState(false);
+  const [failed, setFailed] = useState<Set<number>>(new Set());
+  const closeStream = useRef<(() => void) | null>(null);
+
+  // Close the SSE stream when leaving the page
+  useEffect(() => () => closeStream.current?.(), []);
 
-  const generate = useCallback(async () => {
+  const generate = useCallback(() => {
     if (!topic.trim()) return;
+    closeStream.current?.();
     setError("");
+    setFailed(new Set());
     setPhase("loading");
-    try {
-      const data = await generatePodcast(topic.trim());
-      setPodcast(data);
-      setPhase("ready");
-    } catch (err: any) {
-      console.error(err);
-      setError(err?.response?.data?.detail || err?.message || "Failed to generate podcast");
-      setPhase("input");
-    }
+    setGenerating(true);
+    let gotScript = false;
+
+    // The script arrives first; segment audio and the growing full episode follow
+    closeStream.current = streamPodcast(topic.trim(), {
+      onScript: (data) => {
+        gotScript = true;
+        setPodcast({
+          podcast_id: data.podcast_id,
+          topic: data.topic,
+          script: data.script,
+          full_audio_url: null,
+          has_audio: false,
+          segments: data.script.length,
+        });
+        setPhase("ready");
+      },
+      onSegment: ({ index, audio_url }) =>
+        setPodcast((p) =>
+          p && { ...p, script: p.script.map((e, i) => (i === index ? { ...e, audio_url } : e)) }
+        ),
+      onSegmentFailed: ({ index }) => setFailed((f) => new Set(f).add(index)),
+      onEpisode: ({ full_audio_url }) =>
+        setPodcast((p) => p && { ...p, full_audio_url, has_audio: true }),
+      onDone: (data) => {
+        setPodcast(data);
+        setGenerating(false);
+        closeStream.current = null;
+      },
+      onError: () => {
+        setGenerating(false);
+        closeStream.current = null;
+        setError("Failed to generate podcast");
+        if (!gotScript) setPhase("input");
+      },
+    });
   }, [topic]);
 
   const reset = () => {
+    closeStream.current?.();
+    closeStream.current = null;
+    setGenerating(false);
+    setFailed(new Set());
     setPhase("input");
     setTopic("");
     setPodcast(null);
@@ -497,8 +677,14 @@ export default function PodcastPage({ onBack }: Props) {
                 Alex &amp; Dr. Sam
               </span>
               <span>{podcast.segments} exchanges</span>
-              {podcast.has_audio && <span className="flex items-center gap-1 text-status-success"><span className="h-1.5 w-1.5 rounded-full bg-status-success" /> Audio ready</span>}
-              {!podcast.has_audio && <span className="flex items-center gap-1 text-text-dim"><span className="h-1.5 w-1.5 rounded-full bg-text-dim" /> Text only</span>}
+              {generating && (
+                <span className="flex items-center gap-1 text-accent-secondary">
+                  <span className="h-1.5 w-1.5 rounded-full bg-accent-secondary animate-pulse" />
+                  Generating audio · {podcast.script.filter((e) => e.audio_url).length}/{podcast.segments}
+                </span>
+              )}
+              {!generating && podcast.has_audio && <span className="flex items-center gap-1 text-status-success"><span className="h-1.5 w-1.5 rounded-full bg-status-success" /> Audio ready</span>}
+              {!generating && !podcast.has_audio && <span className="flex items-center gap-1 text-text-dim"><span className="h-1.5 w-1.5 rounded-full bg-text-dim" /> Text only</span>}
             </div>
 
             {/* Speakers */}
@@ -523,8 +709,22 @@ export default function PodcastPage({ onBack }: Props) {
         </div>
       </div>
 
-      {/* Full episode player */}
-      {podcast.has_audio && podcast.full_audio_url && (
+      {error && <p className="mb-4 text-xs text-status-error">{error}</p>}
+
+      {/* Segments play as soon as each one is synthesised */}
+      {(generating || podcast.has_audio) && podcast.script.length > 0 && (
+        <div className="mb-6">
+          <LivePlayer
+            script={podcast.script}
+            failed={failed}
+            generating={generating}
+            onSegmentChange={setActiveSpeaker}
+          />
+        </div>
+      )}
+
+      {/* Full episode player (once every segment has been processed) */}
+      {!generating && podcast.has_audio && podcast.full_audio_url && (
         <div className="mb-6">
           <AudioPlayer src={`${AUDIO_BASE}${podcast.full_audio_url}`} label="Full Episode" />
         </div>
@@ -13,6 +13,7 @@ interface QuestionCardProps {
   disabled?: boolean;
   correctAnswer?: string;
   showResult?: boolean;
+  graded?: boolean; // server-side verdict; overrides the local comparison
 }
 
 export default function QuestionCard({
@@ -26,11 +27,14 @@ export default function QuestionCard({
   disabled = false,
   correctAnswer,
   showResult = false,
+  graded,
 }: QuestionCardProps) {
   const normalize = (s: string) => s.trim().toLowerCase();
 
   const isCorrect = (() => {
-    if (!showResult || correctAnswer === undefined) return null;
+    if (!showResult) return null;
+    if (graded !== undefined) return graded;
+    if (correctAnswer === undefined) return null;
     if (questionType === "true_false") {
       const u = normalize(userAnswer);
       const e = normalize(String(correctAnswer));
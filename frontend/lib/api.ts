@@ -39,9 +39,10 @@ export interface DiagnosticResponse {
 }
 
 export interface Question {
+  question_id?: string; // set on diagnostic / exercise questions; graded server-side
   type?: string;
   question: string;
-  answer?: string;
+  answer?: string; // material exercises only; graded questions arrive without answers
   options?: string[];
   expected_points?: string[];
 }
@@ -58,6 +59,15 @@ export interface ExerciseResponse {
   level: string;
 }
 
+export interface QuestionResult {
+  question_id: string;
+  correct: boolean;
+  score: number;
+  coverage?: boolean[] | null; // qa: one flag per expected point
+  correct_answer?: string | null; // revealed once graded
+  expected_points?: string[] | null; // qa
+}
+
 export interface SubmitResponse {
   accuracy: number;
   correct: number;
@@ -72,6 +82,8 @@ export interface SubmitResponse {
   // Stress
   stress_detected: boolean;
   recommended_action: string | null;
+  // Server-side grading, answered questions in submission order
+  results?: QuestionResult[];
 }
 
 export interface ProgressResponse {
@@ -100,6 +112,39 @@ export interface ProgressResponse {
   }>;
 }
 
+export interface Distribution {
+  mean: number;
+  p25: number;
+  p50: number;
+  p75: number;
+  p90: number;
+  histogram: number[];
+}
+
+export interface UserDashboardResponse {
+  user_id: string;
+  sessions: {
+    session_id: string;
+    subject: string;
+    level: string;
+    total_correct: number;
+    total_attempts: number;
+    mastery: number;
+    cognitive_strain_index: number;
+    adaptive_mode: string | null;
+    updated_at: string | null;
+  }[];
+  total_correct: number;
+  total_attempts: number;
+  accuracy: number;
+  topic_accuracy: Record<string, { correct: number; total: number; accuracy: number }>;
+  type_accuracy: Record<string, { correct: number; total: number; accuracy: number }>;
+  mastery: Distribution;
+  cognitive_strain_index: Distribution;
+  weaknesses: { kind: string; name: string; accuracy: number }[];
+  recommendations: string[];
+}
+
 export interface Flashcard {
   front: string;
   back: string;
@@ -188,7 +233,7 @@ export async function getDiagnosticQuestions(
 
 export async function submitDiagnostic(
   session_id: string,
-  answers: { question: string; user_answer: string; correct_answer: string; type?: string }[]
+  answers: { question_id: string; user_answer: string }[]
 ): Promise<DiagnosticResponse> {
   const res = await api.post("/diagnostic", { session_id, answers });
   return res.data;
@@ -213,7 +258,7 @@ export async function generateExercise(
 
 export async function submitExercise(
   session_id: string,
-  answers: { question: string; user_answer: string; correct_answer: string; type?: string }[],
+  answers: { question_id: string; user_answer: string }[],
   per_question_times?: number[],
   total_time_seconds?: number,
 ): Promise<SubmitResponse> {
@@ -286,6 +331,11 @@ export async function getProgress(session_id: string): Promise<ProgressResponse>
   return res.data;
 }
 
+export async function getUserDashboard(user_id: string): Promise<UserDashboardResponse> {
+  const res = await api.get(`/users/${user_id}/dashboard`);
+  return res.data;
+}
+
 export async function getWeaknessProfile(
   session_id: string
 ): Promise<ProgressResponse["weakness_profile"]> {
@@ -301,3 +351,62 @@ export async function generatePodcast(topic: string): Promise<PodcastResponse> {
   const res = await api.post("/generate-podcast", { topic }, { timeout: 600_000 });
   return res.data;
 }
+
+export interface JobResponse<T = unknown> {
+  job_id: string;
+  kind: string;
+  status: "queued" | "running" | "succeeded" | "failed" | "cancelled";
+  priority: number;
+  attempts: number;
+  max_attempts: number;
+  created_at?: string;
+  started_at?: string;
+  finished_at?: string;
+  result?: T | null;
+  error?: string | null;
+}
+
+export async function enqueuePodcast(topic: string): Promise<JobResponse<PodcastResponse>> {
+  const res = await api.post("/generate-podcast/jobs", { topic });
+  return res.data;
+}
+
+export async function getJob<T = unknown>(job_id: string): Promise<JobResponse<T>> {
+  const res = await api.get(`/jobs/${job_id}`);
+  return res.data;
+}
+
+export async function cancelJob(job_id: string): Promise<JobResponse> {
+  const res = await api.delete(`/jobs/${job_id}`);
+  return res.data;
+}
+
+export interface PodcastStreamHandlers {
+  onScript?: (data: { podcast_id: string; topic: string; script: PodcastScriptEntry[]; has_tts: boolean }) => void;
+  onSegment?: (data: { index: number; audio_url: string }) => void;
+  onSegmentFailed?: (data: { index: number }) => void;
+  onEpisode?: (data: { full_audio_url: string; segments_ready: number; complete: boolean }) => void;
+  onDone?: (data: PodcastResponse) => void;
+  onError?: () => void;
+}
+
+/** Stream a podcast over SSE: script first, then each segment as it is ready. Returns a close function. */
+export function streamPodcast(topic: string, handlers: PodcastStreamHandlers): () => void {
+  const source = new EventSource(`${API_BASE}/generate-podcast/stream?topic=${encodeURIComponent(topic)}`);
+  const on = <T,>(event: string, cb?: (data: T) => void) =>
+    source.addEventListener(event, (e) => cb?.(JSON.parse((e as MessageEvent).data)));
+
+  on("script", handlers.onScript);
+  on("segment", handlers.onSegment);
+  on("segment_failed", handlers.onSegmentFailed);
+  on("episode", handlers.onEpisode);
+  on<PodcastResponse>("done", (data) => {
+    source.close();
+    handlers.onDone?.(data);
+  });
+  source.onerror = () => {
+    source.close();
+    handlers.onError?.();
+  };
+  return () => source.close();
+}